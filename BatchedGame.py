@@ -0,0 +1,144 @@
+"""
+Many games of Hide and Seek on the same map, stepped at once with NumPy.
+
+Same rules as Game / HideAndSeekEnv, but the state of each game is only the cell
+index of the player and of the agent (see GridTables), so stepping all the games
+is a few table lookups on arrays instead of a Python loop per game.
+"""
+
+import numpy as np
+
+import Maps
+from Game import Game
+from GridTables import GridTables
+from ObservationType import ObservationType, LongViewObservation
+from SeekerPolicy import make_seeker_policy
+
+
+class BatchedGame:
+    """
+    Array version of the game, for n_games games played in parallel.
+    """
+    def __init__(self, n_games:int, map_name=Maps.DEFAULT_MAP,
+                 observation_type:ObservationType=None, seeker_policy="static",
+                 maximum_steps=300, seed=None, start_sampler=None) -> None:
+        """
+        Initialize the games. reset() must be called before step().
+
+        Parameters
+        ----------
+        n_games : int
+            number of games played in parallel
+        map_name : str, optional
+            name of the map, by default Maps.DEFAULT_MAP. If "random", a single
+            random map is generated and shared by all the games.
+        observation_type : ObservationType, optional
+            The observation type to use. If None, LongViewObservation(5) is used.
+        seeker_policy : str or SeekerPolicy, optional
+            how the player moves, by default "static" (see SeekerPolicy.py)
+        maximum_steps : int, optional
+            episodes are truncated after this number of steps, by default 300
+        seed : int, optional
+            seed of the random number generator, by default None
+        start_sampler : optional
+            draws the starts of the episodes, with a method sample(rng, size)
+            returning indices into GridTables.start_players and
+            GridTables.start_agents (see Curriculum.StartCurriculum), by default
+            None (uniform starts)
+        """
+        self.n_games = n_games
+        self.game = Game(map_name=map_name, seed=seed)
+        self.tables = GridTables.from_grid(self.game.grid)
+
+        if observation_type is None:
+            observation_type = LongViewObservation(5)
+        self.observation_type = observation_type
+        self.seeker_policy = make_seeker_policy(seeker_policy)
+        self.maximum_steps = maximum_steps
+        self.start_sampler = start_sampler
+
+        self.rng = np.random.default_rng(seed)
+
+        self.player = np.zeros(n_games, dtype=np.int32)
+        self.agent = np.zeros(n_games, dtype=np.int32)
+        self.steps = np.zeros(n_games, dtype=np.int32)
+        # index of the start of the current episode of each game
+        self.starts = np.zeros(n_games, dtype=np.int64)
+
+    def seed(self, seed=None) -> None:
+        self.rng = np.random.default_rng(seed)
+
+    def reset(self, indices=None) -> None:
+        """
+        Start a new episode in the given games (all of them by default).
+        Player and agent are placed uniformly at random such that the player
+        sees the agent, as in Game.init_game_start(), or drawn by the start
+        sampler.
+        """
+        if indices is None:
+            indices = np.arange(self.n_games)
+
+        if self.start_sampler is None:
+            starts = self.rng.integers(len(self.tables.start_players), size=len(indices))
+        else:
+            starts = self.start_sampler.sample(self.rng, len(indices))
+        self.starts[indices] = starts
+        self.player[indices] = self.tables.start_players[starts]
+        self.agent[indices] = self.tables.start_agents[starts]
+        self.steps[indices] = 0
+
+        if len(indices) == self.n_games:
+            self.seeker_policy.reset(self.tables, self.player, self.agent)
+        else:
+            self.seeker_policy.reset(self.tables, self.player, self.agent, indices)
+
+    def step(self, actions:np.ndarray):
+        """
+        Play one step in every game: move the agents, then the players.
+
+        Parameters
+        ----------
+        actions : np.ndarray
+            action of the agent of each game (see Game.handle_action)
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray, np.ndarray]
+            rewards, terminated and truncated flags of each game
+        """
+        self.steps += 1
+
+        new_agent = self.tables.neighbours[self.agent, actions]
+        np.copyto(self.agent, new_agent, where=new_agent != self.player)
+
+        if not self.seeker_policy.is_static:
+            seeker_actions = self.seeker_policy.act(self.tables, self.player, self.agent)
+            new_player = self.tables.neighbours[self.player, seeker_actions]
+            np.copyto(self.player, new_player, where=new_player != self.agent)
+
+        terminated = ~self.tables.visibility[self.player, self.agent]
+        truncated = (self.steps >= self.maximum_steps) & ~terminated
+        rewards = np.where(terminated, 50.0, -1.0)
+        return rewards, terminated, truncated
+
+    def get_observations(self) -> np.ndarray:
+        """
+        Returns the observation of every game, one row per game.
+        """
+        return self.observation_type.get_observation_batch(self.tables, self.player,
+                                                           self.agent)
+
+    def get_distances(self) -> np.ndarray:
+        """
+        Manhattan distance between the agent and the player of every game,
+        the "distance" info of HideAndSeekEnv.
+        """
+        delta = self.tables.cells[self.agent] - self.tables.cells[self.player]
+        return np.abs(delta).sum(axis=1)
+
+    def get_action_masks(self) -> np.ndarray:
+        """
+        Returns the valid actions of the agent of every game, one row of 4
+        booleans per game (see GridTables.action_masks).
+        """
+        return self.tables.action_masks(self.player, self.agent)
@@ -0,0 +1,301 @@
+"""
+Callbacks given to model.learn() by learn.py.
+
+CheckpointCallback saves the model during a single learn() call. The weights are
+copied in memory at each save point and the .zip file is written by a background
+thread, so training does not wait for the disk. A retention policy decides which
+checkpoints stay on disk:
+- the last keep_last checkpoints (all of them by default),
+- one checkpoint every keep_every timesteps,
+- the best checkpoint according to a periodic evaluation.
+The kept checkpoints and their evaluation are listed in checkpoints.json in the
+model folder, and in the model registry if one is given (see ModelRegistry.py).
+
+MetricsCallback aggregates the finished episodes and the steps per second of
+training as streaming statistics, written periodically to a JSON snapshot and
+optionally served over HTTP on localhost (see Metrics.py).
+"""
+
+import copy
+import json
+import os
+import queue
+import threading
+import zipfile
+
+import stable_baselines3 as sb3
+import torch as th
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.evaluation import evaluate_policy
+from stable_baselines3.common.save_util import data_to_json
+from stable_baselines3.common.utils import get_system_info
+from stable_baselines3.common.vec_env import VecEnv
+
+from Metrics import MetricsServer, RunMetrics, SnapshotWriter
+from ModelRegistry import ModelRegistry
+
+MANIFEST = "checkpoints.json"
+
+
+class CheckpointCallback(BaseCallback):
+    """
+    Save checkpoints asynchronously and keep some of them (see the module docstring).
+    Checkpoints are named <timesteps>.zip, as before, so evaluate.py and load.py
+    read them as usual.
+    """
+    def __init__(self, models_dir:str, save_interval:int, keep_last=0, keep_every=0,
+                 eval_env:VecEnv=None, eval_interval=0, nb_eval_episodes=100,
+                 registry:ModelRegistry=None, run_name:str=None, verbose=0) -> None:
+        """
+        Parameters
+        ----------
+        models_dir : str
+            folder of the checkpoints
+        save_interval : int
+            save the model every X timesteps
+        keep_last : int, optional
+            number of most recent checkpoints kept, by default 0 (all of them)
+        keep_every : int, optional
+            keep forever one checkpoint every X timesteps, by default 0 (none)
+        eval_env : VecEnv, optional
+            environment used to evaluate the model, by default None (no evaluation,
+            no best checkpoint)
+        eval_interval : int, optional
+            evaluate the model every X timesteps (rounded to a save point), by
+            default 0 (no evaluation)
+        nb_eval_episodes : int, optional
+            number of episodes of an evaluation, by default 100
+        registry : ModelRegistry, optional
+            registry in which checkpoints and evaluations are recorded, by default
+            None
+        run_name : str, optional
+            name of the run in the registry, required if registry is given
+        verbose : int, optional
+            1 to print the progress at each save point, by default 0
+        """
+        super().__init__(verbose)
+        assert save_interval > 0, "save_interval must be positive."
+        assert keep_last >= 0, "keep_last must be positive or 0."
+        self.models_dir = models_dir
+        self.save_interval = save_interval
+        self.keep_last = keep_last
+        self.keep_every = keep_every
+        self.eval_env = eval_env
+        self.eval_interval = eval_interval if eval_env is not None else 0
+        self.nb_eval_episodes = nb_eval_episodes
+        self.registry = registry
+        self.run = registry.get_run(run_name) if registry is not None else None
+
+        self.next_save = save_interval
+        self.next_eval = self.eval_interval
+        self.last_saved = None
+
+        # at most 2 snapshots wait for the writer: if the disk is slower than
+        # training, training waits instead of filling the memory
+        self.snapshots = queue.Queue(maxsize=2)
+        self.writer = None
+        self.writer_error = None
+
+        # used by the writer thread only
+        self.checkpoints = [] # timesteps of the checkpoints on disk
+        self.rewards = {} # timesteps -> mean evaluation reward
+        self.best = None
+
+    def _on_training_start(self) -> None:
+        self.writer = threading.Thread(target=self._write_snapshots, daemon=True)
+        self.writer.start()
+
+    def _on_step(self) -> bool:
+        if self.writer_error is not None:
+            raise self.writer_error
+
+        if self.num_timesteps >= self.next_save:
+            while self.next_save <= self.num_timesteps:
+                self.next_save += self.save_interval
+
+            mean_reward = None
+            if self.eval_interval > 0 and self.num_timesteps >= self.next_eval:
+                while self.next_eval <= self.num_timesteps:
+                    self.next_eval += self.eval_interval
+                mean_reward, _ = evaluate_policy(self.model, self.eval_env,
+                                                 n_eval_episodes=self.nb_eval_episodes,
+                                                 warn=False)
+                self.logger.record("eval/mean_reward", mean_reward)
+
+            self._save(mean_reward)
+            if self.verbose > 0:
+                print(f"\rTimestep {self.num_timesteps}/{self.model._total_timesteps}", end="")
+        return True
+
+    def _on_training_end(self) -> None:
+        if self.last_saved != self.num_timesteps:
+            self._save(None)
+        self.snapshots.put(None)
+        self.writer.join()
+        if self.writer_error is not None:
+            raise self.writer_error
+
+    def _save(self, mean_reward) -> None:
+        """
+        Copy what model.save() would write, and give it to the writer thread.
+        """
+        data = self.model.__dict__.copy()
+        exclude = set(self.model._excluded_save_params())
+        state_dicts_names, torch_variable_names = self.model._get_torch_save_params()
+        for name in state_dicts_names + torch_variable_names:
+            exclude.add(name.split(".")[0])
+        for name in exclude:
+            data.pop(name, None)
+
+        snapshot = {
+            "timesteps": self.num_timesteps,
+            "mean_reward": mean_reward,
+            # serialized now, the attributes change during training
+            "data": data_to_json(data),
+            "params": copy.deepcopy(self.model.get_parameters()),
+            "pytorch_variables": {name: copy.deepcopy(getattr(self.model, name))
+                                  for name in torch_variable_names},
+        }
+        self.snapshots.put(snapshot)
+        self.last_saved = self.num_timesteps
+
+    def _write_snapshots(self) -> None:
+        """
+        Writer thread: write the snapshots and apply the retention policy.
+        After an error, the next snapshots are taken from the queue and dropped
+        until the end of training, so that training never waits on a full queue
+        (it raises the error at its next step).
+        """
+        while True:
+            snapshot = self.snapshots.get()
+            if snapshot is None:
+                return
+            if self.writer_error is not None:
+                continue
+            try:
+                self._write(snapshot)
+                self._apply_retention(snapshot["timesteps"], snapshot["mean_reward"])
+            except Exception as error:
+                self.writer_error = error
+
+    def _write(self, snapshot:dict) -> None:
+        """
+        Write a snapshot in the same format as model.save(), under a temporary name
+        so that an interrupted write never leaves a truncated checkpoint.
+        """
+        path = self._path(snapshot["timesteps"])
+        with zipfile.ZipFile(path + ".tmp", mode="w") as archive:
+            archive.writestr("data", snapshot["data"])
+            with archive.open("pytorch_variables.pth", mode="w", force_zip64=True) as f:
+                th.save(snapshot["pytorch_variables"], f)
+            for name, state_dict in snapshot["params"].items():
+                with archive.open(name + ".pth", mode="w", force_zip64=True) as f:
+                    th.save(state_dict, f)
+            archive.writestr("_stable_baselines3_version", sb3.__version__)
+            archive.writestr("system_info.txt", get_system_info(print_info=False)[1])
+        os.replace(path + ".tmp", path)
+
+    def _apply_retention(self, timesteps:int, mean_reward) -> None:
+        self.checkpoints.append(timesteps)
+        if self.run is not None:
+            self.registry.add_checkpoint(self.run["name"], timesteps, self._path(timesteps))
+        if mean_reward is not None:
+            self.rewards[timesteps] = mean_reward
+            if self.best is None or mean_reward > self.rewards[self.best]:
+                self.best = timesteps
+            if self.run is not None:
+                self.registry.add_evaluation(self._path(timesteps), self.run["map"],
+                                             self.run["seeker"], self.nb_eval_episodes,
+                                             {"mean_reward": mean_reward})
+
+        kept = []
+        for i, checkpoint in enumerate(self.checkpoints):
+            if (self.keep_last == 0
+                    or i >= len(self.checkpoints) - self.keep_last
+                    or checkpoint == self.best
+                    or self._is_kept_every(i)):
+                kept.append(checkpoint)
+            else:
+                os.remove(self._path(checkpoint))
+                if self.run is not None:
+                    self.registry.remove_checkpoint(self._path(checkpoint))
+        self.checkpoints = kept
+
+        manifest = {
+            "best": self.best,
+            "checkpoints": [{"timesteps": checkpoint,
+                             "mean_reward": self.rewards.get(checkpoint)}
+                            for checkpoint in self.checkpoints],
+        }
+        path = os.path.join(self.models_dir, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _path(self, timesteps:int) -> str:
+        return os.path.join(self.models_dir, f"{timesteps}.zip")
+
+    def _is_kept_every(self, i:int) -> bool:
+        """
+        True if the i-th checkpoint is the first one at or after a multiple of
+        keep_every.
+        """
+        if self.keep_every <= 0:
+            return False
+        previous = self.checkpoints[i - 1] if i > 0 else 0
+        return previous // self.keep_every < self.checkpoints[i] // self.keep_every
+
+
+class MetricsCallback(BaseCallback):
+    """
+    Record the episodes finished during training (from the "episode" entry of
+    the infos, written by Monitor and by the VecEnvs of the project) and the
+    number of steps in a RunMetrics, exported as a JSON snapshot every interval
+    seconds and, if a port is given, over HTTP.
+    """
+    def __init__(self, run_name:str, snapshot_path:str, interval:float=10.0,
+                 port:int=None, info:dict=None, verbose=0) -> None:
+        """
+        Parameters
+        ----------
+        run_name : str
+            name of the run in the metrics
+        snapshot_path : str
+            JSON file of the snapshots
+        interval : float, optional
+            seconds between two snapshots, by default 10
+        port : int, optional
+            serve the metrics on this port of localhost, 0 for any free port, by
+            default None (no server)
+        info : dict, optional
+            description of the run added to the snapshots, by default None
+        verbose : int, optional
+            1 to print the address of the server, by default 0
+        """
+        super().__init__(verbose)
+        self.metrics = RunMetrics(run_name, info)
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self.port = port
+        self.writer = None
+        self.server = None
+
+    def _on_training_start(self) -> None:
+        self.writer = SnapshotWriter(self.metrics, self.snapshot_path, self.interval)
+        if self.port is not None:
+            self.server = MetricsServer(lambda: [self.metrics.snapshot()], self.port)
+            if self.verbose > 0:
+                print(f"Metrics served on http://127.0.0.1:{self.server.port}/metrics")
+
+    def _on_step(self) -> bool:
+        self.metrics.record_steps(self.training_env.num_envs)
+        for done, info in zip(self.locals["dones"], self.locals["infos"]):
+            if done and "episode" in info:
+                self.metrics.record_episode(info["episode"]["r"], info["episode"]["l"],
+                                            not info.get("TimeLimit.truncated", False))
+        return True
+
+    def _on_training_end(self) -> None:
+        self.writer.close()
+        if self.server is not None:
+            self.server.close()
@@ -0,0 +1,208 @@
+"""
+Walls of large maps, stored in square chunks.
+
+A map given as a list of rows is scanned as a whole by the rest of the project
+(GridTables, the background of Game.render, ...), which is fine on a 12x12 map
+but not on a 1024x1024 one. ChunkedGrid stores the walls in CHUNK_SIZE x
+CHUNK_SIZE NumPy tiles, only for the chunks that contain walls, and answers the
+questions a step asks (is this cell a wall, which cells around this one are
+walls, does this cell see that one) by looking at a bounded region around the
+cells involved.
+
+Visibility is computed lazily: the first time a player stands on a cell, the
+cells it sees within the sight range are computed at once for the window around
+it (same line drawing as Entity.can_see) and cached, then every visibility test
+from this cell is a lookup.
+
+grid[y][x] gives Maps.WALL or Maps.EMPTY as for a list of rows, so Entity.can_see
+and the Game methods work unchanged on a ChunkedGrid.
+"""
+
+from collections import OrderedDict
+from typing import Iterator, Tuple
+
+import numpy as np
+
+import Maps
+
+CHUNK_SIZE = 64
+SIGHT_CACHE_SIZE = 4096 # number of cells whose visible window is kept
+
+
+class _Row:
+    """
+    Row y of a ChunkedGrid, indexed by x as a row of a list map.
+    """
+    def __init__(self, grid:"ChunkedGrid", y:int) -> None:
+        self.grid = grid
+        self.y = y
+
+    def __getitem__(self, x:int) -> str:
+        return Maps.WALL if self.grid.is_wall(x, self.y) else Maps.EMPTY
+
+    def __len__(self) -> int:
+        return self.grid.width
+
+    def __iter__(self) -> Iterator[str]:
+        return iter("".join(np.where(self.grid.window(0, self.y, self.grid.width, 1)[0],
+                                     Maps.WALL, Maps.EMPTY)))
+
+
+class ChunkedGrid:
+    """
+    Walls of a map of width x height cells, in chunks of CHUNK_SIZE x CHUNK_SIZE
+    cells allocated on the first wall placed in them.
+    """
+    def __init__(self, width:int, height:int, chunk_size:int=CHUNK_SIZE) -> None:
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+        self.chunks = {} # (chunk_x, chunk_y) -> (chunk_size, chunk_size) bool array
+        self.nb_walls = 0
+        self._sight_cache = OrderedDict() # (x, y, sight_range) -> see visible_window()
+
+    @staticmethod
+    def from_rows(rows, chunk_size:int=CHUNK_SIZE) -> "ChunkedGrid":
+        """
+        Returns the ChunkedGrid of a map given as a list of rows (as in Maps.py).
+        """
+        grid = ChunkedGrid(len(rows[0]), len(rows), chunk_size)
+        for y, row in enumerate(rows):
+            for x, cell in enumerate(row):
+                if cell == Maps.WALL:
+                    grid.set_wall(x, y)
+        return grid
+
+    @staticmethod
+    def random(width:int, height:int, rng, nb_walls:int=None) -> "ChunkedGrid":
+        """
+        Random map, as Game.generate_random_map: nb_walls walls (a quarter of the
+        cells by default) placed at random away from the border. The same rng
+        gives the same walls as Game.generate_random_map.
+        """
+        if nb_walls is None:
+            nb_walls = width * height // 4
+        grid = ChunkedGrid(width, height)
+        for _ in range(nb_walls):
+            x = rng.randint(1, width-2)
+            y = rng.randint(1, height-2)
+            grid.set_wall(x, y)
+        return grid
+
+    def set_wall(self, x:int, y:int) -> None:
+        key = (x // self.chunk_size, y // self.chunk_size)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = np.zeros((self.chunk_size, self.chunk_size), dtype=bool)
+            self.chunks[key] = chunk
+        if not chunk[y % self.chunk_size, x % self.chunk_size]:
+            chunk[y % self.chunk_size, x % self.chunk_size] = True
+            self.nb_walls += 1
+        self._sight_cache.clear()
+
+    def is_wall(self, x:int, y:int) -> bool:
+        """
+        True if the cell (x, y) is a wall, False otherwise (also outside of the grid).
+        """
+        chunk = self.chunks.get((x // self.chunk_size, y // self.chunk_size))
+        return (chunk is not None and 0 <= x < self.width and 0 <= y < self.height
+                and bool(chunk[y % self.chunk_size, x % self.chunk_size]))
+
+    def window(self, x:int, y:int, width:int, height:int) -> np.ndarray:
+        """
+        walls[j, i] is True if the cell (x+i, y+j) is a wall, for the window of
+        width x height cells starting at (x, y). Cells outside of the grid are
+        not walls. Only the chunks overlapping the window are read.
+        """
+        walls = np.zeros((height, width), dtype=bool)
+        size = self.chunk_size
+        for chunk_y in range(max(0, y) // size, (min(y + height, self.height) - 1) // size + 1):
+            for chunk_x in range(max(0, x) // size, (min(x + width, self.width) - 1) // size + 1):
+                chunk = self.chunks.get((chunk_x, chunk_y))
+                if chunk is None:
+                    continue
+                # intersection of the chunk and of the window, in grid coordinates
+                x0, x1 = max(x, chunk_x * size), min(x + width, (chunk_x + 1) * size, self.width)
+                y0, y1 = max(y, chunk_y * size), min(y + height, (chunk_y + 1) * size, self.height)
+                walls[y0-y:y1-y, x0-x:x1-x] = chunk[y0 - chunk_y*size:y1 - chunk_y*size,
+                                                    x0 - chunk_x*size:x1 - chunk_x*size]
+        return walls
+
+    def visible_window(self, x:int, y:int, sight_range:int) -> Tuple[int, int, np.ndarray]:
+        """
+        Cells seen from (x, y) within sight_range (diagonal distance), computed
+        on the first call for a cell and then cached.
+
+        Returns
+        -------
+        Tuple[int, int, np.ndarray]
+            (x_min, y_min, seen): seen[j, i] is True if (x_min+i, y_min+j) is
+            seen from (x, y). The window is clipped to the grid.
+        """
+        key = (x, y, sight_range)
+        if key in self._sight_cache:
+            self._sight_cache.move_to_end(key)
+            return self._sight_cache[key]
+
+        x_min, y_min = max(0, x - sight_range), max(0, y - sight_range)
+        x_max = min(self.width - 1, x + sight_range)
+        y_max = min(self.height - 1, y + sight_range)
+        walls = self.window(x_min, y_min, x_max - x_min + 1, y_max - y_min + 1)
+
+        # same line drawing as Entity.can_see (and GridTables._compute_visibility)
+        # from (x, y) to every cell of the window, in grid coordinates since
+        # rounding halves to even depends on them. A ray stays in the bounding
+        # box of its ends, so inside the window.
+        ys, xs = np.mgrid[y_min:y_max+1, x_min:x_max+1]
+        delta = np.stack([xs - x, ys - y], axis=-1).astype(float)     # (H, W, 2)
+        n = np.abs(delta).max(axis=-1)                                # (H, W)
+        steps = np.arange(sight_range + 1)                            # (S,)
+        t = steps / np.maximum(n, 1)[..., None]                       # (H, W, S)
+        points_x = np.rint(x + delta[..., 0, None] * t).astype(np.int64)
+        points_y = np.rint(y + delta[..., 1, None] * t).astype(np.int64)
+        in_ray = steps <= n[..., None]
+        hit = walls[np.where(in_ray, points_y - y_min, 0),
+                    np.where(in_ray, points_x - x_min, 0)]
+        seen = ~(hit & in_ray).any(axis=-1)
+
+        self._sight_cache[key] = (x_min, y_min, seen)
+        if len(self._sight_cache) > SIGHT_CACHE_SIZE:
+            self._sight_cache.popitem(last=False)
+        return x_min, y_min, seen
+
+    def sees(self, x0:int, y0:int, x1:int, y1:int, sight_range:int) -> bool:
+        """
+        True if (x1, y1) is seen from (x0, y0): within sight_range and no wall on
+        the line between them (see visible_window).
+        """
+        if max(abs(x1 - x0), abs(y1 - y0)) > sight_range:
+            return False
+        x_min, y_min, seen = self.visible_window(x0, y0, sight_range)
+        return bool(seen[y1 - y_min, x1 - x_min])
+
+    def wall_cells(self) -> Iterator[Tuple[int, int]]:
+        """
+        (x, y) of every wall, chunk by chunk.
+        """
+        for (chunk_x, chunk_y), chunk in self.chunks.items():
+            for j, i in zip(*np.nonzero(chunk)):
+                yield chunk_x * self.chunk_size + int(i), chunk_y * self.chunk_size + int(j)
+
+    def to_array(self) -> np.ndarray:
+        """
+        walls[y, x] is True if (x, y) is a wall, for the whole grid.
+        """
+        return self.window(0, 0, self.width, self.height)
+
+    def __getitem__(self, y:int) -> _Row:
+        return _Row(self, y)
+
+    def __len__(self) -> int:
+        return self.height
+
+    def __iter__(self) -> Iterator[_Row]:
+        return (_Row(self, y) for y in range(self.height))
+
+    def __getstate__(self) -> dict:
+        # the sight cache is rebuilt when needed
+        return {**self.__dict__, "_sight_cache": OrderedDict()}
@@ -0,0 +1,174 @@
+"""
+Curriculum of episode starts, ranked by difficulty.
+
+Game.init_game_start draws the starts uniformly among the (player, agent) pairs
+where the player sees the agent, so most episodes start one or two moves away
+from cover and the hard starts are rarely trained on. StartCurriculum ranks
+every valid start of a map by its difficulty, the optimal number of moves to
+hide from a static player (see MapAnalysis.steps_to_hide), and draws starts
+with weights per difficulty level:
+
+- "uniform": every start has the same weight, as Game.init_game_start,
+- "linear": only the easiest levels at first, then the harder ones are added
+  linearly until schedule_timesteps timesteps,
+- "adaptive": levels are drawn in proportion to the recent failure rate of the
+  agent on them (episodes truncated instead of hidden), mixed with a uniform
+  share so that no level is forgotten.
+
+Starts are drawn in O(1) each from an alias table of the weights of the starts,
+built again only every rebuild_every episodes.
+"""
+
+import numpy as np
+
+from GridTables import GridTables, UNREACHABLE
+from MapAnalysis import steps_to_hide
+
+SCHEDULES = ["uniform", "linear", "adaptive"]
+
+
+class AliasTable:
+    """
+    Walker's alias method: after an O(n) construction, each draw from a discrete
+    distribution of n outcomes costs one uniform integer and one uniform float.
+    """
+    def __init__(self, weights:np.ndarray) -> None:
+        weights = np.asarray(weights, dtype=np.float64)
+        n = len(weights)
+        scaled = weights * n / weights.sum()
+        self.probabilities = np.ones(n)
+        self.aliases = np.arange(n)
+
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            i, j = small.pop(), large.pop()
+            self.probabilities[i] = scaled[i]
+            self.aliases[i] = j
+            # the remainder of j fills the column of i
+            scaled[j] -= 1.0 - scaled[i]
+            (small if scaled[j] < 1.0 else large).append(j)
+        # left over columns are full (up to rounding errors)
+
+    def sample(self, rng:np.random.Generator, size:int) -> np.ndarray:
+        """
+        Draw size outcomes (indices of the weights).
+        """
+        columns = rng.integers(len(self.probabilities), size=size)
+        keep = rng.random(size) < self.probabilities[columns]
+        return np.where(keep, columns, self.aliases[columns])
+
+
+class StartCurriculum:
+    """
+    Draws the starts of the episodes of a map (indices into
+    GridTables.start_players and GridTables.start_agents) by difficulty.
+    """
+    def __init__(self, tables:GridTables, schedule:str="adaptive",
+                 schedule_timesteps:int=200_000, uniform_fraction:float=0.2,
+                 smoothing:float=0.05, rebuild_every:int=100) -> None:
+        """
+        Rank the starts of the map.
+
+        Parameters
+        ----------
+        tables : GridTables
+            tables of the map
+        schedule : str, optional
+            "uniform", "linear" or "adaptive" (see above), by default "adaptive"
+        schedule_timesteps : int, optional
+            timesteps after which the "linear" schedule draws from every level,
+            by default 200 000
+        uniform_fraction : float, optional
+            share of the draws of the "adaptive" schedule spread uniformly over
+            the levels, by default 0.2
+        smoothing : float, optional
+            weight of the last episode in the moving average of the failure rate
+            of its level, by default 0.05
+        rebuild_every : int, optional
+            episodes between two constructions of the alias table, by default 100
+        """
+        assert schedule in SCHEDULES, f"Unknown schedule '{schedule}'."
+        self.schedule = schedule
+        self.schedule_timesteps = schedule_timesteps
+        self.uniform_fraction = uniform_fraction
+        self.smoothing = smoothing
+        self.rebuild_every = rebuild_every
+
+        steps = steps_to_hide(tables)[tables.start_players, tables.start_agents]
+        # the starts from which the agent cannot hide are only drawn by the
+        # uniform schedule: there is nothing to learn from them
+        self.reachable = steps != UNREACHABLE
+        # level 0 for the starts one move away from cover
+        self.levels = np.where(self.reachable, np.maximum(steps, 1) - 1, 0)
+        self.nb_levels = 1
+        if self.reachable.any():
+            self.nb_levels = int(self.levels[self.reachable].max()) + 1
+        self.level_counts = np.bincount(self.levels[self.reachable],
+                                        minlength=self.nb_levels)
+
+        # unseen levels are assumed to be failed, so they are tried first
+        self.failure_rates = np.ones(self.nb_levels)
+        self.timesteps = 0
+        self.episodes = 0
+        self._build_table()
+
+    def level_probabilities(self) -> np.ndarray:
+        """
+        Probability of drawing each level (among the reachable starts) under the
+        schedule, at the current timestep and failure rates.
+        """
+        present = self.level_counts > 0
+        if self.schedule == "uniform":
+            probabilities = self.level_counts.astype(np.float64)
+        elif self.schedule == "linear":
+            progress = min(1.0, self.timesteps / max(1, self.schedule_timesteps))
+            nb_levels = max(1, int(np.ceil(progress * self.nb_levels)))
+            probabilities = np.where(np.arange(self.nb_levels) < nb_levels,
+                                     self.level_counts, 0).astype(np.float64)
+        else: # adaptive
+            adaptive = np.where(present, self.failure_rates, 0.0)
+            uniform = present / present.sum()
+            if adaptive.sum() > 0:
+                adaptive = adaptive / adaptive.sum()
+            else:
+                adaptive = uniform
+            probabilities = ((1 - self.uniform_fraction) * adaptive
+                             + self.uniform_fraction * uniform)
+        return probabilities / probabilities.sum()
+
+    def _build_table(self) -> None:
+        """
+        Alias table of the weights of the starts: the probability of a level is
+        shared equally by its starts.
+        """
+        if self.schedule == "uniform" or not self.reachable.any():
+            weights = np.ones(len(self.levels))
+        else:
+            per_start = self.level_probabilities() / np.maximum(self.level_counts, 1)
+            weights = np.where(self.reachable, per_start[self.levels], 0.0)
+        self.table = AliasTable(weights)
+
+    def sample(self, rng:np.random.Generator, size:int) -> np.ndarray:
+        """
+        Draw size starts, as indices into GridTables.start_players and
+        GridTables.start_agents.
+        """
+        return self.table.sample(rng, size)
+
+    def update(self, starts:np.ndarray, hidden:np.ndarray, lengths:np.ndarray) -> None:
+        """
+        Record finished episodes: their starts (as returned by sample), whether
+        the agent hid, and their number of steps.
+        """
+        starts, hidden = np.asarray(starts), np.asarray(hidden, dtype=bool)
+        self.timesteps += int(np.sum(lengths))
+        for level, failed in zip(self.levels[starts[self.reachable[starts]]],
+                                 ~hidden[self.reachable[starts]]):
+            self.failure_rates[level] += (self.smoothing
+                                          * (float(failed) - self.failure_rates[level]))
+
+        previous = self.episodes
+        self.episodes += len(starts)
+        if self.episodes // self.rebuild_every != previous // self.rebuild_every:
+            self._build_table()
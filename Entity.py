@@ -31,9 +31,12 @@ class Entity:
     def move(self, dir:Vector2) -> None:
         self.pos += dir
 
-    def draw(self, board) -> None:
+    def draw(self, board, origin=Vector2(0,0)) -> None:
+        """
+        Draw the entity on the board, whose top-left cell is origin.
+        """
         CELL_SIZE = 32
-        pixel = self.pos * CELL_SIZE + CELL_SIZE//2
+        pixel = (self.pos - origin) * CELL_SIZE + CELL_SIZE//2
         cv2.circle(board, (pixel.x, pixel.y), CELL_SIZE//2-1, self.color, -1)
     
 
@@ -0,0 +1,244 @@
+"""
+Datasets of transitions stored as columns of .npy files, for offline analysis and
+behavior cloning.
+
+A dataset is a folder with a manifest.json and chunks of rows, one .npy file per
+column and per chunk (chunk_00000/obs.npy, chunk_00000/action.npy, ...):
+
+    obs         observation before the action (dtype of the observation type)
+    action      action of the agent (uint8)
+    reward      reward of the step (float32)
+    terminated  the agent is hidden after the action (bool)
+    truncated   the episode reached the time limit (bool)
+    distance    "distance" info after the action (uint16)
+
+The rows of an episode are contiguous, so the next observation of a row is the
+observation of the next row, until a terminated or truncated row.
+Chunks are written through memory maps and read back as memory maps, so batches
+are views of the files, without copies.
+
+See make_dataset.py to generate datasets.
+"""
+
+import json
+import os
+
+import gymnasium as gym
+import numpy as np
+
+MANIFEST = "manifest.json"
+
+
+def dataset_columns(observation_shape:tuple, observation_dtype) -> dict:
+    """
+    Columns of a dataset: name -> (dtype, shape of a row).
+    """
+    return {
+        "obs": (np.dtype(observation_dtype), tuple(observation_shape)),
+        "action": (np.dtype(np.uint8), ()),
+        "reward": (np.dtype(np.float32), ()),
+        "terminated": (np.dtype(bool), ()),
+        "truncated": (np.dtype(bool), ()),
+        "distance": (np.dtype(np.uint16), ()),
+    }
+
+
+class EpisodeDatasetWriter:
+    """
+    Write transitions to a new dataset, chunk by chunk.
+    """
+    def __init__(self, path:str, observation_space:gym.spaces.Box, chunk_size=1_000_000,
+                 metadata:dict=None) -> None:
+        """
+        Parameters
+        ----------
+        path : str
+            folder of the dataset, must not exist or be empty
+        observation_space : gym.spaces.Box
+            observation space of the environment
+        chunk_size : int, optional
+            rows per chunk, by default 1 000 000
+        metadata : dict, optional
+            JSON-serializable information stored in the manifest (map, policy...),
+            by default None
+        """
+        if os.path.exists(path) and os.listdir(path):
+            raise ValueError(f"{path} is not empty.")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.columns = dataset_columns(observation_space.shape, observation_space.dtype)
+        self.chunk_size = chunk_size
+        self.metadata = metadata or {}
+
+        self.chunks = [] # rows of each finished chunk
+        self.arrays = None # memory maps of the current chunk
+        self.rows = 0 # rows in the current chunk
+        self.nb_episodes = 0
+
+    def _chunk_dir(self, i:int) -> str:
+        return os.path.join(self.path, f"chunk_{i:05d}")
+
+    def _open_chunk(self) -> None:
+        folder = self._chunk_dir(len(self.chunks))
+        os.makedirs(folder)
+        self.arrays = {
+            name: np.lib.format.open_memmap(os.path.join(folder, f"{name}.npy"), mode="w+",
+                                            dtype=dtype, shape=(self.chunk_size,) + shape)
+            for name, (dtype, shape) in self.columns.items()
+        }
+        self.rows = 0
+
+    def _close_chunk(self) -> None:
+        folder = self._chunk_dir(len(self.chunks))
+        arrays, self.arrays = self.arrays, None
+        for name in list(arrays):
+            array = arrays.pop(name)
+            array.flush()
+            rows = np.array(array[:self.rows]) if self.rows < self.chunk_size else None
+            # last reference to the memory map: its file is closed, so that it can
+            # be replaced (Windows refuses to replace a mapped file)
+            del array
+            if rows is not None:
+                # last chunk: written again with its real size
+                path = os.path.join(folder, f"{name}.npy")
+                with open(path + ".tmp", "wb") as f:
+                    np.save(f, rows)
+                os.replace(path + ".tmp", path)
+        self.chunks.append(self.rows)
+
+    def append(self, columns:dict) -> None:
+        """
+        Append rows, given as one array per column (same length for all).
+        Episodes should be appended whole, in order.
+        """
+        length = len(columns["action"])
+        self.nb_episodes += int(np.count_nonzero(columns["terminated"] | columns["truncated"]))
+        start = 0
+        while start < length:
+            if self.arrays is None:
+                self._open_chunk()
+            count = min(length - start, self.chunk_size - self.rows)
+            for name, array in self.arrays.items():
+                array[self.rows:self.rows+count] = columns[name][start:start+count]
+            self.rows += count
+            start += count
+            if self.rows == self.chunk_size:
+                self._close_chunk()
+
+    def close(self) -> None:
+        """
+        Finish the last chunk and write the manifest.
+        """
+        if self.arrays is not None:
+            self._close_chunk()
+        manifest = {
+            "version": 1,
+            "rows": sum(self.chunks),
+            "episodes": self.nb_episodes,
+            "chunks": self.chunks,
+            "columns": {name: {"dtype": dtype.str, "shape": list(shape)}
+                        for name, (dtype, shape) in self.columns.items()},
+            "metadata": self.metadata,
+        }
+        with open(os.path.join(self.path, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+
+class EpisodeDataset:
+    """
+    Read a dataset written by EpisodeDatasetWriter, through memory maps.
+    """
+    def __init__(self, path:str) -> None:
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.metadata = self.manifest["metadata"]
+        self.column_names = list(self.manifest["columns"].keys())
+        self.chunks = [
+            {name: np.load(os.path.join(path, f"chunk_{i:05d}", f"{name}.npy"),
+                           mmap_mode="r")
+             for name in self.column_names}
+            for i in range(len(self.manifest["chunks"]))
+        ]
+
+    def __len__(self) -> int:
+        return self.manifest["rows"]
+
+    def column(self, name:str) -> list:
+        """
+        Memory maps of a column, one per chunk.
+        """
+        return [chunk[name] for chunk in self.chunks]
+
+    def iter_batches(self, batch_size:int, columns:list=None, shuffle=False,
+                     drop_last=False, seed=None):
+        """
+        Iterate over the rows by batches of contiguous rows. Batches do not span
+        chunks, so each one is a view of the memory maps (no copy); the last batch
+        of a chunk may be smaller.
+
+        Parameters
+        ----------
+        batch_size : int
+            rows per batch
+        columns : list, optional
+            columns of the batches, by default all of them
+        shuffle : bool, optional
+            visit the batches in random order, by default False. Rows of a batch
+            stay contiguous (they are from the same few episodes).
+        drop_last : bool, optional
+            skip the batches smaller than batch_size, by default False
+        seed : int, optional
+            seed of the shuffle, by default None
+
+        Yields
+        ------
+        dict
+            column name -> array of the batch
+        """
+        columns = self.column_names if columns is None else columns
+        batches = []
+        for i, rows in enumerate(self.manifest["chunks"]):
+            for start in range(0, rows, batch_size):
+                if drop_last and start + batch_size > rows:
+                    break
+                batches.append((i, start, min(start + batch_size, rows)))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(batches)
+
+        for i, start, end in batches:
+            yield {name: self.chunks[i][name][start:end] for name in columns}
+
+
+class RecordDataset(gym.Wrapper):
+    """
+    Write the transitions of a HideAndSeekEnv to a dataset. Transitions are kept
+    until their episode ends, so that the rows of an episode are contiguous.
+    """
+    def __init__(self, env:gym.Env, writer:EpisodeDatasetWriter) -> None:
+        super().__init__(env)
+        self.writer = writer
+        self.observation = None
+        self.episode = []
+
+    def reset(self, **kwargs):
+        # an episode that did not end is not written
+        self.episode = []
+        self.observation, info = self.env.reset(**kwargs)
+        return self.observation, info
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        self.episode.append((self.observation, action, reward, terminated, truncated,
+                             info["distance"]))
+        self.observation = observation
+        if terminated or truncated:
+            columns = zip(*self.episode)
+            self.writer.append({name: np.array(values) for name, values
+                                in zip(self.writer.columns.keys(), columns)})
+            self.episode = []
+        return observation, reward, terminated, truncated, info
+
+    def close(self) -> None:
+        self.writer.close()
+        super().close()
@@ -0,0 +1,268 @@
+"""
+Record episodes to video files without slowing down the game.
+
+Frames (uint8 boards from Game.render) are put in a bounded queue and encoded by
+a background thread, one MP4 (cv2.VideoWriter) or GIF (Pillow, optional) file
+per episode, or one file per group of episodes shown side by side in a grid.
+If the encoder falls behind and the queue is full, frames are dropped (and
+counted) instead of blocking the game.
+
+Usage with any environment in "rgb_array" mode:
+
+    recorder = EpisodeRecorder("videos", fps=10)
+    env = RecordEpisodes(HideAndSeekEnv(render_mode="rgb_array"), recorder, every=10)
+    ... play episodes ...
+    env.close() # also closes the recorder, once every video is written
+"""
+
+import os
+import queue
+import threading
+
+import cv2
+import gymnasium as gym
+import numpy as np
+
+
+class EpisodeRecorder:
+    """
+    Background encoder of episodes (see the module docstring).
+    """
+    def __init__(self, output_dir:str, fps=10, video_format="mp4", tile=None,
+                 queue_size=128) -> None:
+        """
+        Parameters
+        ----------
+        output_dir : str
+            folder of the videos, created if needed
+        fps : int, optional
+            frames per second of the videos, by default 10
+        video_format : str, optional
+            "mp4" or "gif" (needs Pillow), by default "mp4"
+        tile : Tuple[int, int], optional
+            (rows, columns): write rows*columns episodes side by side in one video,
+            by default None (one video per episode)
+        queue_size : int, optional
+            maximum number of frames waiting for the encoder, by default 128
+        """
+        if video_format not in ["mp4", "gif"]:
+            raise ValueError(f"Unknown video format '{video_format}', choose mp4 or gif.")
+        if video_format == "gif":
+            try:
+                import PIL # noqa: F401
+            except ImportError:
+                raise ImportError("Recording GIF files needs Pillow: pip install pillow")
+
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        self.output_dir = output_dir
+        self.fps = fps
+        self.video_format = video_format
+        self.tile = tile
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped_frames = 0
+        self.error = None
+        self.encoder = threading.Thread(target=self._encode, daemon=True)
+        self.encoder.start()
+
+    # --- called by the game loop ---
+
+    def start_episode(self, name:str) -> None:
+        """
+        Start recording an episode. Its video is named after it.
+        """
+        self._check_error()
+        self.queue.put(("start", str(name)))
+
+    def add_frame(self, frame:np.ndarray) -> None:
+        """
+        Add a frame (uint8 BGR image) to the current episode. Never blocks: the
+        frame is dropped if the encoder is behind.
+        """
+        try:
+            self.queue.put_nowait(("frame", frame))
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def end_episode(self) -> None:
+        self.queue.put(("end", None))
+
+    def close(self) -> None:
+        """
+        Wait until every video is written.
+        """
+        if self.encoder.is_alive():
+            self.queue.put(None)
+            self.encoder.join()
+        self._check_error()
+        if self.dropped_frames > 0:
+            print(f"EpisodeRecorder: {self.dropped_frames} frames dropped,"
+                  + " the encoder could not keep up")
+
+    def _check_error(self) -> None:
+        if self.error is not None:
+            raise self.error
+
+    # --- encoder thread ---
+
+    def _encode(self) -> None:
+        writer, name = None, None
+        episodes = [] # (name, PNG frames) of the current tile
+        try:
+            while True:
+                message = self.queue.get()
+                if message is None:
+                    break
+                kind, content = message
+
+                if kind == "start":
+                    name = content
+                    if self.tile is not None:
+                        episodes.append((name, []))
+                elif kind == "frame" and name is not None:
+                    if self.tile is not None:
+                        # PNG keeps the few colors of a board in a few kilobytes
+                        episodes[-1][1].append(cv2.imencode(".png", content)[1])
+                    else:
+                        if writer is None:
+                            writer = _VideoWriter(self._path(name), self.fps,
+                                                  self.video_format)
+                        writer.write(content)
+                elif kind == "end":
+                    if writer is not None:
+                        writer.close()
+                        writer = None
+                    name = None
+                    if self.tile is not None and len(episodes) == self.tile[0]*self.tile[1]:
+                        self._write_tile(episodes)
+                        episodes = []
+
+            if writer is not None:
+                writer.close()
+            if episodes:
+                self._write_tile(episodes)
+        except Exception as error:
+            self.error = error
+            # keep emptying the queue so that the game loop is never blocked
+            while self.queue.get() is not None:
+                pass
+
+    def _path(self, name:str) -> str:
+        return os.path.join(self.output_dir, f"{name}.{self.video_format}")
+
+    def _write_tile(self, episodes:list) -> None:
+        """
+        Write the episodes side by side, each one staying on its last frame once
+        it is over.
+        """
+        episodes = [(name, frames) for name, frames in episodes if frames]
+        if not episodes:
+            return
+        rows, columns = self.tile
+        first = cv2.imdecode(episodes[0][1][0], cv2.IMREAD_COLOR)
+        height, width, _ = first.shape
+        name = f"{episodes[0][0]}-{episodes[-1][0]}"
+        writer = _VideoWriter(self._path(name), self.fps, self.video_format)
+
+        canvas = np.full((rows*height, columns*width, 3), 255, dtype=np.uint8)
+        length = max(len(frames) for _, frames in episodes)
+        for t in range(length):
+            for i, (_, frames) in enumerate(episodes):
+                if t < len(frames):
+                    row, column = divmod(i, columns)
+                    canvas[row*height:(row+1)*height, column*width:(column+1)*width] = (
+                        cv2.imdecode(frames[t], cv2.IMREAD_COLOR))
+            writer.write(canvas)
+        writer.close()
+
+
+class _VideoWriter:
+    """
+    Same interface for MP4 (cv2.VideoWriter) and GIF (Pillow) files.
+    """
+    def __init__(self, path:str, fps:int, video_format:str) -> None:
+        self.path = path
+        self.fps = fps
+        self.video_format = video_format
+        self.writer = None
+        self.images = []
+
+    def write(self, frame:np.ndarray) -> None:
+        if self.video_format == "gif":
+            from PIL import Image
+            self.images.append(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+            return
+        if self.writer is None:
+            height, width, _ = frame.shape
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*"mp4v"),
+                                          self.fps, (width, height))
+        self.writer.write(frame)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.release()
+        if self.images:
+            self.images[0].save(self.path, save_all=True, append_images=self.images[1:],
+                                duration=int(1000/self.fps), loop=0)
+
+
+class RecordEpisodes(gym.Wrapper):
+    """
+    Record every k-th episode of an environment in "rgb_array" mode with an
+    EpisodeRecorder.
+    """
+    def __init__(self, env:gym.Env, recorder:EpisodeRecorder, every=1,
+                 max_episodes=None, name_prefix="episode") -> None:
+        """
+        Parameters
+        ----------
+        env : gym.Env
+            environment in "rgb_array" render mode
+        recorder : EpisodeRecorder
+            recorder of the episodes, closed with the environment
+        every : int, optional
+            record one episode every k episodes, by default 1 (all of them)
+        max_episodes : int, optional
+            do not record episodes after this number of episodes, by default None
+            (no limit). For instance the episode started by the last reset of a
+            VecEnv, that is never played.
+        name_prefix : str, optional
+            videos are named <name_prefix>_<episode index>, by default "episode"
+        """
+        super().__init__(env)
+        assert env.render_mode == "rgb_array", "Episodes are recorded in rgb_array mode."
+        self.recorder = recorder
+        self.every = every
+        self.max_episodes = max_episodes
+        self.name_prefix = name_prefix
+        self.episode = -1
+        self.recording = False
+
+    def reset(self, **kwargs):
+        if self.recording:
+            self.recorder.end_episode()
+        observation, info = self.env.reset(**kwargs)
+        self.episode += 1
+        self.recording = (self.episode % self.every == 0
+                          and (self.max_episodes is None or self.episode < self.max_episodes))
+        if self.recording:
+            self.recorder.start_episode(f"{self.name_prefix}_{self.episode}")
+            self.recorder.add_frame(self.env.render())
+        return observation, info
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        if self.recording:
+            self.recorder.add_frame(self.env.render())
+            if terminated or truncated:
+                self.recorder.end_episode()
+                self.recording = False
+        return observation, reward, terminated, truncated, info
+
+    def close(self) -> None:
+        if self.recording:
+            self.recorder.end_episode()
+            self.recording = False
+        self.recorder.close()
+        super().close()
@@ -0,0 +1,81 @@
+"""
+Fast evaluation of a policy on many games at once with a BatchedGame.
+
+The observations of all the games are given to a single predict() call per step,
+instead of one call per game and per step as with evaluate_policy on a
+HideAndSeekEnv. The statistics are accumulated as the episodes finish (see
+Metrics.py), so the memory used does not grow with nb_episodes.
+"""
+
+import numpy as np
+
+from BatchedGame import BatchedGame
+from Metrics import RunMetrics, RunningStats
+
+
+def evaluate_batched(policy, batch:BatchedGame, nb_episodes:int, seed=None,
+                     metrics:RunMetrics=None) -> dict:
+    """
+    Play nb_episodes episodes with the games of batch and return statistics.
+    As in evaluate_policy, each game plays a fixed share of the episodes, so that
+    short episodes are not over-represented.
+
+    Parameters
+    ----------
+    policy : DQN, TabularPolicy or MlpQPolicy
+        any policy with a predict() method like DQN.predict()
+    batch : BatchedGame
+        the games to play, with the observation type of the policy
+    nb_episodes : int
+        number of episodes to play
+    seed : int, optional
+        seed the games before playing, by default None (not seeded)
+    metrics : RunMetrics, optional
+        also record the steps and the episodes there, to follow a long
+        evaluation (see Metrics.py), by default None
+
+    Returns
+    -------
+    dict
+        mean_reward, std_reward, hide_rate (fraction of the episodes where the
+        agent hides before the time limit), steps_to_hide (mean length of those
+        episodes, NaN if none) and mean_length
+    """
+    if seed is not None:
+        batch.seed(seed)
+    batch.reset()
+
+    n = batch.n_games
+    targets = np.array([(nb_episodes + i) // n for i in range(n)])
+    counts = np.zeros(n, dtype=np.int64)
+    returns = np.zeros(n)
+    rewards, lengths, hidden_lengths = RunningStats(), RunningStats(), RunningStats()
+
+    while (counts < targets).any():
+        actions, _ = policy.predict(batch.get_observations(), deterministic=True)
+        step_rewards, terminated, truncated = batch.step(np.asarray(actions))
+        returns += step_rewards
+        if metrics is not None:
+            metrics.record_steps(n)
+
+        finished = np.nonzero(terminated | truncated)[0]
+        if len(finished) == 0:
+            continue
+        recorded = finished[counts[finished] < targets[finished]]
+        rewards.add_many(returns[recorded])
+        lengths.add_many(batch.steps[recorded])
+        hidden_lengths.add_many(batch.steps[recorded[terminated[recorded]]])
+        if metrics is not None:
+            for i in recorded:
+                metrics.record_episode(returns[i], batch.steps[i], terminated[i])
+        counts[recorded] += 1
+        returns[finished] = 0
+        batch.reset(finished)
+
+    return {
+        "mean_reward": rewards.mean,
+        "std_reward": rewards.std,
+        "hide_rate": hidden_lengths.count / lengths.count,
+        "steps_to_hide": hidden_lengths.mean if hidden_lengths.count > 0 else float("nan"),
+        "mean_length": lengths.mean,
+    }
@@ -0,0 +1,139 @@
+"""
+Observations made of the last k observations of an environment.
+
+With a moving seeker, the current observation does not tell where the player
+is going. FrameHistory (for HideAndSeekEnv) and VecFrameHistory (for
+VecHideAndSeekEnv, SharedMemoryVecEnv or any VecEnv) return the last k
+observations, the newest first, as a single flat observation of the same
+dtype as the wrapped one, so they work with every ObservationType and with
+MaskedDQN (the positions of the current observation stay in front).
+
+The history is a buffer of capacity observations allocated once, written
+from the end to the start: the last k observations are always k consecutive
+slots, so the stacked observation of VecFrameHistory is a view of the buffer,
+without any copy or allocation per step. FrameHistory returns a copy of it (k
+observations of one environment), as gymnasium environments are expected to.
+When the start of the buffer is reached, or when an episode restarts, the last
+k-1 observations are copied to a free part of the buffer and writing continues
+from there, so the previous stacked observation is never overwritten by the
+next step (SB3 keeps it until the transition is stored in the replay buffer).
+
+    env = FrameHistory(HideAndSeekEnv(seeker_policy="chase_last_seen"), k=4)
+    env = VecFrameHistory(VecHideAndSeekEnv(8), k=4)
+"""
+
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnvWrapper
+
+
+def stacked_space(observation_space:spaces.Box, k:int) -> spaces.Box:
+    """
+    Space of k observations of observation_space, one after the other.
+    """
+    return spaces.Box(low=np.tile(observation_space.low.ravel(), k),
+                      high=np.tile(observation_space.high.ravel(), k),
+                      dtype=observation_space.dtype)
+
+
+class _RingBuffer:
+    """
+    Last k observations of n environments, in a (n, capacity, size) array.
+    """
+    def __init__(self, n:int, k:int, size:int, dtype:np.dtype, capacity:int=None) -> None:
+        self.k = k
+        # at least 3k slots, so that a jump never lands on the previous window
+        capacity = max(3 * k, 16 * k if capacity is None else capacity)
+        self.buffer = np.zeros((n, capacity, size), dtype=dtype)
+        self.position = capacity - k # slot of the newest observation, going down
+
+    def push(self, observations:np.ndarray, restarted=None) -> None:
+        """
+        Add the new observation of every environment. The history of the
+        restarted environments (indices, all of them if True) is filled with
+        their new observation.
+        """
+        observations = observations.reshape(self.buffer[:, 0].shape)
+        previous, k = self.position, self.k
+        if restarted is None and previous > 0:
+            self.position -= 1
+        else:
+            # jump to k free slots before the previous window, or at the end of
+            # the buffer, and copy the observations kept from the previous window
+            position = previous - k if previous >= k else self.buffer.shape[1] - k
+            self.buffer[:, position+1:position+k] = self.buffer[:, previous:previous+k-1]
+            self.position = position
+        self.buffer[:, self.position] = observations
+        if restarted is True:
+            restarted = slice(None)
+        if restarted is not None:
+            self.buffer[restarted, self.position:self.position+k] = observations[restarted, None]
+
+    def stacked(self) -> np.ndarray:
+        """
+        (n, k * size) view of the last k observations of each environment,
+        the newest first.
+        """
+        window = self.buffer[:, self.position:self.position + self.k]
+        return window.reshape(len(self.buffer), -1)
+
+
+class FrameHistory(gym.Wrapper):
+    """
+    Observations of the last k steps of a gymnasium environment, the newest
+    first. The first observation of an episode fills the whole history.
+    Each returned observation is a new array, that callers can keep.
+    """
+    def __init__(self, env:gym.Env, k:int=4) -> None:
+        super().__init__(env)
+        self.k = k
+        self.observation_space = stacked_space(env.observation_space, k)
+        self.history = _RingBuffer(1, k, int(np.prod(env.observation_space.shape)),
+                                   env.observation_space.dtype)
+
+    def reset(self, **kwargs):
+        observation, info = self.env.reset(**kwargs)
+        self.history.push(observation, restarted=True)
+        return self.history.stacked()[0].copy(), info
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        self.history.push(observation)
+        return self.history.stacked()[0].copy(), reward, terminated, truncated, info
+
+
+class VecFrameHistory(VecEnvWrapper):
+    """
+    Observations of the last k steps of each environment of a VecEnv, the
+    newest first. The first observation of an episode fills the whole history
+    of its environment, and the terminal observation in the infos is stacked
+    with the history of the finished episode.
+
+    The returned observations are a view of the history buffer: they are valid
+    until the next step() (SB3 copies them into its replay buffer before), and
+    the one before stays valid too, but a caller keeping them longer must copy
+    them.
+    """
+    def __init__(self, venv, k:int=4) -> None:
+        self.k = k
+        super().__init__(venv, observation_space=stacked_space(venv.observation_space, k))
+        self.history = _RingBuffer(venv.num_envs, k,
+                                   int(np.prod(venv.observation_space.shape)),
+                                   venv.observation_space.dtype)
+
+    def reset(self) -> np.ndarray:
+        self.history.push(self.venv.reset(), restarted=True)
+        return self.history.stacked()
+
+    def step_wait(self):
+        observations, rewards, dones, infos = self.venv.step_wait()
+        finished = np.nonzero(dones)[0]
+        for i in finished:
+            if "terminal_observation" in infos[i]:
+                # only at the end of an episode, so this copy is rare
+                previous = self.history.stacked()[i, :-self.history.buffer.shape[2]]
+                infos[i]["terminal_observation"] = np.concatenate(
+                    [infos[i]["terminal_observation"].ravel(), previous])
+        self.history.push(observations, finished if len(finished) > 0 else None)
+        return self.history.stacked(), rewards, dones, infos
@@ -0,0 +1,115 @@
+"""
+Frame pacing without busy waiting.
+
+A FrameScheduler keeps a fixed schedule of frame deadlines on a monotonic clock
+(time.perf_counter). wait() sleeps until the next deadline instead of spinning,
+and frame_due() tells without blocking whether a frame should be shown, so that a
+loop can run faster than the display and only show some of its frames.
+When the loop falls behind by more than a frame, the missed frames are dropped
+and the schedule starts again from now, instead of rushing to catch up.
+"""
+
+import time
+
+
+class FrameScheduler:
+    """
+    Schedule of frames at a fixed rate, with drift and dropped frame statistics.
+    """
+    def __init__(self, fps:float) -> None:
+        """
+        Parameters
+        ----------
+        fps : float
+            frames per second. 0 or None for no pacing (wait() returns at once
+            and every frame is due).
+        """
+        self.period = 1/fps if fps else 0.0
+        self.deadline = None # deadline of the next frame
+
+        self.frames = 0
+        self.dropped = 0
+        self.total_drift = 0.0
+        self.max_drift = 0.0
+
+    def reset(self) -> None:
+        """
+        Forget the schedule: the next frame starts a new one.
+        """
+        self.deadline = None
+
+    def time_until_next_frame(self) -> float:
+        """
+        Seconds until the deadline of the next frame (0 if it has passed).
+        """
+        if self.deadline is None:
+            return 0.0
+        return max(0.0, self.deadline - time.perf_counter())
+
+    def wait(self) -> int:
+        """
+        Sleep until the deadline of the next frame.
+
+        Returns
+        -------
+        int
+            number of frames dropped because the loop was more than a frame late
+        """
+        self.frames += 1
+        if self.period == 0:
+            return 0
+
+        now = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = now + self.period
+        late = now - self.deadline
+
+        dropped = 0
+        if late > self.period:
+            dropped = int(late // self.period)
+            self.deadline = now
+        elif late < 0:
+            time.sleep(-late)
+
+        # how late the frame really starts (sleep overshoot or lateness)
+        self._record_drift(time.perf_counter() - self.deadline)
+        self.dropped += dropped
+        self.deadline += self.period
+        return dropped
+
+    def frame_due(self) -> bool:
+        """
+        Without blocking, tell if the deadline of the next frame has passed. If so,
+        the frame is counted and the next deadline is scheduled.
+        """
+        now = time.perf_counter()
+        if self.deadline is not None and now < self.deadline:
+            return False
+
+        self.frames += 1
+        if self.deadline is None or self.period == 0:
+            self.deadline = now + self.period
+            return True
+
+        late = now - self.deadline
+        self._record_drift(late)
+        if late > self.period:
+            self.dropped += int(late // self.period)
+            self.deadline = now
+        self.deadline += self.period
+        return True
+
+    def _record_drift(self, drift:float) -> None:
+        self.total_drift += drift
+        self.max_drift = max(self.max_drift, drift)
+
+    def stats(self) -> dict:
+        """
+        Number of frames, dropped frames, mean and max drift (milliseconds).
+        """
+        return {
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "mean_drift_ms": 1000 * self.total_drift / max(self.frames, 1),
+            "max_drift_ms": 1000 * self.max_drift,
+        }
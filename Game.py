@@ -5,16 +5,25 @@ import numpy as np
 
 import Colors
 import Maps
+from ChunkedGrid import ChunkedGrid
 from Entity import Entity
+from FrameScheduler import FrameScheduler
 from Vector2 import Vector2
 
+# maps with more cells are stored as a ChunkedGrid, see _load_map()
+LARGE_MAP_CELLS = 64 * 64
+# number of cells shown by render() in each direction, around the agent on
+# bigger maps
+RENDER_VIEW = 32
+
 
 class Game:
     """
     Game class. Contains the grid, the player and the agent.
 
     """
-    def __init__(self, mode=None, map_name=Maps.DEFAULT_MAP) -> None:
+    def __init__(self, mode=None, map_name=Maps.DEFAULT_MAP, map_size=(12, 12),
+                 nb_players=1, nb_agents=1, seed=None, sight_range=None) -> None:
         """
         Initialize the game
 
@@ -23,13 +32,32 @@ class Game:
         mode : str, optional
             "human" to play it and render it, else None (for AI training),
             by default None
-        map_name : str, optional
+        map_name : str or list, optional
             name of the map to load, by default "statement", the map that is in the pdf
             statement. See Maps.py for the list of available maps.
             If "random", a random map is generated. See generate_random_map() for more.
+            A map itself (list of rows, as in Maps.py) is also accepted.
+        map_size : Tuple[int, int], optional
+            (width, height) of the map if map_name is "random", by default (12, 12)
+        nb_players : int, optional
+            number of players (seekers), by default 1
+        nb_agents : int, optional
+            number of agents (hiders), by default 1.
+            With several players and agents, an agent is seen if at least one
+            player sees it. self.player and self.agent are the first of each.
+        seed : int, optional
+            seed of the random number generator used for the random map and the
+            start positions, by default None. See seed().
+        sight_range : int, optional
+            largest diagonal distance at which a player sees an agent, by
+            default None (no limit). With a sight range, the cost of a step and
+            of a reset only depends on it, not on the size of the map.
         """
 
+        self.rng = random.Random(seed)
         self.map_name = map_name
+        self.map_size = map_size
+        self.sight_range = sight_range
         self.grid = self._load_map(map_name) # contains the map
         
         
@@ -39,31 +67,60 @@ class Game:
 
         self.SPEED = 12
         self.CELL_SIZE = 32
-        self.WIDTH = self.GRID_W * self.CELL_SIZE
-        self.HEIGHT = self.GRID_H * self.CELL_SIZE
-
-        self.player = Entity(Vector2(0,0), Colors.RED)
-        self.agent = Entity(Vector2(1,1), Colors.BLUE)
-
-        self.nb_walls = 0
-        self.wall_positions = []
-        for y in range(self.GRID_H):
-            for x in range(self.GRID_W):
-                if self._is_wall(Vector2(x, y)):
-                    self.wall_positions.append(Vector2(x, y))
-                    self.nb_walls += 1
+        # render() shows the whole map, or RENDER_VIEW cells around the agent
+        self.VIEW_W = min(self.GRID_W, RENDER_VIEW)
+        self.VIEW_H = min(self.GRID_H, RENDER_VIEW)
+        self.WIDTH = self.VIEW_W * self.CELL_SIZE
+        self.HEIGHT = self.VIEW_H * self.CELL_SIZE
+
+        self.players = [Entity(Vector2(0,0), Colors.RED) for _ in range(nb_players)]
+        self.agents = [Entity(Vector2(1,1), Colors.BLUE) for _ in range(nb_agents)]
+        self.player = self.players[0]
+        self.agent = self.agents[0]
+
+        self._wall_positions = None # see wall_positions, only listed when needed
         
         # "human" to play it and render it, else None (for AI training)
         self.mode = mode
+        self._background = None # walls of the display board, see render()
+        self._background_origin = None # top-left cell of self._background
 
         if self.mode == "human":
             self.init_game_start()
 
 
+    @property
+    def is_large(self) -> bool:
+        """
+        True if the map is stored as a ChunkedGrid (more than LARGE_MAP_CELLS cells).
+        """
+        return isinstance(self.grid, ChunkedGrid)
+
+    @property
+    def wall_positions(self) -> list:
+        """
+        Positions of all the walls, listed on the first access.
+        """
+        if self._wall_positions is None:
+            if self.is_large:
+                cells = self.grid.wall_cells()
+            else:
+                cells = ((x, y) for y in range(self.GRID_H) for x in range(self.GRID_W)
+                         if self.grid[y][x] == Maps.WALL)
+            self._wall_positions = [Vector2(x, y) for x, y in cells]
+        return self._wall_positions
+
+    @property
+    def nb_walls(self) -> int:
+        if self.is_large:
+            return self.grid.nb_walls
+        return len(self.wall_positions)
+
     def _load_map(self, map_name:str) -> list:
         """
         Load the map from Maps.py.
         If map_name == "random", generate a random map instead.
+        Maps of more than LARGE_MAP_CELLS cells are stored as a ChunkedGrid.
 
         Parameters
         ----------
@@ -75,14 +132,25 @@ class Game:
         list
             the map as a list of lists
         """
+        if isinstance(map_name, ChunkedGrid):
+            return map_name
+        if not isinstance(map_name, str):
+            rows = list(map_name)
+            if len(rows) * len(rows[0]) > LARGE_MAP_CELLS:
+                return ChunkedGrid.from_rows(rows)
+            return rows
         if map_name != "random":
             if map_name in Maps.MAPS:
                 return Maps.MAPS[map_name]
             else:
                 raise ValueError(f"Map '{map_name}' does not exist. Please choose one"
                                 + f" of {Maps.MAPS.keys()}")
+        elif self.map_size[0] * self.map_size[1] > LARGE_MAP_CELLS:
+            # same walls as generate_random_map(), without building the rows
+            return ChunkedGrid.random(self.map_size[0], self.map_size[1], self.rng)
         else:
-            return self.generate_random_map(width=12, height=12)
+            return self.generate_random_map(width=self.map_size[0],
+                                            height=self.map_size[1])
 
     def generate_random_map(self, width=12, height=12, nb_walls=None) -> list:
         """
@@ -98,45 +166,130 @@ class Game:
             height of the grid, by default 12
         nb_walls : int, optional
             number of walls to place, by default None,
-            if None, it is random between 16 and 36 (works nice with 12x12 grid,
-            but should be adjusted for other grid sizes...)
+            if None, a quarter of the cells (36 on a 12x12 grid)
         """
 
         if nb_walls is None:
-            nb_walls = random.randint(16, 36)
-            nb_walls = 36
+            nb_walls = width * height // 4
         
         grid = [[Maps.EMPTY for _ in range(width)] for _ in range(height)]
         
 
         for _ in range(nb_walls):
-            x = random.randint(1, width-2)
-            y = random.randint(1, height-2)
+            x = self.rng.randint(1, width-2)
+            y = self.rng.randint(1, height-2)
             grid[y][x] = Maps.WALL
 
         return grid
         
 
-    def init_game_start(self) -> None:
+    def seed(self, seed=None) -> None:
+        """
+        Seed the random number generator of the game. The start positions drawn
+        by init_game_start() only depend on the seed.
+        """
+        self.rng.seed(seed)
+
+    def init_game_start(self, can_see=None) -> None:
         """
         Initialize the game state (player and agent positions)
         Place player and agent at random but the player must see the agent
+        With several players and agents, players are placed first, then each agent
+        is placed where at least one player sees it.
+        With a sight range, the agent is drawn among the cells within the sight
+        range of the player.
+
+        Parameters
+        ----------
+        can_see : callable, optional
+            can_see(player, agent) used instead of self.can_see with one player
+            and one agent, for instance GameKernel.can_see, by default None
         """
 
+        if len(self.players) > 1 or len(self.agents) > 1:
+            self._init_multi_game_start()
+            return
+
+        if can_see is None:
+            can_see = self.can_see
+
         while True:
             self._place_entity_at_random(self.player)
-            self._place_entity_at_random(self.agent)
+            if self.sight_range is None:
+                self._place_entity_at_random(self.agent)
+            else:
+                self._place_entity_at_random(self.agent, around=self.player.pos,
+                                             radius=self.sight_range)
             
              # No collision between player and agent
             if self.player.pos == self.agent.pos:
                 continue
 
-            if self.player.can_see(self.agent, self.grid):
+            if can_see(self.player, self.agent):
                 break
         
         self.agent.is_seen = True
 
 
+    def _init_multi_game_start(self) -> None:
+        """
+        init_game_start() for several players and agents.
+        """
+        placed = []
+        for entity in self.players + self.agents:
+            while True:
+                self._place_entity_at_random(entity)
+                if any(other.pos == entity.pos for other in placed):
+                    continue
+                if (entity in self.players
+                    or any(self.can_see(player, entity) for player in self.players)):
+                    break
+            placed.append(entity)
+
+        for agent in self.agents:
+            agent.is_seen = True
+
+    def _is_occupied(self, coord:Vector2, ignore:Entity=None) -> bool:
+        """
+        Check if a player or an agent (other than ignore) is on the coordinates.
+
+        Parameters
+        ----------
+        coord : Vector2
+            coordinates to check
+        ignore : Entity, optional
+            entity not taken into account, by default None
+
+        Returns
+        -------
+        bool
+            True if an entity is on the coordinates, False otherwise
+        """
+        return any(entity is not ignore and entity.pos == coord
+                   for entity in self.players + self.agents)
+
+    def can_see(self, player:Entity, agent:Entity) -> bool:
+        """
+        True if the player sees the agent: no wall on the line between them
+        (see Entity.can_see) and, with a sight range, the agent is within it.
+        On a ChunkedGrid, the cells seen by a player are computed once per cell
+        of the player (see ChunkedGrid.visible_window).
+        """
+        if self.sight_range is None:
+            return player.can_see(agent, self.grid)
+        if self.is_large:
+            return self.grid.sees(player.x, player.y, agent.x, agent.y, self.sight_range)
+        return (player.pos.diagonal_distance_to(agent.pos) <= self.sight_range
+                and player.can_see(agent, self.grid))
+
+    def _update_seen(self) -> None:
+        """
+        Update is_seen of every agent: an agent is seen if at least one player
+        sees it.
+        """
+        for agent in self.agents:
+            agent.is_seen = any(self.can_see(player, agent) for player in self.players)
+
     def _cell_to_pixel(self, cell:int, center=False) -> int:
         """
         Given a cell index, return the top-left pixel position of the cell.
@@ -172,10 +325,10 @@ class Game:
         thickness : int, optional, by default 1
             thickness of the grid lines
         """
-        width, height, _ = board.shape 
+        height, width, _ = board.shape 
 
         # draw vertical lines
-        for cell_x in range(self.GRID_W):
+        for cell_x in range(self.VIEW_W):
             pixel_x = self._cell_to_pixel(cell_x) 
             cv2.line(board, (pixel_x,0), (pixel_x, height),
                      color=color,
@@ -183,7 +336,7 @@ class Game:
             )
 
         # draw horizontal lines
-        for cell_y in range(self.GRID_H):
+        for cell_y in range(self.VIEW_H):
             pixel_y = self._cell_to_pixel(cell_y)
             cv2.line(board, (0, pixel_y), (width, pixel_y),
                      color=color,
@@ -209,7 +362,8 @@ class Game:
         board[(cell_y*self.CELL_SIZE):((cell_y+1)*self.CELL_SIZE),
               (cell_x*self.CELL_SIZE):((cell_x+1)*self.CELL_SIZE)] = color
 
-    def _place_entity_at_random(self, entity:Entity) -> None:
+    def _place_entity_at_random(self, entity:Entity, around:Vector2=None,
+                                radius:int=0) -> None:
         """
         Place an entity at random on the grid, avoiding walls.
 
@@ -217,11 +371,20 @@ class Game:
         ----------
         entity : Entity
             entity to place on the grid
+        around : Vector2, optional
+            if given, the entity is placed at a diagonal distance of at most
+            radius from it, by default None (anywhere on the grid)
+        radius : int, optional
+            see around, by default 0
         """
 
+        x_min, y_min, x_max, y_max = 0, 0, self.GRID_W-1, self.GRID_H-1
+        if around is not None:
+            x_min, y_min = max(x_min, around.x - radius), max(y_min, around.y - radius)
+            x_max, y_max = min(x_max, around.x + radius), min(y_max, around.y + radius)
         while True:
-            x = random.randint(0, self.GRID_W-1)
-            y = random.randint(0, self.GRID_H-1)
+            x = self.rng.randint(x_min, x_max)
+            y = self.rng.randint(y_min, y_max)
             if self.grid[y][x] == Maps.EMPTY:
                 entity.pos = Vector2(x, y)
                 break
@@ -250,47 +413,66 @@ class Game:
             thickness of the line
         """
 
-        start_pixel_x = self._cell_to_pixel(start_cell_x, center=True)
-        start_pixel_y = self._cell_to_pixel(start_cell_y, center=True)
-        target_pixel_x = self._cell_to_pixel(target_cell_x, center=True)
-        target_pixel_y = self._cell_to_pixel(target_cell_y, center=True)
+        origin = self._view_origin()
+        start_pixel_x = self._cell_to_pixel(start_cell_x - origin.x, center=True)
+        start_pixel_y = self._cell_to_pixel(start_cell_y - origin.y, center=True)
+        target_pixel_x = self._cell_to_pixel(target_cell_x - origin.x, center=True)
+        target_pixel_y = self._cell_to_pixel(target_cell_y - origin.y, center=True)
         cv2.line(board,
                  (start_pixel_x, start_pixel_y),
                  (target_pixel_x, target_pixel_y),
                  color=color, thickness=thickness
         )
 
+    def _view_origin(self) -> Vector2:
+        """
+        Top-left cell of the part of the map shown by render(): (0, 0) if the
+        whole map fits in RENDER_VIEW cells, else the view is centered on the
+        agent (within the map).
+        """
+        x = min(max(0, self.agent.x - self.VIEW_W // 2), self.GRID_W - self.VIEW_W)
+        y = min(max(0, self.agent.y - self.VIEW_H // 2), self.GRID_H - self.VIEW_H)
+        return Vector2(x, y)
+
     def render(self) -> np.ndarray:
         """
         Render the game state on a display board, and returns it.
+        On maps bigger than RENDER_VIEW cells, only the RENDER_VIEW cells around
+        the agent are shown.
 
         Returns
         -------
         np.ndarray
-            display board
+            display board, (HEIGHT, WIDTH, 3) uint8 BGR image
         """
-        board = np.zeros((self.WIDTH, self.HEIGHT, 3))+255 # white background
-
-        # render walls
-        for y in range(self.GRID_H):
-            for x in range(self.GRID_W):
-                if self._is_wall(Vector2(x, y)):
-                    self._fill_cell(board, x, y, Colors.BLACK)
+        # white background with the walls, drawn again only when the view moves
+        # as the map does not change
+        origin = self._view_origin()
+        if self._background is None or self._background_origin != origin:
+            self._background = np.full((self.HEIGHT, self.WIDTH, 3), 255, dtype=np.uint8)
+            for y in range(self.VIEW_H):
+                for x in range(self.VIEW_W):
+                    if self._is_wall(Vector2(origin.x + x, origin.y + y)):
+                        self._fill_cell(self._background, x, y, Colors.BLACK)
+            self._background_origin = origin
+        board = self._background.copy()
                     
-        # render player and agent
-        self.player.draw(board)
-        self.agent.draw(board)
+        # render players and agents
+        for entity in self.players + self.agents:
+            entity.draw(board, origin)
 
         self._draw_grid(board)
 
-        # Render line between player and agent
+        # Render line between each agent and its closest player
         # If the agent is seen, the line is green, otherwise it is red
-        see_color = Colors.GREEN if self.agent.is_seen else Colors.RED
-
-        self._draw_line(board, self.player.x, self.player.y,
-                        self.agent.x, self.agent.y,
-                        see_color, thickness=3
-)
+        for agent in self.agents:
+            player = min(self.players, key=lambda p: p.pos.manhattan_distance(agent.pos))
+            see_color = Colors.GREEN if agent.is_seen else Colors.RED
+
+            self._draw_line(board, player.x, player.y,
+                            agent.x, agent.y,
+                            see_color, thickness=3
+    )
         # Display only if in human mode
         if self.mode == "human":
             cv2.imshow("Hide and Seek", board)
@@ -298,27 +480,35 @@ class Game:
         return board
 
 
-    def handle_inputs(self) -> bool:
+    def handle_inputs(self, wait_ms:int=None) -> bool:
         """
         Handle keyboard inputs in human mode.
         ZQSD to move the player, IJKL to move the agent.
         x, delete or escape to exit the game.
+
+        Parameters
+        ----------
+        wait_ms : int, optional
+            maximum time to wait for a key in milliseconds, by default one frame
+            (1000/SPEED)
         """
-        key = cv2.waitKey(int(1000/self.SPEED))
+        if wait_ms is None:
+            wait_ms = int(1000/self.SPEED)
+        key = cv2.waitKey(max(1, wait_ms))
 
         # delete and escape keys to exit the game
         if key in [8, 27, ord('x')]:
             return True
         
-        new_pos = Vector2(self.player.pos.x, self.player.pos.y)
+        player_action = None
         if key == ord('q'): # player left
-            new_pos.x -= 1
+            player_action = 0
         elif key == ord('d'): # player right
-            new_pos.x += 1
+            player_action = 1
         elif key == ord('z'): # player up
-            new_pos.y -= 1
+            player_action = 2
         elif key == ord('s'): # player down
-            new_pos.y += 1
+            player_action = 3
         if key == ord('i'): # agent up
             self.handle_action(2)
         elif key == ord('j'): # agent left
@@ -328,16 +518,8 @@ class Game:
         elif key == ord('l'): # agent right
             self.handle_action(1)
         
-        # Make the move only if the new position is valid
-        if (self._is_valid_coordinates(new_pos)
-            and not self._is_wall(new_pos)
-            and new_pos != self.agent.pos):
-            self.player.pos = new_pos
-
-        if self.player.can_see(self.agent, self.grid):
-            self.agent.is_seen = True
-        else:
-            self.agent.is_seen = False
+        if player_action is not None:
+            self.handle_player_action(player_action)
 
         return False
     
@@ -399,13 +581,40 @@ class Game:
         
         if (self._is_valid_coordinates(new_pos)
             and not self._is_wall(new_pos)
-            and new_pos != self.player.pos):
+            and not self._is_occupied(new_pos)):
             self.agent.pos = new_pos
         
-        if self.player.can_see(self.agent, self.grid):
-            self.agent.is_seen = True
-        else:
-            self.agent.is_seen = False
+        self._update_seen()
+
+
+    def handle_player_action(self, action) -> None:
+        """
+        Handle the action of the player (the seeker).
+        Same rules as the agent: the player cannot move through walls, outside the
+        grid or onto another entity.
+        The action are:
+            0: move left
+            1: move right
+            2: move up
+            3: move down
+            4: stay in place
+        """
+        new_pos = Vector2(self.player.pos.x, self.player.pos.y)
+        if action == 0:
+            new_pos.x -= 1
+        elif action == 1:
+            new_pos.x += 1
+        elif action == 2:
+            new_pos.y -= 1
+        elif action == 3:
+            new_pos.y += 1
+
+        if (self._is_valid_coordinates(new_pos)
+            and not self._is_wall(new_pos)
+            and not self._is_occupied(new_pos)):
+            self.player.pos = new_pos
+
+        self._update_seen()
 
 
     def run(self) -> None:
@@ -413,12 +622,16 @@ class Game:
         Run the game.
         """
         print("Run")
+        # A key returns from waitKey before the end of the frame, the scheduler
+        # sleeps the rest of it so that the game runs at SPEED frames per second
+        scheduler = FrameScheduler(self.SPEED)
         while True:
             self.render()
 
-            quit = self.handle_inputs()
+            quit = self.handle_inputs(int(1000*scheduler.time_until_next_frame()))
             if quit:
                 break
+            scheduler.wait()
         
         cv2.destroyAllWindows()
 
@@ -0,0 +1,142 @@
+"""
+The rules of one game (moves, visibility, observation) as functions over a NumPy
+grid of walls and integer coordinates, compiled with Numba when it is installed.
+
+This is the "numba" backend of HideAndSeekEnv: one step is two calls to
+compiled functions instead of Vector2 arithmetic, Entity.can_see and the Python
+loops of ObservationType.get_observation. The results are the same as Game and
+ObservationType (see check_backends.py). Without Numba, the same functions run
+as plain Python.
+"""
+
+import numpy as np
+
+import Maps
+from ChunkedGrid import ChunkedGrid
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """
+        Without Numba, functions are not compiled.
+        """
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+def walls_of(grid) -> np.ndarray:
+    """
+    walls[y, x] is True if the cell (x, y) of the grid is a wall.
+    """
+    if isinstance(grid, ChunkedGrid):
+        return grid.to_array()
+    return np.array([[cell == Maps.WALL for cell in row] for row in grid])
+
+
+@njit(cache=True)
+def can_see(walls:np.ndarray, x0:int, y0:int, x1:int, y1:int) -> bool:
+    """
+    Same as Entity.can_see: the n+1 points of the line from (x0, y0) to (x1, y1),
+    rounded to the nearest cell, must not be walls.
+    """
+    dx, dy = x1 - x0, y1 - y0
+    n = max(abs(dx), abs(dy))
+    for step in range(n + 1):
+        t = 0.0 if n == 0 else step / n
+        # round() rounds halves to even, as Vector2.round
+        if walls[round(y0 + dy * t), round(x0 + dx * t)]:
+            return False
+    return True
+
+
+@njit(cache=True)
+def move(walls:np.ndarray, x:int, y:int, action:int, other_x:int, other_y:int):
+    """
+    Same as Game.handle_action and Game.handle_player_action: the entity on
+    (x, y) moves unless the target is outside the grid, a wall or the other
+    entity. Returns the new coordinates.
+    """
+    new_x, new_y = x, y
+    if action == 0:
+        new_x -= 1
+    elif action == 1:
+        new_x += 1
+    elif action == 2:
+        new_y -= 1
+    elif action == 3:
+        new_y += 1
+
+    height, width = walls.shape
+    if (0 <= new_x < width and 0 <= new_y < height and not walls[new_y, new_x]
+            and not (new_x == other_x and new_y == other_y)):
+        return new_x, new_y
+    return x, y
+
+
+@njit(cache=True)
+def observe(walls:np.ndarray, player_x:int, player_y:int, agent_x:int, agent_y:int,
+            offsets:np.ndarray, packed:bool, observation:np.ndarray,
+            action_mask:np.ndarray, sight_range:int=-1) -> bool:
+    """
+    Fill the observation and the action mask of a state, and return True if the
+    player sees the agent.
+
+    Parameters
+    ----------
+    walls : np.ndarray
+        see walls_of()
+    player_x, player_y, agent_x, agent_y : int
+        coordinates of the player and of the agent
+    offsets : np.ndarray
+        (dx, dy) offsets from the agent of the wall components of the
+        observation (see ObservationType.get_wall_offsets)
+    packed : bool
+        pack the wall components into bytes, as np.packbits
+    observation : np.ndarray
+        filled with the observation, as ObservationType.get_observation
+    action_mask : np.ndarray
+        filled with the valid actions, as GridTables.action_masks
+    sight_range : int, optional
+        largest diagonal distance at which the agent is seen, by default -1 (no
+        limit), as Game.sight_range
+
+    Returns
+    -------
+    bool
+        True if the agent is seen
+    """
+    height, width = walls.shape
+    seen = ((sight_range < 0
+             or max(abs(agent_x - player_x), abs(agent_y - player_y)) <= sight_range)
+            and can_see(walls, player_x, player_y, agent_x, agent_y))
+    observation[0] = player_x
+    observation[1] = player_y
+    observation[2] = agent_x
+    observation[3] = agent_y
+    observation[4] = seen
+
+    if packed:
+        observation[5:] = 0
+    for i in range(offsets.shape[0]):
+        x = agent_x + offsets[i, 0]
+        y = agent_y + offsets[i, 1]
+        wall = 0 <= x < width and 0 <= y < height and walls[y, x]
+        if packed:
+            if wall:
+                observation[5 + i // 8] |= 1 << (7 - i % 8)
+        else:
+            observation[5 + i] = wall
+
+    valid = False
+    for action in range(4):
+        x, y = move(walls, agent_x, agent_y, action, player_x, player_y)
+        action_mask[action] = x != agent_x or y != agent_y
+        valid = valid or action_mask[action]
+    if not valid:
+        action_mask[:] = True
+    return seen
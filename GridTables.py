@@ -0,0 +1,179 @@
+"""
+Precomputed per-map lookup tables.
+
+The grid of a map never changes during training, so everything that only depends
+on the map (which cells are free, where each move leads, which cell can see which
+other cell, shortest path distances) can be computed once as NumPy arrays and
+then read by table lookup instead of being recomputed at every step.
+
+Cells are identified by their index in the list of free (non wall) cells of the
+map, in row-major order. See GridTables.cell_index to go from (x, y) coordinates
+to a cell index, and GridTables.cells for the opposite.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+import Maps
+
+# Actions, same convention as Game.handle_action. STAY is only used by the
+# seeker (the agent action space is Discrete(4)).
+LEFT, RIGHT, UP, DOWN, STAY = 0, 1, 2, 3, 4
+ACTION_DIRECTIONS = np.array([[-1, 0], [1, 0], [0, -1], [0, 1], [0, 0]])
+
+UNREACHABLE = np.iinfo(np.int16).max
+
+
+class GridTables:
+    """
+    Lookup tables of a map. Use GridTables.from_grid() to get the (cached)
+    tables of a grid instead of building them directly.
+    """
+    def __init__(self, grid) -> None:
+        """
+        Build all the tables of a map.
+
+        Parameters
+        ----------
+        grid : list
+            the map as a list of strings (or list of lists), as in Maps.py
+        """
+        self.walls = np.array([[cell == Maps.WALL for cell in row] for row in grid])
+        self.GRID_H, self.GRID_W = self.walls.shape
+
+        # free cells, row-major order, as (x, y) coordinates
+        ys, xs = np.nonzero(~self.walls)
+        self.cells = np.stack([xs, ys], axis=1)
+        self.nb_cells = len(self.cells)
+
+        # cell_index[y, x] is the index of the cell (x, y), -1 for walls
+        self.cell_index = np.full(self.walls.shape, -1, dtype=np.int32)
+        self.cell_index[ys, xs] = np.arange(self.nb_cells)
+
+        self.neighbours = self._compute_neighbours()
+        # valid_moves[cell, action] is True if action (0 to 3) moves an entity
+        # out of cell (not into a wall or the border)
+        self.valid_moves = self.neighbours[:, :4] != np.arange(self.nb_cells)[:, None]
+        self.visibility = self._compute_visibility()
+        self.distances = self._compute_distances()
+        self.next_action = self._compute_next_action()
+
+        # valid starts: player and agent on different cells, the player sees the agent
+        valid_start = self.visibility.copy()
+        np.fill_diagonal(valid_start, False)
+        self.start_players, self.start_agents = np.nonzero(valid_start)
+
+    @staticmethod
+    def from_grid(grid) -> "GridTables":
+        """
+        Returns the tables of a grid, computing them only the first time
+        a given grid is seen.
+
+        Parameters
+        ----------
+        grid : list
+            the map as a list of strings (or list of lists)
+
+        Returns
+        -------
+        GridTables
+            the tables of the grid
+        """
+        return _tables_from_key(tuple("".join(row) for row in grid))
+
+    def action_masks(self, player:np.ndarray, agent:np.ndarray) -> np.ndarray:
+        """
+        masks[i, action] is True if action (0 to 3) moves the agent on cell
+        agent[i] when the player is on cell player[i]: the other actions are
+        ignored by Game.handle_action. An agent that cannot move at all gets
+        all its actions allowed.
+        """
+        player, agent = np.asarray(player), np.asarray(agent)
+        masks = self.valid_moves[agent] & (self.neighbours[agent, :4] != player[..., None])
+        masks[~masks.any(axis=-1)] = True
+        return masks
+
+    def _compute_neighbours(self) -> np.ndarray:
+        """
+        neighbours[cell, action] is the cell reached when doing action from cell.
+        Moves outside the grid or into a wall leave the entity in place.
+        Entities blocking each other are not taken into account here.
+        """
+        neighbours = np.empty((self.nb_cells, len(ACTION_DIRECTIONS)), dtype=np.int32)
+        for action, (dx, dy) in enumerate(ACTION_DIRECTIONS):
+            x = self.cells[:, 0] + dx
+            y = self.cells[:, 1] + dy
+            inside = (x >= 0) & (x < self.GRID_W) & (y >= 0) & (y < self.GRID_H)
+            target = np.full(self.nb_cells, -1)
+            target[inside] = self.cell_index[y[inside], x[inside]]
+            neighbours[:, action] = np.where(target >= 0, target, np.arange(self.nb_cells))
+        return neighbours
+
+    def _compute_visibility(self) -> np.ndarray:
+        """
+        visibility[i, j] is True if an entity on cell i sees an entity on cell j.
+        Same line drawing algorithm as Entity.can_see, for all pairs at once.
+        """
+        starts = self.cells.astype(float)
+        visibility = np.empty((self.nb_cells, self.nb_cells), dtype=bool)
+
+        # one row of sources at a time to bound memory on bigger maps
+        chunk = max(1, 200_000 // max(1, self.nb_cells * max(self.GRID_W, self.GRID_H)))
+        for first in range(0, self.nb_cells, chunk):
+            src = starts[first:first+chunk, None, :]             # (c, 1, 2)
+            delta = starts[None, :, :] - src                      # (c, N, 2)
+            n = np.abs(delta).max(axis=2)                         # (c, N)
+            steps = np.arange(n.max() + 1)                        # (S,)
+            t = steps / np.maximum(n, 1)[..., None]               # (c, N, S)
+            points = np.rint(src[..., None] + delta[..., None] * t[:, :, None, :])
+            points = points.astype(np.int64)                      # (c, N, 2, S)
+            in_ray = steps <= n[..., None]
+            hit = self.walls[points[:, :, 1] * in_ray, points[:, :, 0] * in_ray]
+            visibility[first:first+chunk] = ~(hit & in_ray).any(axis=2)
+        return visibility
+
+    def _compute_distances(self) -> np.ndarray:
+        """
+        distances[i, j] is the number of moves needed to go from cell i to cell j
+        (BFS distance), UNREACHABLE if there is no path.
+        """
+        distances = np.full((self.nb_cells, self.nb_cells), UNREACHABLE, dtype=np.int16)
+        frontier = np.eye(self.nb_cells, dtype=bool)
+        reached = frontier.copy()
+        depth = 0
+        while frontier.any():
+            distances[frontier] = depth
+            # a cell is reached at depth+1 if one of its neighbours is in the frontier
+            next_frontier = frontier[:, self.neighbours[:, :4]].any(axis=2) & ~reached
+            reached |= next_frontier
+            frontier = next_frontier
+            depth += 1
+        return distances
+
+    def _compute_next_action(self) -> np.ndarray:
+        """
+        next_action[i, j] is the first move of a shortest path from cell i to cell j,
+        STAY if i == j or if j is unreachable from i.
+        """
+        next_action = np.full((self.nb_cells, self.nb_cells), STAY, dtype=np.uint8)
+        remaining = (self.distances > 0) & (self.distances != UNREACHABLE)
+        for action in (LEFT, RIGHT, UP, DOWN):
+            closer = self.distances[self.neighbours[:, action]] == self.distances - 1
+            chosen = remaining & closer
+            next_action[chosen] = action
+            remaining &= ~chosen
+        return next_action
+
+    def to_cells(self, x, y) -> np.ndarray:
+        """
+        Convert (x, y) grid coordinates to cell indices.
+        """
+        return self.cell_index[y, x]
+
+
+# bounded, so that going through many maps (analysis, fuzzing) does not keep
+# the tables of all of them
+@lru_cache(maxsize=64)
+def _tables_from_key(key:tuple) -> GridTables:
+    return GridTables(key)
@@ -4,8 +4,13 @@ from gymnasium import spaces
 from Game import Game
 import numpy as np
 import cv2
-import time
+import warnings
+import GameKernel
 from ObservationType import ObservationType, LongViewObservation
+from GridTables import GridTables
+from Vector2 import Vector2
+from FrameScheduler import FrameScheduler
+from SeekerPolicy import make_seeker_policy
 import Maps
 
 class HideAndSeekEnv(gym.Env):
@@ -15,7 +20,9 @@ class HideAndSeekEnv(gym.Env):
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 4}
 
     def __init__(self, render_mode=None, fps=30, map_name=Maps.DEFAULT_MAP,
-                 observation_type:ObservationType=None) -> None:
+                 observation_type:ObservationType=None, seeker_policy="static",
+                 display_fps=None, backend="python", map_size=(12, 12),
+                 sight_range=None) -> None:
         """
         Initializes the environment.
         
@@ -25,15 +32,38 @@ class HideAndSeekEnv(gym.Env):
             The render mode, by default None
         fps : int, optional
             The render speed, by default 30, only used if render_mode is "human"
-        map_name : str, optional
-            The map to use, by default "random"
+        map_name : str or list, optional
+            The map to use, by default Maps.DEFAULT_MAP. A map itself (list of
+            rows, as in Maps.py) is also accepted.
         observation_type : ObservationType, optional
             The observation type to use. If None, LongViewObservation(5) is used.
+        seeker_policy : str or SeekerPolicy, optional
+            How the player (seeker) moves during an episode, by default "static"
+            (the player does not move). "chase_last_seen" or "patrol" to move it
+            with a scripted policy. See SeekerPolicy.py.
+        display_fps : int, optional
+            Maximum refresh rate of the window, by default None (same as fps).
+            Only used if render_mode is "human". With a lower display_fps than
+            fps (or fps=0, no limit), the game is played faster than it is shown
+            and only the frames that are due are displayed.
+        backend : str, optional
+            How the game is stepped, by default "python": with the methods of Game
+            and ObservationType. "numba" steps it with the compiled functions of
+            GameKernel.py instead (same results, about ten times faster). Without
+            Numba installed, these functions run as plain Python.
+        map_size : Tuple[int, int], optional
+            (width, height) of the map if map_name is "random", by default (12, 12)
+        sight_range : int, optional
+            largest diagonal distance at which the player sees the agent, by
+            default None (no limit). On large maps (see Game.is_large), a sight
+            range keeps the cost of step() and reset() independent of the size
+            of the map: the map is stored in chunks, visibility is computed
+            around the player only, and the agent starts within the sight range.
 
         """
         super(HideAndSeekEnv, self).__init__()
         
-        self.game = Game(map_name=map_name)
+        self.game = Game(map_name=map_name, map_size=map_size, sight_range=sight_range)
         self.fps = fps
 
         # if no observation type is given, we use LongView as the default one
@@ -41,18 +71,47 @@ class HideAndSeekEnv(gym.Env):
             observation_type = LongViewObservation(5)
 
         self.action_space = spaces.Discrete(4)
-        self.observation_space = self._create_observation_space(observation_type.shape)
+        self.observation_space = self._create_observation_space(observation_type)
         self.observation_type = observation_type
 
+        self.seeker_policy = make_seeker_policy(seeker_policy)
+        # tables of the map, for a moving seeker or a curriculum only: their size
+        # grows with the square of the number of cells, and the action masks are
+        # computed around the agent without them. They are not built for large
+        # maps, where the player has to be static.
+        self.tables = None
+        if not self.seeker_policy.is_static:
+            if self.game.is_large:
+                raise ValueError("Moving seekers need the tables of the map, which are not"
+                                 + " built for maps larger than Game.LARGE_MAP_CELLS cells.")
+            self.tables = GridTables.from_grid(self.game.grid)
+
         assert render_mode is None or render_mode in self.metadata["render_modes"]
         self.render_mode = render_mode
 
+        assert backend in ["python", "numba"], f"Unknown backend '{backend}'."
+        self.backend = backend
+        if backend == "numba":
+            if not GameKernel.NUMBA_AVAILABLE:
+                warnings.warn("Numba is not installed, the numba backend runs as plain"
+                              + " Python.")
+            self.walls = GameKernel.walls_of(self.game.grid)
+            self.wall_offsets = np.array(observation_type.get_wall_offsets(),
+                                         dtype=np.int64).reshape(-1, 2)
+
+        # in human mode, steps are paced at fps and displayed at display_fps
+        self.step_scheduler = FrameScheduler(fps)
+        self.display_scheduler = FrameScheduler(fps if display_fps is None else display_fps)
+
         self.info = {}
+        self.episode_seed = None # seed of the start of the current episode
+        self.curriculum = None # see set_curriculum()
+        self.start = None # index of the start drawn by the curriculum
         self.steps = 0 # steps in the current episode, truncated after 300 steps
         self.maximum_steps = 300
 
 
-    def _create_observation_space(self, shape) -> spaces.Box:
+    def _create_observation_space(self, observation_type:ObservationType) -> spaces.Box:
         """
         Creates the observation space. See ObservationType.py for observation spaces
         implementation.
@@ -60,8 +119,9 @@ class HideAndSeekEnv(gym.Env):
 
         Parameters
         ----------
-        shape : Tuple[int]
-            the shape of the observation space
+        observation_type : ObservationType
+            the observation type, giving the bounds and the (smallest) dtype of
+            each component of the observation for the size of the grid
 
         Returns
         -------
@@ -69,12 +129,7 @@ class HideAndSeekEnv(gym.Env):
             the observation space
         """
 
-        return spaces.Box(
-            low=0,
-            high=max(self.game.GRID_W, self.game.GRID_H)-1,
-            shape=shape,
-            dtype=int
-        )
+        return observation_type.get_observation_space(self.game.GRID_W, self.game.GRID_H)
 
     def _get_observation(self) -> np.ndarray:
         """
@@ -83,12 +138,44 @@ class HideAndSeekEnv(gym.Env):
         """
         return self.observation_type.get_observation(self.game)
 
+
+    def _get_cells(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the cell index (see GridTables) of the player and of the agent,
+        as arrays of size 1 for the seeker policy.
+        """
+        player, agent = self.game.player.pos, self.game.agent.pos
+        return (self.tables.cell_index[[player.y], [player.x]],
+                self.tables.cell_index[[agent.y], [agent.x]])
     
     def _get_info(self):
         return {
             "distance": self.game.agent.pos.manhattan_distance(self.game.player.pos),
+            "action_mask": self.action_masks(),
         }
 
+    def action_masks(self) -> np.ndarray:
+        """
+        Returns the actions that move the agent: actions into a wall, the border
+        or the player are ignored by Game.handle_action (same as
+        GridTables.action_masks, from the 4 cells around the agent).
+
+        Returns
+        -------
+        np.ndarray
+            4 booleans, True for the valid actions
+        """
+        agent = self.game.agent.pos
+        masks = np.empty(4, dtype=bool)
+        for action, (dx, dy) in enumerate([(-1, 0), (1, 0), (0, -1), (0, 1)]):
+            target = Vector2(agent.x + dx, agent.y + dy)
+            masks[action] = (self.game._is_valid_coordinates(target)
+                             and not self.game._is_wall(target)
+                             and target != self.game.player.pos)
+        if not masks.any():
+            masks[:] = True
+        return masks
+
     def step(self, action) -> Tuple[np.ndarray, float, bool, bool, Dict]:
         """
         Performs the given action in the environment and returns the next observation,
@@ -107,43 +194,136 @@ class HideAndSeekEnv(gym.Env):
         """
 
         self.steps+=1
-        # Move the agent
-        self.game.handle_action(action)
-        
+        if self.backend == "numba":
+            observation, info = self._step_kernel(action)
+        else:
+            # Move the agent
+            self.game.handle_action(action)
+
+            # Then the player, if it is not static
+            if not self.seeker_policy.is_static:
+                player, agent = self._get_cells()
+                seeker_action = self.seeker_policy.act(self.tables, player, agent)[0]
+                self.game.handle_player_action(seeker_action)
+
+            observation = self._get_observation()
+            info = self._get_info()
+
         # An episode is done iff the agent is hidden
         terminated = not self.game.agent.is_seen
         truncated = self.steps >= self.maximum_steps and not terminated
+        if self.start is not None and (terminated or truncated):
+            self.curriculum.update([self.start], [terminated], [self.steps])
+            self.start = None
         reward = 50 if terminated else -1
-        observation = self._get_observation()
-        info = self._get_info()
         
         if self.render_mode == "human":
             self._render_frame()
 
         return observation, reward, terminated, truncated, info
 
+    def _step_kernel(self, action) -> Tuple[np.ndarray, Dict]:
+        """
+        Step of the "numba" backend: same as Game.handle_action,
+        Game.handle_player_action, _get_observation and _get_info, with the
+        functions of GameKernel. The positions of the entities of self.game are
+        updated in place.
+        """
+        player, agent = self.game.player.pos, self.game.agent.pos
+        agent.x, agent.y = GameKernel.move(self.walls, agent.x, agent.y, int(action),
+                                           player.x, player.y)
+        if not self.seeker_policy.is_static:
+            player_cell, agent_cell = self._get_cells()
+            seeker_action = self.seeker_policy.act(self.tables, player_cell, agent_cell)[0]
+            player.x, player.y = GameKernel.move(self.walls, player.x, player.y,
+                                                 int(seeker_action), agent.x, agent.y)
+        return self._observe_kernel()
+
+    def _kernel_can_see(self, player, agent) -> bool:
+        if (self.game.sight_range is not None
+                and player.pos.diagonal_distance_to(agent.pos) > self.game.sight_range):
+            return False
+        return GameKernel.can_see(self.walls, player.x, player.y, agent.x, agent.y)
+
+    def _observe_kernel(self) -> Tuple[np.ndarray, Dict]:
+        """
+        Observation and info of the "numba" backend, also updating
+        self.game.agent.is_seen.
+        """
+        player, agent = self.game.player.pos, self.game.agent.pos
+        observation = np.empty(self.observation_space.shape, self.observation_space.dtype)
+        action_mask = np.empty(4, dtype=bool)
+        self.game.agent.is_seen = GameKernel.observe(
+            self.walls, player.x, player.y, agent.x, agent.y, self.wall_offsets,
+            self.observation_type.packed, observation, action_mask,
+            -1 if self.game.sight_range is None else self.game.sight_range)
+        info = {
+            "distance": abs(agent.x - player.x) + abs(agent.y - player.y),
+            "action_mask": action_mask,
+        }
+        return observation, info
+
     def reset(self, seed=None, options=None):
         """
         Resets the environment to its initial state.
+
+        The start of an episode only depends on self.episode_seed, drawn from
+        self.np_random (itself seeded by seed), so an episode can be played again
+        from its seed. options={"start": (player_x, player_y, agent_x, agent_y)}
+        places the player and the agent instead. With a curriculum (see
+        set_curriculum), the start is drawn by the curriculum.
         """
 
         # We need the following line to seed self.np_random
         super().reset(seed=seed)
-        
+        self.episode_seed = int(self.np_random.integers(2**63))
+        self.game.seed(self.episode_seed)
 
-        # init the game, placing agent and player uniformly at random
-        self.game.init_game_start()
+        self.start = None
+        if options is not None and "start" in options:
+            player_x, player_y, agent_x, agent_y = options["start"]
+            self.game.player.pos = Vector2(int(player_x), int(player_y))
+            self.game.agent.pos = Vector2(int(agent_x), int(agent_y))
+            self.game._update_seen()
+        elif self.curriculum is not None:
+            rng = np.random.default_rng(self.episode_seed)
+            self.start = int(self.curriculum.sample(rng, 1)[0])
+            player_x, player_y = self.tables.cells[self.tables.start_players[self.start]]
+            agent_x, agent_y = self.tables.cells[self.tables.start_agents[self.start]]
+            self.game.player.pos = Vector2(int(player_x), int(player_y))
+            self.game.agent.pos = Vector2(int(agent_x), int(agent_y))
+            self.game.agent.is_seen = True
+        else:
+            # init the game, placing agent and player uniformly at random
+            self.game.init_game_start(
+                self._kernel_can_see if self.backend == "numba" else None)
+        if not self.seeker_policy.is_static:
+            self.seeker_policy.reset(self.tables, *self._get_cells())
 
         self.steps = 0
 
-        observation = self._get_observation()
-        info = self._get_info()
+        if self.backend == "numba":
+            observation, info = self._observe_kernel()
+        else:
+            observation = self._get_observation()
+            info = self._get_info()
 
         if self.render_mode == "human":
             self._render_frame()
 
         return observation, info
     
+    def set_curriculum(self, curriculum) -> None:
+        """
+        Draw the starts of the next episodes with a StartCurriculum of the map
+        (built from the GridTables of the map, see Curriculum.py), and tell it
+        the outcome of each episode.
+        """
+        assert not self.game.is_large, "No curriculum on large maps."
+        if self.tables is None:
+            self.tables = GridTables.from_grid(self.game.grid)
+        self.curriculum = curriculum
+
     def render(self):
         """
         Renders the current state of the environment.
@@ -156,21 +336,16 @@ class HideAndSeekEnv(gym.Env):
         Renders the current state of the environment.
         Show the board in a window if render_mode is "human".
         """
-        board = self.game.render()
-
         if self.render_mode == "human":
-            cv2.imshow("Hide and Seek", board)
-
-            # Takes step after fixed time, to ensure fixed framerate in human mode
-            t_end = time.time() + 1/self.fps
-            k = -1
-            while time.time() < t_end:
-                if k == -1:
-                    k = cv2.waitKey(1)
-                else:
-                    continue
+            # The board is only drawn when a frame is due, then we sleep until
+            # the next step to ensure a fixed framerate
+            if self.display_scheduler.frame_due():
+                cv2.imshow("Hide and Seek", self.game.render())
+                cv2.waitKey(1)
+            self.step_scheduler.wait()
 
         else: # rgb_array
+            board = self.game.render()
             return board
             # return np.transpose(
             #     board, axes=(1, 0, 2)
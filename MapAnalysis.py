@@ -0,0 +1,122 @@
+"""
+Hideability of a map, computed from its tables (see GridTables) without training.
+
+With a static player on cell p, the agent on cell a hides in the smallest
+number of moves by walking to the closest cell not seen from p, without going
+through p (Game.handle_action does not let the agent move onto the player).
+These numbers of moves are computed for all the (player, agent) pairs at once,
+by a breadth-first search from the hidden cells of every player cell in
+parallel. Averaged over the start distribution of Game.init_game_start (uniform
+over the pairs where the player sees the agent), they measure how hard the map
+is for the agent, before training anything on it.
+"""
+
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+import Colors
+from GridTables import GridTables, UNREACHABLE
+
+
+def steps_to_hide(tables:GridTables) -> np.ndarray:
+    """
+    steps[p, a] is the smallest number of moves needed by the agent on cell a to
+    be hidden from the static player on cell p (0 if it is already hidden),
+    UNREACHABLE if no hidden cell can be reached. steps[p, p] is UNREACHABLE.
+    """
+    n = tables.nb_cells
+    not_player = ~np.eye(n, dtype=bool)
+    steps = np.full((n, n), UNREACHABLE, dtype=np.int16)
+
+    frontier = ~tables.visibility & not_player
+    reached = frontier.copy()
+    depth = 0
+    while frontier.any():
+        steps[frontier] = depth
+        # the agent on a is one move further if a move leads to the frontier.
+        # Moves into a wall or the border leave it in place, so they never do,
+        # and moves onto the player are blocked, the player cell is never reached.
+        next_frontier = frontier[:, tables.neighbours[:, :4]].any(axis=2)
+        next_frontier &= ~reached & not_player
+        reached |= next_frontier
+        frontier = next_frontier
+        depth += 1
+    return steps
+
+
+def analyze(tables:GridTables) -> Tuple[dict, dict]:
+    """
+    Hideability of a map.
+
+    Parameters
+    ----------
+    tables : GridTables
+        tables of the map
+
+    Returns
+    -------
+    Tuple[dict, dict]
+        the report of the map (JSON-serializable numbers), and the per-cell
+        heatmaps as (GRID_H, GRID_W) float arrays, NaN on the walls:
+        "cover" is the fraction of the player cells from which the cell is
+        hidden, "steps_to_hide" the mean optimal number of moves to hide from
+        the starts with the agent on the cell.
+    """
+    steps = steps_to_hide(tables)
+    start_steps = steps[tables.start_players, tables.start_agents].astype(np.int64)
+    reachable = start_steps != UNREACHABLE
+    hidden = ~tables.visibility
+
+    cover = hidden.sum(axis=0) / max(1, tables.nb_cells - 1)
+    agent_starts = np.bincount(tables.start_agents[reachable], minlength=tables.nb_cells)
+    agent_steps = np.bincount(tables.start_agents[reachable],
+                              weights=start_steps[reachable], minlength=tables.nb_cells)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_agent_steps = agent_steps / agent_starts
+
+    nb_starts = len(start_steps)
+    report = {
+        "width": int(tables.GRID_W),
+        "height": int(tables.GRID_H),
+        "nb_cells": int(tables.nb_cells),
+        "nb_walls": int(tables.walls.sum()),
+        "nb_starts": int(nb_starts),
+        "mean_cover": float(cover.mean()) if tables.nb_cells else 0.0,
+        "hidden_pairs": float(hidden.mean()) if tables.nb_cells else 0.0,
+        "mean_steps_to_hide": float(start_steps[reachable].mean()) if reachable.any() else None,
+        "max_steps_to_hide": int(start_steps[reachable].max()) if reachable.any() else None,
+        "unreachable_cover_starts": int((~reachable).sum()),
+        "unreachable_cover_fraction": float((~reachable).mean()) if nb_starts else 0.0,
+    }
+    heatmaps = {
+        "cover": _to_grid(tables, cover),
+        "steps_to_hide": _to_grid(tables, mean_agent_steps),
+    }
+    return report, heatmaps
+
+
+def _to_grid(tables:GridTables, values:np.ndarray) -> np.ndarray:
+    """
+    Per-cell values as a (GRID_H, GRID_W) array, NaN on the walls.
+    """
+    grid = np.full(tables.walls.shape, np.nan)
+    grid[tables.cells[:, 1], tables.cells[:, 0]] = values
+    return grid
+
+
+def heatmap_image(values:np.ndarray, cell_size:int=32) -> np.ndarray:
+    """
+    (GRID_H * cell_size, GRID_W * cell_size, 3) uint8 BGR image of per-cell
+    values (see analyze), from blue (lowest) to red (highest), walls and cells
+    without a value in black.
+    """
+    known = ~np.isnan(values)
+    scaled = np.zeros(values.shape, dtype=np.uint8)
+    if known.any():
+        low, high = values[known].min(), values[known].max()
+        scaled[known] = np.rint(255 * (values[known] - low) / max(high - low, 1e-9))
+    image = cv2.applyColorMap(scaled, cv2.COLORMAP_JET)
+    image[~known] = Colors.BLACK
+    return np.repeat(np.repeat(image, cell_size, axis=0), cell_size, axis=1)
@@ -0,0 +1,139 @@
+"""
+DQN restricted to the actions that move the agent.
+
+Game.handle_action ignores moves into a wall, the border or the player, so a
+plain DQN spends part of its exploration on actions that do nothing. MaskedDQN
+only explores and plays valid actions, the random actions of the warm-up
+(before learning_starts) included, and takes the max of the target Q-values
+over the valid actions of the next state.
+
+The masks are computed from the observations: every observation type starts
+with the positions of the player and of the agent, which give the mask with two
+lookups in the tables of the map (see GridTables.action_masks). So the replay
+buffer does not store masks and any environment or replay buffer works:
+
+    model = MaskedDQN("MlpPolicy", env)
+"""
+
+import numpy as np
+import torch as th
+from torch.nn import functional as F
+from stable_baselines3 import DQN
+
+from GridTables import GridTables
+
+
+class MaskedDQN(DQN):
+    """
+    DQN with action masks in action selection and in the target max.
+    """
+    def __init__(self, policy, env, grid=None, **kwargs) -> None:
+        """
+        Parameters
+        ----------
+        policy, env, kwargs :
+            see stable_baselines3 DQN
+        grid : list, optional
+            the map of the environment, by default the map of env (env.game.grid).
+            Saved with the model.
+        """
+        self.grid = None if grid is None else ["".join(row) for row in grid]
+        super().__init__(policy, env, **kwargs)
+
+    def _setup_model(self) -> None:
+        super()._setup_model()
+        if self.grid is None:
+            game = self.env.get_attr("game")[0]
+            self.grid = ["".join(row) for row in game.grid]
+        tables = GridTables.from_grid(self.grid)
+        self.cell_index = th.as_tensor(tables.cell_index, dtype=th.long, device=self.device)
+        self.mask_neighbours = th.as_tensor(tables.neighbours[:, :4], dtype=th.long,
+                                            device=self.device)
+
+    def _excluded_save_params(self) -> list:
+        return [*super()._excluded_save_params(), "cell_index", "mask_neighbours"]
+
+    def action_masks(self, observations:th.Tensor) -> th.Tensor:
+        """
+        Valid actions of a batch of observations (same as GridTables.action_masks).
+        """
+        positions = observations[:, :4].long()
+        player = self.cell_index[positions[:, 1], positions[:, 0]]
+        agent = self.cell_index[positions[:, 3], positions[:, 2]]
+        targets = self.mask_neighbours[agent]
+        masks = (targets != agent[:, None]) & (targets != player[:, None])
+        return masks | ~masks.any(dim=1, keepdim=True)
+
+    def predict(self, observation:np.ndarray, state=None, episode_start=None,
+                deterministic=False):
+        """
+        Same as DQN.predict (epsilon-greedy when not deterministic), among the
+        valid actions only.
+        """
+        self.policy.set_training_mode(False)
+        observation_tensor, vectorized = self.policy.obs_to_tensor(observation)
+        with th.no_grad():
+            masks = self.action_masks(observation_tensor)
+            if not deterministic and np.random.rand() < self.exploration_rate:
+                actions = th.multinomial(masks.float(), 1).squeeze(1)
+            else:
+                q_values = self.q_net(observation_tensor)
+                actions = q_values.masked_fill(~masks, -th.inf).argmax(dim=1)
+        actions = actions.cpu().numpy()
+        if not vectorized:
+            actions = actions[0]
+        return actions, state
+
+    def _sample_action(self, learning_starts:int, action_noise=None, n_envs:int=1):
+        """
+        Same as DQN._sample_action: uniform random actions before learning_starts,
+        predict() after, but the random actions are drawn among the valid ones.
+        """
+        if self.num_timesteps >= learning_starts:
+            return super()._sample_action(learning_starts, action_noise, n_envs)
+        observation_tensor, _ = self.policy.obs_to_tensor(self._last_obs)
+        with th.no_grad():
+            masks = self.action_masks(observation_tensor)
+            actions = th.multinomial(masks.float(), 1).squeeze(1).cpu().numpy()
+        return actions, actions
+
+    def train(self, gradient_steps:int, batch_size:int=100) -> None:
+        """
+        Same as DQN.train, with the max of the target Q-values taken over the
+        valid actions of the next observations.
+        """
+        self.policy.set_training_mode(True)
+        self._update_learning_rate(self.policy.optimizer)
+
+        losses = []
+        for _ in range(gradient_steps):
+            replay_data = self.replay_buffer.sample(batch_size, env=self._vec_normalize_env)
+            # n-step replay buffers give their own discounts
+            discounts = getattr(replay_data, "discounts", None)
+            if discounts is None:
+                discounts = self.gamma
+
+            with th.no_grad():
+                next_q_values = self.q_net_target(replay_data.next_observations)
+                masks = self.action_masks(replay_data.next_observations)
+                next_q_values, _ = next_q_values.masked_fill(~masks, -th.inf).max(dim=1)
+                next_q_values = next_q_values.reshape(-1, 1)
+                target_q_values = (replay_data.rewards
+                                   + (1 - replay_data.dones) * discounts * next_q_values)
+
+            current_q_values = self.q_net(replay_data.observations)
+            current_q_values = th.gather(current_q_values, dim=1,
+                                         index=replay_data.actions.long())
+
+            loss = F.smooth_l1_loss(current_q_values, target_q_values)
+            losses.append(loss.item())
+
+            self.policy.optimizer.zero_grad()
+            loss.backward()
+            th.nn.utils.clip_grad_norm_(self.policy.parameters(), self.max_grad_norm)
+            self.policy.optimizer.step()
+
+        self._n_updates += gradient_steps
+
+        self.logger.record("train/n_updates", self._n_updates, exclude="tensorboard")
+        self.logger.record("train/loss", np.mean(losses))
@@ -0,0 +1,304 @@
+"""
+Streaming metrics of training and evaluation runs.
+
+Episode returns, lengths and hide rates are aggregated as they come, in fixed
+memory: RunningStats keeps the count, mean and variance (Welford's algorithm)
+and IntegerHistogram counts the values of a bounded range of integers, which
+gives exact quantiles (returns and lengths are such integers: at most 300 steps,
+rewards of -1 and 50). Nothing grows with the number of episodes.
+
+RunMetrics gathers the metrics of one run, and can be read while it is
+updated:
+- MetricsServer serves them over HTTP on localhost, as text (/metrics, in the
+  Prometheus text format) and as JSON (/metrics.json),
+- SnapshotWriter writes them periodically to a JSON file, which
+  metrics_dashboard.py reads for all the runs of a folder.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+QUANTILES = (0.05, 0.5, 0.95)
+
+# bounds of the episodes of HideAndSeekEnv: truncated after 300 steps, reward of
+# -1 per step, 50 when the agent hides
+MAXIMUM_STEPS = 300
+RETURN_BOUNDS = (-MAXIMUM_STEPS, 50)
+LENGTH_BOUNDS = (1, MAXIMUM_STEPS)
+
+
+class RunningStats:
+    """
+    Count, mean, variance, min and max of a stream of values (Welford).
+    """
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # sum of the squared differences to the mean
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value:float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_many(self, values:np.ndarray) -> None:
+        """
+        Add a batch of values at once (Chan's merge of two sets of statistics).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        count, mean = len(values), float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def variance(self) -> float:
+        """
+        Variance of the values (not corrected, as np.var), NaN without values.
+        """
+        return self.m2 / self.count if self.count > 0 else math.nan
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def to_dict(self) -> dict:
+        if self.count == 0:
+            return {"count": 0}
+        return {"count": self.count, "mean": self.mean, "std": self.std,
+                "min": self.min, "max": self.max}
+
+
+class IntegerHistogram:
+    """
+    Counts of the integers of [low, high] in a stream, with one bin per integer:
+    exact quantiles in fixed memory. Values outside the range are counted in the
+    first or last bin.
+    """
+    def __init__(self, low:int, high:int) -> None:
+        self.low = low
+        self.counts = np.zeros(high - low + 1, dtype=np.int64)
+
+    def add(self, value:float) -> None:
+        self.counts[min(max(round(value) - self.low, 0), len(self.counts) - 1)] += 1
+
+    def quantile(self, p:float) -> float:
+        """
+        The p-quantile: the value of rank round(p * (count - 1)) in the sorted
+        values. NaN without values.
+        """
+        cumulative = np.cumsum(self.counts)
+        if cumulative[-1] == 0:
+            return math.nan
+        rank = round(p * (cumulative[-1] - 1))
+        return float(self.low + np.searchsorted(cumulative, rank, side="right"))
+
+
+class Distribution:
+    """
+    RunningStats and exact quantiles of a stream of integers of known bounds.
+    """
+    def __init__(self, bounds:tuple, quantiles=QUANTILES) -> None:
+        """
+        Parameters
+        ----------
+        bounds : tuple
+            (low, high): the values are integers of [low, high]
+        quantiles : tuple, optional
+            quantiles to report, by default QUANTILES
+        """
+        self.stats = RunningStats()
+        self.histogram = IntegerHistogram(*bounds)
+        self.quantiles = list(quantiles)
+
+    def add(self, value:float) -> None:
+        self.stats.add(value)
+        self.histogram.add(value)
+
+    def to_dict(self) -> dict:
+        result = self.stats.to_dict()
+        if self.stats.count > 0:
+            for p in self.quantiles:
+                result[f"p{round(100 * p)}"] = self.histogram.quantile(p)
+        return result
+
+
+class RunMetrics:
+    """
+    Metrics of a run: episode returns and lengths, hide rate, steps to hide and
+    environment steps per second. Thread-safe, so that the server and the
+    snapshot writer read them while training updates them.
+    """
+    def __init__(self, run_name:str, info:dict=None) -> None:
+        """
+        Parameters
+        ----------
+        run_name : str
+            name of the run, as a label of the metrics
+        info : dict, optional
+            JSON-serializable description of the run (map, observation type,
+            hyperparameters...) added to the snapshots, by default None
+        """
+        self.run_name = run_name
+        self.info = info or {}
+        self.lock = threading.Lock()
+        self.returns = Distribution(RETURN_BOUNDS)
+        self.lengths = Distribution(LENGTH_BOUNDS)
+        self.steps_to_hide = Distribution(LENGTH_BOUNDS)
+        self.hidden = RunningStats() # 1 if hidden, 0 if truncated: mean is the hide rate
+        self.timesteps = 0
+        self.t_start = time.time()
+        # steps per second over the last period between two reads
+        self._rate_timesteps, self._rate_time = 0, self.t_start
+        self.steps_per_second = 0.0
+
+    def record_episode(self, episode_return:float, length:int, hidden:bool) -> None:
+        with self.lock:
+            self.returns.add(float(episode_return))
+            self.lengths.add(float(length))
+            self.hidden.add(float(hidden))
+            if hidden:
+                self.steps_to_hide.add(float(length))
+
+    def record_steps(self, nb_steps:int) -> None:
+        with self.lock:
+            self.timesteps += nb_steps
+
+    def snapshot(self) -> dict:
+        """
+        All the metrics, as a JSON-serializable dict.
+        """
+        with self.lock:
+            now = time.time()
+            if now - self._rate_time >= 1.0:
+                self.steps_per_second = ((self.timesteps - self._rate_timesteps)
+                                         / (now - self._rate_time))
+                self._rate_timesteps, self._rate_time = self.timesteps, now
+            return {
+                "run": self.run_name,
+                "info": self.info,
+                "time": now,
+                "elapsed": now - self.t_start,
+                "timesteps": self.timesteps,
+                "steps_per_second": self.steps_per_second,
+                "episodes": self.hidden.count,
+                "hide_rate": self.hidden.mean if self.hidden.count > 0 else None,
+                "episode_return": self.returns.to_dict(),
+                "episode_length": self.lengths.to_dict(),
+                "steps_to_hide": self.steps_to_hide.to_dict(),
+            }
+
+
+def to_text(snapshots:list) -> str:
+    """
+    Snapshots of runs in the Prometheus text format, one line per metric and
+    per run, labelled with the name of the run.
+    """
+    lines = []
+    for snapshot in snapshots:
+        label = '{run="' + snapshot["run"].replace('"', "'") + '"}'
+        for name in ["timesteps", "steps_per_second", "episodes", "hide_rate"]:
+            if snapshot[name] is not None:
+                lines.append(f"hide_and_seek_{name}{label} {snapshot[name]}")
+        for name in ["episode_return", "episode_length", "steps_to_hide"]:
+            for statistic, value in snapshot[name].items():
+                lines.append(f"hide_and_seek_{name}_{statistic}{label} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    HTTP server on localhost, in a background thread, answering GET /metrics
+    (text) and GET /metrics.json with the snapshots given by a function.
+    """
+    def __init__(self, get_snapshots, port:int=0, host:str="127.0.0.1") -> None:
+        """
+        Parameters
+        ----------
+        get_snapshots : callable
+            returns the list of snapshots to serve (see RunMetrics.snapshot)
+        port : int, optional
+            port to listen on, by default 0 (any free port, see self.port)
+        host : str, optional
+            address to listen on, by default 127.0.0.1 (local only)
+        """
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path == "/metrics":
+                    body, content_type = to_text(get_snapshots()), "text/plain"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(get_snapshots()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type + "; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass # no line per request in the training output
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SnapshotWriter:
+    """
+    Write the snapshot of a run to a JSON file every interval seconds, from a
+    background thread, and a last time when closed.
+    """
+    def __init__(self, metrics:RunMetrics, path:str, interval:float=10.0) -> None:
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self) -> None:
+        """
+        Write the snapshot under a temporary name first, so that readers never
+        see a partial file.
+        """
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.metrics.snapshot(), f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        self.write()
@@ -0,0 +1,340 @@
+"""
+Index of the trained models, in a SQLite database next to the model folders
+(models/registry.sqlite).
+
+learn.py and solve.py register each run with its hyperparameters, observation
+type (as a spec, see ObservationType.get_spec), map and seeker, then each
+checkpoint as it is written; evaluations are recorded by evaluate.py,
+learning_curve.py and the periodic evaluation of learn.py. Lookups such as the
+latest checkpoint of a run or the best checkpoint per observation type on a map
+are then single queries instead of scanning the model folders.
+
+Each run folder also keeps the spec of its observation type in
+observation_spec.json, so that a run moved away from its registry still loads.
+Runs trained before the registry existed can be added with
+`python registry.py import`. For them, load_observation_type() falls back to the
+observation_type.pkl of the run folder. It also detects the checkpoints trained
+before compact observation dtypes, and returns a non-compact observation type
+for them (see ObservationType.compact), so that DQN.load accepts their
+environment.
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+import time
+import zipfile
+from contextlib import closing
+
+from ObservationType import ObservationType, observation_type_from_spec
+
+REGISTRY_FILE = "registry.sqlite"
+REGISTRY_PATH = os.path.join("models", REGISTRY_FILE)
+OBSERVATION_SPEC_FILE = "observation_spec.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    name TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    algorithm TEXT,
+    observation TEXT,
+    observation_spec TEXT,
+    map TEXT,
+    seeker TEXT,
+    hyperparameters TEXT,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    path TEXT PRIMARY KEY,
+    run TEXT NOT NULL REFERENCES runs(name),
+    timesteps INTEGER,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS evaluations (
+    path TEXT NOT NULL,
+    map TEXT NOT NULL,
+    seeker TEXT NOT NULL,
+    nb_episodes INTEGER NOT NULL,
+    mean_reward REAL,
+    std_reward REAL,
+    hide_rate REAL,
+    steps_to_hide REAL,
+    created REAL,
+    PRIMARY KEY (path, map, seeker, nb_episodes)
+);
+CREATE INDEX IF NOT EXISTS runs_map ON runs (map, observation);
+CREATE INDEX IF NOT EXISTS checkpoints_run ON checkpoints (run, timesteps);
+CREATE INDEX IF NOT EXISTS evaluations_map ON evaluations (map, seeker, mean_reward);
+"""
+
+
+class ModelRegistry:
+    """
+    Read and write access to the registry. Every method opens its own connection,
+    so a registry can be used from several threads and processes.
+    """
+    def __init__(self, path=REGISTRY_PATH) -> None:
+        """
+        Parameters
+        ----------
+        path : str, optional
+            path of the database, by default models/registry.sqlite. Created if
+            it does not exist.
+        """
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with closing(self._connect()) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _execute(self, query:str, parameters=()) -> list:
+        with closing(self._connect()) as connection, connection:
+            return [dict(row) for row in connection.execute(query, parameters)]
+
+    # --- writing ---
+
+    def register_run(self, name:str, folder:str, observation_type:ObservationType,
+                     map_name:str, seeker="static", algorithm="DQN",
+                     hyperparameters:dict=None) -> None:
+        """
+        Add a run (or replace the run of the same name).
+        """
+        self._execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, _normalize(folder), algorithm, str(observation_type),
+             json.dumps(observation_type.get_spec()), map_name, seeker,
+             json.dumps(hyperparameters or {}), time.time()))
+
+    def add_checkpoint(self, run:str, timesteps:int, path:str) -> None:
+        self._execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?)",
+                      (_normalize(path), run, timesteps, time.time()))
+
+    def remove_checkpoint(self, path:str) -> None:
+        """
+        Remove a deleted checkpoint and its evaluations.
+        """
+        path = _normalize(path)
+        self._execute("DELETE FROM checkpoints WHERE path = ?", (path,))
+        self._execute("DELETE FROM evaluations WHERE path = ?", (path,))
+
+    def add_evaluation(self, path:str, map_name:str, seeker:str, nb_episodes:int,
+                       results:dict) -> None:
+        """
+        Record the evaluation of a checkpoint. results may contain mean_reward,
+        std_reward, hide_rate and steps_to_hide (see Evaluation.evaluate_batched).
+        """
+        self._execute(
+            "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (_normalize(path), map_name, seeker, nb_episodes,
+             results.get("mean_reward"), results.get("std_reward"),
+             results.get("hide_rate"), results.get("steps_to_hide"), time.time()))
+
+    # --- reading ---
+
+    def get_run(self, name:str) -> dict:
+        """
+        Returns the run of the given name, or None. hyperparameters and
+        observation_spec are decoded.
+        """
+        rows = self._execute("SELECT * FROM runs WHERE name = ?", (name,))
+        if not rows:
+            return None
+        run = rows[0]
+        run["hyperparameters"] = json.loads(run["hyperparameters"])
+        run["observation_spec"] = json.loads(run["observation_spec"])
+        return run
+
+    def runs(self, map_name:str=None, observation:str=None) -> list:
+        """
+        Runs, optionally filtered by map and observation type (as printed by
+        str(observation_type)), with their number of checkpoints.
+        """
+        query = ("SELECT runs.name, runs.algorithm, runs.observation, runs.map,"
+                 + " runs.seeker, runs.created, COUNT(checkpoints.path) AS checkpoints"
+                 + " FROM runs LEFT JOIN checkpoints ON checkpoints.run = runs.name"
+                 + " WHERE (? IS NULL OR runs.map = ?)"
+                 + " AND (? IS NULL OR runs.observation = ?)"
+                 + " GROUP BY runs.name ORDER BY runs.created")
+        return self._execute(query, (map_name, map_name, observation, observation))
+
+    def checkpoints(self, run:str) -> list:
+        """
+        Checkpoints of a run, sorted by timesteps.
+        """
+        return self._execute("SELECT * FROM checkpoints WHERE run = ? ORDER BY timesteps",
+                             (run,))
+
+    def latest_checkpoint(self, run:str) -> str:
+        """
+        Path of the last checkpoint of a run, or None.
+        """
+        rows = self._execute("SELECT path FROM checkpoints WHERE run = ?"
+                             + " ORDER BY timesteps DESC LIMIT 1", (run,))
+        return rows[0]["path"] if rows else None
+
+    def best_checkpoints(self, map_name:str, seeker="static", group_by="observation",
+                         min_episodes=1) -> list:
+        """
+        Best evaluated checkpoint of each group of runs on a map.
+
+        Parameters
+        ----------
+        map_name : str
+            map of the evaluations
+        seeker : str, optional
+            seeker of the evaluations, by default "static"
+        group_by : str, optional
+            "observation" (best checkpoint per observation type), "run" (best
+            checkpoint per run) or "map" (best checkpoint per training map),
+            by default "observation"
+        min_episodes : int, optional
+            ignore evaluations with fewer episodes, by default 1
+
+        Returns
+        -------
+        list
+            one dict per group (group, run, path, timesteps, mean_reward,
+            hide_rate, nb_episodes), best first
+        """
+        column = {"observation": "runs.observation", "run": "runs.name",
+                  "map": "runs.map"}[group_by]
+        # SQLite takes the other columns from the row of the MAX
+        query = (f"SELECT {column} AS grp, runs.name AS run, checkpoints.path,"
+                 + " checkpoints.timesteps, MAX(evaluations.mean_reward) AS mean_reward,"
+                 + " evaluations.hide_rate, evaluations.nb_episodes"
+                 + " FROM evaluations"
+                 + " JOIN checkpoints ON checkpoints.path = evaluations.path"
+                 + " JOIN runs ON runs.name = checkpoints.run"
+                 + " WHERE evaluations.map = ? AND evaluations.seeker = ?"
+                 + " AND evaluations.nb_episodes >= ?"
+                 + f" GROUP BY {column} ORDER BY mean_reward DESC")
+        rows = self._execute(query, (map_name, seeker, min_episodes))
+        for row in rows:
+            row["group"] = row.pop("grp")
+        return rows
+
+    def run_of(self, checkpoint_path:str) -> dict:
+        """
+        Returns the run a checkpoint belongs to (the run of its folder), or None.
+        """
+        return self.get_run(os.path.basename(os.path.dirname(os.path.normpath(checkpoint_path))))
+
+    # --- migration ---
+
+    def import_folder(self, folder:str) -> bool:
+        """
+        Register a run folder written before the registry existed, from its
+        model_info.txt, observation_type.pkl and checkpoint files.
+        Returns False if the folder is not a run folder.
+        """
+        info_path = os.path.join(folder, "model_info.txt")
+        pickle_path = os.path.join(folder, "observation_type.pkl")
+        if not (os.path.exists(info_path) and os.path.exists(pickle_path)):
+            return False
+
+        info = {}
+        with open(info_path) as f:
+            for line in f:
+                if ": " in line:
+                    key, value = line.rstrip("\n").split(": ", 1)
+                    info[key] = value
+        with open(pickle_path, "rb") as obs:
+            observation_type = pickle.load(obs)
+
+        name = os.path.basename(os.path.normpath(folder))
+        self.register_run(name, folder, observation_type,
+                          info.get("Map trained on"), info.get("Seeker", "static"),
+                          algorithm=name.split("_")[0], hyperparameters=info)
+        for file_name in os.listdir(folder):
+            stem, extension = os.path.splitext(file_name)
+            if extension == ".zip" and stem.isdigit():
+                self.add_checkpoint(name, int(stem), os.path.join(folder, file_name))
+            elif extension == ".npz":
+                self.add_checkpoint(name, None, os.path.join(folder, file_name))
+        return True
+
+
+def _normalize(path:str) -> str:
+    """
+    Key of a path in the registry: absolute and normalized, so that a checkpoint
+    has the same key whatever the working directory and the way it is typed.
+    """
+    return os.path.abspath(path)
+
+
+def registry_of(model_path:str) -> str:
+    """
+    Path of the registry of a model (a checkpoint or a run folder): the registry
+    file in the folder containing the run folders.
+    """
+    model_path = os.path.normpath(model_path)
+    run_folder = model_path if os.path.isdir(model_path) else os.path.dirname(model_path)
+    return os.path.join(os.path.dirname(run_folder), REGISTRY_FILE)
+
+
+def save_observation_spec(run_folder:str, observation_type:ObservationType) -> None:
+    """
+    Write the spec of the observation type of a run in its folder (see
+    load_observation_type).
+    """
+    with open(os.path.join(run_folder, OBSERVATION_SPEC_FILE), "w") as f:
+        json.dump(observation_type.get_spec(), f)
+
+
+def load_observation_type(model_path:str) -> ObservationType:
+    """
+    Observation type of a model (a checkpoint or a run folder), from the registry,
+    or for runs that are not in it, from the observation_spec.json of its folder,
+    or from the observation_type.pkl of runs trained before the registry.
+    Not compact if the checkpoints of the model have int64 observations.
+    """
+    model_path = os.path.normpath(model_path)
+    run_folder = model_path if os.path.isdir(model_path) else os.path.dirname(model_path)
+
+    registry_path = registry_of(model_path)
+    if os.path.exists(registry_path):
+        run = ModelRegistry(registry_path).get_run(os.path.basename(run_folder))
+        if run is not None:
+            observation_type = observation_type_from_spec(run["observation_spec"])
+            if not _has_compact_observations(model_path):
+                observation_type.compact = False
+            return observation_type
+
+    spec_path = os.path.join(run_folder, OBSERVATION_SPEC_FILE)
+    if os.path.exists(spec_path):
+        with open(spec_path) as f:
+            observation_type = observation_type_from_spec(json.load(f))
+    else:
+        with open(os.path.join(run_folder, "observation_type.pkl"), "rb") as obs:
+            observation_type = pickle.load(obs)
+    if not _has_compact_observations(model_path):
+        observation_type.compact = False
+    return observation_type
+
+
+def _has_compact_observations(model_path:str) -> bool:
+    """
+    False if the DQN checkpoint (or the first checkpoint of the run folder) has
+    int64 observations, as the models trained before compact dtypes. True
+    otherwise, also for the .npz policies, which accept any dtype.
+    """
+    if os.path.isdir(model_path):
+        checkpoints = sorted(name for name in os.listdir(model_path) if name.endswith(".zip"))
+        if not checkpoints:
+            return True
+        model_path = os.path.join(model_path, checkpoints[0])
+    if not model_path.endswith(".zip"):
+        return True
+    # the data of a checkpoint lists the attributes of the observation space
+    # (see stable_baselines3.common.save_util.data_to_json)
+    with zipfile.ZipFile(model_path) as archive:
+        space = json.loads(archive.read("data")).get("observation_space", {})
+    return space.get("dtype", space.get("_dtype")) != "int64"
@@ -0,0 +1,274 @@
+"""
+Multi-agent Hide and Seek: several hiders (the learning agents) and several
+seekers (moved by a scripted policy, see SeekerPolicy.py) on the same map.
+
+Follows the PettingZoo parallel API (reset() and step() take and return one
+entry per agent, in dictionaries keyed by agent name). PettingZoo itself is
+optional: when it is installed, the environment is a pettingzoo.ParallelEnv.
+
+The state of the game is two arrays of cell indices (see GridTables), so
+visibility (a hider is seen if at least one seeker sees it) is one lookup in the
+visibility table per step, and collisions are resolved on the position arrays.
+"""
+
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+from gymnasium import spaces
+
+import Maps
+from Game import Game
+from GridTables import GridTables, STAY
+from ObservationType import ObservationType, LongViewObservation
+from SeekerPolicy import make_seeker_policy
+from Vector2 import Vector2
+
+try:
+    from pettingzoo import ParallelEnv
+except ImportError:
+    ParallelEnv = object
+
+
+def resolve_moves(tables:GridTables, positions:np.ndarray,
+                  actions:np.ndarray) -> np.ndarray:
+    """
+    Move all the entities at the same time.
+    A move is done only if the target cell is free (no wall, inside the grid, no
+    entity on it at the start of the step) and no other entity moves to the same
+    cell. Otherwise the entity stays in place.
+
+    Parameters
+    ----------
+    tables : GridTables
+        tables of the map
+    positions : np.ndarray
+        cell index of each entity
+    actions : np.ndarray
+        action of each entity (see GridTables, STAY included)
+
+    Returns
+    -------
+    np.ndarray
+        the new cell index of each entity
+    """
+    targets = tables.neighbours[positions, actions]
+    occupied = np.zeros(tables.nb_cells, dtype=bool)
+    occupied[positions] = True
+    nb_claims = np.bincount(targets, minlength=tables.nb_cells)
+
+    moving = (targets != positions) & ~occupied[targets] & (nb_claims[targets] == 1)
+    return np.where(moving, targets, positions)
+
+
+class MultiHideAndSeekEnv(ParallelEnv):
+    """
+    Hide and Seek with nb_hiders hiders and nb_seekers seekers.
+    A hider is terminated as soon as it is hidden from every seeker, it then
+    stays in place (still blocking the others) until the end of the episode.
+    """
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 4,
+                "name": "hide_and_seek_v0"}
+
+    def __init__(self, nb_hiders=2, nb_seekers=2, render_mode=None,
+                 map_name=Maps.DEFAULT_MAP, map_size=(12, 12),
+                 observation_type:ObservationType=None,
+                 seeker_policy="chase_last_seen") -> None:
+        """
+        Initializes the environment.
+
+        Parameters
+        ----------
+        nb_hiders : int, optional
+            number of hiders (agents of the environment), by default 2
+        nb_seekers : int, optional
+            number of seekers, by default 2
+        render_mode : str, optional, "human" or "rgb_array"
+            The render mode, by default None
+        map_name : str, optional
+            The map to use, by default Maps.DEFAULT_MAP
+        map_size : Tuple[int, int], optional
+            (width, height) of the map if map_name is "random", by default (12, 12)
+        observation_type : ObservationType, optional
+            The observation type of each hider. If None, LongViewObservation(5) is
+            used. The player position is the one of the closest seeker, and
+            agent_is_seen is True if any seeker sees the hider.
+        seeker_policy : str or SeekerPolicy, optional
+            How the seekers move, by default "chase_last_seen". Each seeker
+            follows the closest hider still playing.
+        """
+        self.game = Game(map_name=map_name, map_size=map_size,
+                         nb_players=nb_seekers, nb_agents=nb_hiders)
+        self.tables = GridTables.from_grid(self.game.grid)
+        assert nb_hiders + nb_seekers <= self.tables.nb_cells, "Not enough free cells."
+
+        if observation_type is None:
+            observation_type = LongViewObservation(5)
+        self.observation_type = observation_type
+        self.seeker_policy = make_seeker_policy(seeker_policy)
+
+        self.possible_agents = [f"hider_{i}" for i in range(nb_hiders)]
+        self.agents = []
+        self.nb_hiders = nb_hiders
+        self.nb_seekers = nb_seekers
+
+        self._observation_space = observation_type.get_observation_space(
+            self.tables.GRID_W, self.tables.GRID_H)
+        self._action_space = spaces.Discrete(4)
+
+        assert render_mode is None or render_mode in self.metadata["render_modes"]
+        self.render_mode = render_mode
+
+        self.rng = np.random.default_rng()
+        self.hiders = np.zeros(nb_hiders, dtype=np.int32)
+        self.seekers = np.zeros(nb_seekers, dtype=np.int32)
+        self.hidden = np.zeros(nb_hiders, dtype=bool)
+        self.steps = 0
+        self.maximum_steps = 300
+
+    def observation_space(self, agent:str) -> spaces.Box:
+        return self._observation_space
+
+    def action_space(self, agent:str) -> spaces.Discrete:
+        return self._action_space
+
+    def _hiders_seen(self) -> np.ndarray:
+        """
+        A hider is seen if at least one seeker sees it, for all hiders at once.
+        """
+        return self.tables.visibility[self.seekers[:, None], self.hiders[None, :]].any(axis=0)
+
+    def _closest_seekers(self) -> np.ndarray:
+        """
+        Cell of the closest seeker (BFS distance) of each hider.
+        """
+        distances = self.tables.distances[self.seekers[:, None], self.hiders[None, :]]
+        return self.seekers[distances.argmin(axis=0)]
+
+    def _closest_hiders(self) -> np.ndarray:
+        """
+        Cell of the closest hider still playing of each seeker
+        (any hider if they are all hidden).
+        """
+        distances = self.tables.distances[self.seekers[:, None],
+                                          self.hiders[None, :]].astype(np.int32)
+        if not self.hidden.all():
+            distances[:, self.hidden] = np.iinfo(np.int32).max
+        return self.hiders[distances.argmin(axis=1)]
+
+    def _get_observations(self) -> Dict[str, np.ndarray]:
+        observations = self.observation_type.get_observation_batch(
+            self.tables, self._closest_seekers(), self.hiders
+        )
+        observations[:, 4] = self._hiders_seen()
+        return {name: observations[i] for i, name in enumerate(self.possible_agents)
+                if name in self.agents}
+
+    def _get_infos(self) -> Dict[str, Dict]:
+        seekers_xy = self.tables.cells[self.seekers]
+        infos = {}
+        for i, name in enumerate(self.possible_agents):
+            if name in self.agents:
+                distances = np.abs(seekers_xy - self.tables.cells[self.hiders[i]]).sum(axis=1)
+                infos[name] = {"distance": int(distances.min())}
+        return infos
+
+    def reset(self, seed=None, options=None) -> Tuple[Dict, Dict]:
+        """
+        Resets the environment: seekers are placed uniformly at random, then each
+        hider is placed on a free cell seen by at least one seeker.
+        """
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+
+        self.seekers[:] = self.rng.choice(self.tables.nb_cells, self.nb_seekers,
+                                          replace=False)
+        seen_cells = self.tables.visibility[self.seekers].any(axis=0)
+        seen_cells[self.seekers] = False
+        candidates = np.nonzero(seen_cells)[0]
+        assert len(candidates) >= self.nb_hiders, "Seekers do not see enough cells."
+        self.hiders[:] = self.rng.choice(candidates, self.nb_hiders, replace=False)
+
+        self.hidden[:] = False
+        self.steps = 0
+        self.agents = self.possible_agents[:]
+        self.seeker_policy.reset(self.tables, self.seekers, self._closest_hiders())
+
+        if self.render_mode == "human":
+            self.render()
+
+        return self._get_observations(), self._get_infos()
+
+    def step(self, actions:Dict[str, int]):
+        """
+        Moves every hider still playing and every seeker at the same time.
+
+        Parameters
+        ----------
+        actions : Dict[str, int]
+            the action of each hider still playing (see Game.handle_action)
+
+        Returns
+        -------
+        Tuple[Dict, Dict, Dict, Dict, Dict]
+            observations, rewards, terminations, truncations and infos of each
+            hider still playing at the start of the step
+        """
+        self.steps += 1
+        playing = [name for name in self.possible_agents if name in self.agents]
+
+        hider_actions = np.full(self.nb_hiders, STAY, dtype=np.int64)
+        for i, name in enumerate(self.possible_agents):
+            if name in actions and name in self.agents:
+                hider_actions[i] = actions[name]
+        seeker_actions = self.seeker_policy.act(self.tables, self.seekers,
+                                                self._closest_hiders())
+
+        positions = resolve_moves(self.tables,
+                                  np.concatenate([self.hiders, self.seekers]),
+                                  np.concatenate([hider_actions, seeker_actions]))
+        self.hiders[:] = positions[:self.nb_hiders]
+        self.seekers[:] = positions[self.nb_hiders:]
+
+        newly_hidden = ~self._hiders_seen() & ~self.hidden
+        self.hidden |= newly_hidden
+        truncate = self.steps >= self.maximum_steps
+
+        rewards, terminations, truncations = {}, {}, {}
+        for i, name in enumerate(self.possible_agents):
+            if name in playing:
+                rewards[name] = 50 if newly_hidden[i] else -1
+                terminations[name] = bool(newly_hidden[i])
+                truncations[name] = truncate and not newly_hidden[i]
+
+        observations = self._get_observations()
+        infos = self._get_infos()
+        self.agents = [name for name in playing
+                       if not terminations[name] and not truncations[name]]
+
+        if self.render_mode == "human":
+            self.render()
+
+        return observations, rewards, terminations, truncations, infos
+
+    def render(self):
+        """
+        Renders the current state of the environment with Game.render().
+        """
+        for entity, cell in zip(self.game.agents + self.game.players,
+                                np.concatenate([self.hiders, self.seekers])):
+            x, y = self.tables.cells[cell]
+            entity.pos = Vector2(int(x), int(y))
+        for agent, seen in zip(self.game.agents, self._hiders_seen()):
+            agent.is_seen = bool(seen)
+
+        board = self.game.render()
+        if self.render_mode == "human":
+            cv2.imshow("Hide and Seek", board)
+            cv2.waitKey(1000 // self.metadata["render_fps"])
+        else:
+            return board
+
+    def close(self) -> None:
+        if self.render_mode == "human":
+            cv2.destroyAllWindows()
@@ -1,11 +1,21 @@
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from typing import Tuple
 import numpy as np
+from gymnasium import spaces
 
 from Game import Game
+from GridTables import GridTables
 from Vector2 import Vector2
 
 class ObservationType(ABC):
+    # True if the wall bits are packed into bytes (np.packbits)
+    packed = False
+    # False for the models trained before compact dtypes existed: int64
+    # components, all of them between 0 and the size of the grid minus 1 (see
+    # ModelRegistry.load_observation_type)
+    compact = True
+
     @abstractmethod
     def __init__(self) -> None:
         pass
@@ -14,10 +24,105 @@ class ObservationType(ABC):
     def get_observation(self, game:Game) -> np.ndarray:
         pass
 
+    @abstractmethod
+    def get_observation_batch(self, tables:GridTables, player:np.ndarray,
+                              agent:np.ndarray) -> np.ndarray:
+        """
+        Returns the observations of many games at once, one row per game.
+        Row i is the same as get_observation() for a game with the player on cell
+        player[i] and the agent on cell agent[i] (see GridTables for cell indices).
+        """
+        pass
+
+    def get_dtype(self, grid_w:int, grid_h:int) -> np.dtype:
+        """
+        Smallest dtype holding every component of the observation on a grid of
+        the given size: uint8 if the coordinates fit in it, int16 otherwise
+        (int64 if not compact).
+        """
+        if not self.compact:
+            return np.dtype(np.int64)
+        return np.dtype(np.uint8) if max(grid_w, grid_h) <= 256 else np.dtype(np.int16)
+
+    def get_bounds(self, grid_w:int, grid_h:int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the lowest and highest value of each component of the observation:
+        the coordinates are inside the grid, all the other components are 0 or 1.
+        If not compact, every component is between 0 and the size of the grid
+        minus 1, as in the observation space of the first models.
+        """
+        dtype = self.get_dtype(grid_w, grid_h)
+        if not self.compact:
+            return (np.zeros(self.shape, dtype=dtype),
+                    np.full(self.shape, max(grid_w, grid_h) - 1, dtype=dtype))
+        low = np.zeros(self.shape, dtype=dtype)
+        high = np.ones(self.shape, dtype=dtype)
+        high[:4] = [grid_w-1, grid_h-1, grid_w-1, grid_h-1]
+        return low, high
+
+    def get_observation_space(self, grid_w:int, grid_h:int) -> spaces.Box:
+        """
+        Returns the observation space for a grid of the given size, with bounds
+        per component (see get_bounds) and the smallest dtype (see get_dtype).
+        """
+        low, high = self.get_bounds(grid_w, grid_h)
+        return spaces.Box(low=low, high=high, dtype=low.dtype)
+
+    def get_wall_offsets(self) -> tuple:
+        """
+        Returns the (dx, dy) offsets from the agent of the cells whose wall bit
+        (1 for a wall, 0 otherwise, including outside of the grid) follows the
+        first five components, in the order of the observation.
+        """
+        return ()
+
+    def get_spec(self) -> dict:
+        """
+        Returns the parameters of the observation type as a JSON-serializable
+        dict, from which observation_type_from_spec() builds it again.
+        """
+        if not self.compact:
+            return {"type": self.__class__.__name__, "compact": False}
+        return {"type": self.__class__.__name__}
+
     def __str__(self) -> str:
         return self.__class__.__name__
 
 
+def _positions_batch(tables:GridTables, player:np.ndarray, agent:np.ndarray) -> list:
+    """
+    (player_x, player_y, agent_x, agent_y, agent_is_seen) of each game,
+    as a list of columns to concatenate with _concatenate
+    """
+    return [
+        tables.cells[player],
+        tables.cells[agent],
+        tables.visibility[player, agent][:, None],
+    ]
+
+
+def _concatenate(columns:list, dtype:np.dtype) -> np.ndarray:
+    return np.concatenate(columns, axis=1, dtype=dtype, casting="unsafe")
+
+
+@lru_cache(maxsize=256)
+def _wall_features(tables:GridTables, offsets:tuple, packed:bool=False) -> np.ndarray:
+    """
+    For each cell, 1 if the cell at each (dx, dy) offset is a wall, 0 otherwise
+    (cells outside of the grid are not walls). If packed, the bits of each cell
+    are packed into bytes with np.packbits.
+    """
+    features = np.zeros((tables.nb_cells, len(offsets)), dtype=np.uint8)
+    for i, (dx, dy) in enumerate(offsets):
+        x = tables.cells[:, 0] + dx
+        y = tables.cells[:, 1] + dy
+        inside = (x >= 0) & (x < tables.GRID_W) & (y >= 0) & (y < tables.GRID_H)
+        features[inside, i] = tables.walls[y[inside], x[inside]]
+    if packed:
+        features = np.packbits(features, axis=1)
+    return features
+
+
 class BasicObservation(ObservationType):
     def __init__(self) -> None:
         super().__init__()
@@ -40,7 +145,12 @@ class BasicObservation(ObservationType):
             int(game.agent.is_seen),
         ]
 
-        return np.array(obs)
+        return np.array(obs, dtype=self.get_dtype(game.GRID_W, game.GRID_H))
+
+    def get_observation_batch(self, tables:GridTables, player:np.ndarray,
+                              agent:np.ndarray) -> np.ndarray:
+        return _concatenate(_positions_batch(tables, player, agent),
+                            self.get_dtype(tables.GRID_W, tables.GRID_H))
 
 class ImmediateSuroundingsObservation(ObservationType):
     def __init__(self) -> None:
@@ -73,14 +183,39 @@ class ImmediateSuroundingsObservation(ObservationType):
                 else:
                     obs.append(0)
 
-        return np.array(obs)
+        return np.array(obs, dtype=self.get_dtype(game.GRID_W, game.GRID_H))
+
+    def get_observation_batch(self, tables:GridTables, player:np.ndarray,
+                              agent:np.ndarray) -> np.ndarray:
+        walls = _wall_features(tables, self.get_wall_offsets())[agent]
+        return _concatenate(_positions_batch(tables, player, agent) + [walls],
+                            self.get_dtype(tables.GRID_W, tables.GRID_H))
+
+    def get_wall_offsets(self) -> tuple:
+        # same order as get_observation()
+        return tuple((i, j) for i in range(-1, 2) for j in range(-1, 2)
+                     if i != 0 or j != 0)
 
 
 class LongViewObservation(ObservationType):
-    def __init__(self, view_size=5) -> None:
+    # class attribute so that observation types pickled before packing existed
+    # still load
+    packed = False
+
+    def __init__(self, view_size=5, packed=False) -> None:
+        """
+        Parameters
+        ----------
+        view_size : int, optional
+            length of the 8 rays, by default 5
+        packed : bool, optional
+            if True, the 8*view_size wall bits are packed into view_size bytes
+            (np.packbits), by default False
+        """
         super().__init__()
-        self.shape = (5+8*view_size,)
         self.view_size = view_size
+        self.packed = packed
+        self.shape = (5+view_size,) if packed else (5+8*view_size,)
 
     def get_observation(self, game:Game) -> np.ndarray:
         """
@@ -90,7 +225,7 @@ class LongViewObservation(ObservationType):
 
         + 8*self.view_size booleans (0 or 1) walls are "nearby" or not
         For each 4 directions + 4 diagonals, cast a ray and remember which cells are
-        walls
+        walls (packed into self.view_size bytes if self.packed)
 
         Returns
         -------
@@ -158,8 +293,58 @@ class LongViewObservation(ObservationType):
             else:
                 obs.append(0)
 
+        dtype = self.get_dtype(game.GRID_W, game.GRID_H)
+        if self.packed:
+            walls = np.packbits(np.array(obs[5:], dtype=np.uint8))
+            return np.concatenate([np.array(obs[:5], dtype=dtype), walls], dtype=dtype)
 
-        return np.array(obs)
+        return np.array(obs, dtype=dtype)
+
+    def get_observation_batch(self, tables:GridTables, player:np.ndarray,
+                              agent:np.ndarray) -> np.ndarray:
+        walls = _wall_features(tables, self.get_wall_offsets(), self.packed)[agent]
+        return _concatenate(_positions_batch(tables, player, agent) + [walls],
+                            self.get_dtype(tables.GRID_W, tables.GRID_H))
+
+    def get_wall_offsets(self) -> tuple:
+        # same order as get_observation()
+        offsets = []
+        for d in range(1, self.view_size+1):
+            offsets += [(d, 0), (-d, 0)]
+        for d in range(1, self.view_size+1):
+            offsets += [(0, d), (0, -d)]
+        for d in range(1, self.view_size+1):
+            offsets += [(d, d), (-d, d), (d, -d), (-d, -d)]
+        return tuple(offsets)
+
+    def get_bounds(self, grid_w:int, grid_h:int) -> Tuple[np.ndarray, np.ndarray]:
+        low, high = super().get_bounds(grid_w, grid_h)
+        if self.packed:
+            high[5:] = 255
+        return low, high
+
+    def get_spec(self) -> dict:
+        return {**super().get_spec(), "view_size": self.view_size, "packed": self.packed}
 
     def __str__(self) -> str:
-        return self.__class__.__name__ + f"(view_size={self.view_size})"
\ No newline at end of file
+        if self.packed:
+            return self.__class__.__name__ + f"(view_size={self.view_size}, packed=True)"
+        return self.__class__.__name__ + f"(view_size={self.view_size})"
+
+
+OBSERVATION_TYPES = {
+    "BasicObservation": BasicObservation,
+    "ImmediateSuroundingsObservation": ImmediateSuroundingsObservation,
+    "LongViewObservation": LongViewObservation,
+}
+
+
+def observation_type_from_spec(spec:dict) -> ObservationType:
+    """
+    Build the observation type described by spec (see ObservationType.get_spec).
+    """
+    parameters = dict(spec)
+    compact = parameters.pop("compact", True)
+    observation_type = OBSERVATION_TYPES[parameters.pop("type")](**parameters)
+    observation_type.compact = compact
+    return observation_type
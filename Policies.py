@@ -0,0 +1,255 @@
+"""
+Policies that can be played like a stable-baselines3 DQN (same predict method),
+and a loader for every kind of saved policy.
+
+This module only needs NumPy: it does not import torch nor stable-baselines3,
+so the policies below load and play without them (for instance in a game
+server). Only load_policy() on a DQN .zip checkpoint imports stable-baselines3.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+import Maps
+
+
+class TabularPolicy:
+    """
+    Policy given by a table of actions, one per (player cell, agent cell) state.
+    It reads the positions that are the first four components of every
+    observation type, so it plays with any observation type.
+    Tables come from the tabular solver (solve.py) or from a distilled DQN
+    (distill.py). Playing a move is two lookups.
+    """
+    kind = "tabular"
+
+    def __init__(self, grid, actions:np.ndarray, q_values:np.ndarray=None) -> None:
+        """
+        Parameters
+        ----------
+        grid : list
+            the map the policy plays on
+        actions : np.ndarray
+            actions[p, a] is the action to play when the player is on cell p and
+            the agent on cell a (see GridTables for cell indices)
+        q_values : np.ndarray, optional
+            Q-values the actions were computed from, by default None
+        """
+        self.grid = grid
+        self.walls = np.array([[cell == Maps.WALL for cell in row] for row in grid])
+        self.actions = actions.astype(np.uint8)
+        self.q_values = q_values
+
+        # same cell indices as GridTables (free cells in row-major order), without
+        # computing the other tables
+        self.cell_index = np.full(self.walls.shape, -1, dtype=np.int32)
+        self.cell_index[~self.walls] = np.arange((~self.walls).sum())
+
+    def predict(self, observation:np.ndarray, state=None, episode_start=None,
+                deterministic=True) -> Tuple[np.ndarray, None]:
+        """
+        Returns the action of one observation or of a batch of observations,
+        same signature as DQN.predict().
+        """
+        observation = np.asarray(observation)
+        positions = observation.reshape(-1, observation.shape[-1])[:, :4].astype(np.intp)
+        player = self.cell_index[positions[:, 1], positions[:, 0]]
+        agent = self.cell_index[positions[:, 3], positions[:, 2]]
+        if (player < 0).any() or (agent < 0).any():
+            raise ValueError("Observation with a position on a wall of the map of the"
+                             + " policy: the policy is played on another map.")
+        actions = self.actions[player, agent].astype(np.int64)
+        if observation.ndim == 1:
+            actions = actions[0]
+        return actions, state
+
+    def act(self, player_x:int, player_y:int, agent_x:int, agent_y:int) -> int:
+        """
+        Returns the action of the agent for the given positions, without building
+        an observation.
+        """
+        player, agent = self.cell_index[player_y, player_x], self.cell_index[agent_y, agent_x]
+        if player < 0 or agent < 0:
+            raise ValueError("Position on a wall of the map of the policy: the policy"
+                             + " is played on another map.")
+        return int(self.actions[player, agent])
+
+    def save(self, path:str) -> None:
+        """
+        Save the policy in a .npz file.
+        """
+        arrays = {"kind": self.kind, "walls": self.walls, "actions": self.actions}
+        if self.q_values is not None:
+            arrays["q_values"] = self.q_values.astype(np.float32)
+        np.savez_compressed(path, **arrays)
+
+    @staticmethod
+    def load(path:str) -> "TabularPolicy":
+        with np.load(path) as data:
+            grid = _walls_to_grid(data["walls"])
+            q_values = data["q_values"] if "q_values" in data else None
+            return TabularPolicy(grid, data["actions"], q_values)
+
+
+class MlpQPolicy:
+    """
+    Q-network of a DQN MlpPolicy evaluated with NumPy (see export.py to create it
+    from a DQN checkpoint). Plays on any map, like the DQN it comes from, except
+    the network of a MaskedDQN: it keeps the map of the MaskedDQN and plays the
+    best valid action on it, as the MaskedDQN does.
+    """
+    kind = "mlp"
+
+    ACTIVATIONS = {
+        "ReLU": lambda x: np.maximum(x, 0, out=x),
+        "Tanh": lambda x: np.tanh(x, out=x),
+    }
+
+    def __init__(self, weights:list, biases:list, activations:list, grid=None) -> None:
+        """
+        Parameters
+        ----------
+        weights : list
+            weight matrix of each linear layer, shape (out_features, in_features)
+            as in torch
+        biases : list
+            bias of each linear layer
+        activations : list
+            name of the activation after each linear layer but the last one
+            (see MlpQPolicy.ACTIVATIONS)
+        grid : list, optional
+            the map whose invalid actions are never played (see
+            GridTables.action_masks), by default None (every action may be played)
+        """
+        assert len(weights) == len(biases) == len(activations) + 1
+        for activation in activations:
+            if activation not in self.ACTIVATIONS:
+                raise ValueError(f"Activation '{activation}' is not supported. Please"
+                                 + f" choose one of {list(self.ACTIVATIONS.keys())}")
+
+        # transposed once here so that a layer is x @ W + b
+        self.weights = [np.ascontiguousarray(w.T, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+        self.grid = None if grid is None else ["".join(row) for row in grid]
+        self.walls = None
+        if self.grid is not None:
+            self.walls = np.array([[cell == Maps.WALL for cell in row] for row in self.grid])
+
+    def q_values(self, observation:np.ndarray) -> np.ndarray:
+        """
+        Returns the Q-values of a batch of observations, shape (batch, 4).
+        """
+        x = np.asarray(observation, dtype=np.float32)
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            x = x @ weight
+            x += bias
+            if i < len(self.activations):
+                x = self.ACTIVATIONS[self.activations[i]](x)
+        return x
+
+    def predict(self, observation:np.ndarray, state=None, episode_start=None,
+                deterministic=True) -> Tuple[np.ndarray, None]:
+        """
+        Returns the greedy action of one observation or of a batch of observations,
+        same signature as DQN.predict().
+        """
+        observation = np.asarray(observation)
+        batch = observation.reshape(-1, observation.shape[-1])
+        q_values = self.q_values(batch)
+        if self.walls is not None:
+            q_values[~_action_masks(self.walls, batch[:, :4])] = -np.inf
+        actions = q_values.argmax(axis=1)
+        if observation.ndim == 1:
+            actions = actions[0]
+        return actions, state
+
+    def save(self, path:str) -> None:
+        """
+        Save the network in a .npz file.
+        """
+        arrays = {"kind": self.kind, "activations": np.array(self.activations, dtype=str)}
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"weight_{i}"] = weight.T
+            arrays[f"bias_{i}"] = bias
+        if self.walls is not None:
+            arrays["walls"] = self.walls
+        np.savez(path, **arrays)
+
+    @staticmethod
+    def load(path:str) -> "MlpQPolicy":
+        with np.load(path) as data:
+            nb_layers = len(data["activations"]) + 1
+            grid = _walls_to_grid(data["walls"]) if "walls" in data else None
+            return MlpQPolicy([data[f"weight_{i}"] for i in range(nb_layers)],
+                              [data[f"bias_{i}"] for i in range(nb_layers)],
+                              [str(activation) for activation in data["activations"]],
+                              grid)
+
+
+def _action_masks(walls:np.ndarray, positions:np.ndarray) -> np.ndarray:
+    """
+    Same as GridTables.action_masks, from the walls of the map and the positions
+    (player_x, player_y, agent_x, agent_y) of a batch of observations.
+    """
+    positions = positions.astype(np.intp)
+    player, agent = positions[:, None, :2], positions[:, None, 2:]
+    targets = agent + np.array([[-1, 0], [1, 0], [0, -1], [0, 1]])
+    x, y = targets[..., 0], targets[..., 1]
+    height, width = walls.shape
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    masks = inside & ~walls[np.where(inside, y, 0), np.where(inside, x, 0)]
+    masks &= (targets != player).any(axis=-1)
+    masks[~masks.any(axis=1)] = True
+    return masks
+
+
+def _walls_to_grid(walls:np.ndarray) -> list:
+    return ["".join(Maps.WALL if wall else Maps.EMPTY for wall in row) for row in walls]
+
+
+def load_policy(path:str, env=None):
+    """
+    Load a saved policy: a DQN or MaskedDQN checkpoint (.zip, from learn.py) or a
+    policy of this module (.npz).
+
+    Parameters
+    ----------
+    path : str
+        path of the saved policy
+    env : gym.Env, optional
+        environment given to DQN.load, or whose map a tabular policy is checked
+        against (ValueError if it differs), by default None
+
+    Returns
+    -------
+    DQN, MaskedDQN, TabularPolicy or MlpQPolicy
+        the policy, with a predict() method
+    """
+    if path.endswith(".zip"):
+        import json
+        import zipfile
+        from stable_baselines3 import DQN
+
+        # a MaskedDQN saves the map its masks are computed on
+        with zipfile.ZipFile(path) as archive:
+            masked = "grid" in json.loads(archive.read("data"))
+        if masked:
+            from MaskedDQN import MaskedDQN
+            return MaskedDQN.load(path, env=env)
+        return DQN.load(path, env=env)
+
+    with np.load(path) as data:
+        kind = str(data["kind"])
+    if kind == TabularPolicy.kind:
+        policy = TabularPolicy.load(path)
+        if env is not None:
+            grid = ["".join(row) for row in env.unwrapped.game.grid]
+            if grid != policy.grid:
+                raise ValueError(f"The tabular policy {path} was computed on another"
+                                 + " map than the one of the environment.")
+        return policy
+    if kind == MlpQPolicy.kind:
+        return MlpQPolicy.load(path)
+    raise ValueError(f"Unknown policy kind '{kind}' in {path}.")
@@ -0,0 +1,197 @@
+"""
+Scripted policies moving the seeker (the player) during training.
+
+All the decisions are table lookups in the GridTables of the map (BFS distance
+fields, shortest path first moves and visibility masks), so a policy never
+searches a path at run time. Policies work on arrays of cell indices, one entry
+per game, so the same code drives a single HideAndSeekEnv (arrays of size 1) and
+a BatchedGame stepping many games at once.
+"""
+
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+import numpy as np
+
+from GridTables import GridTables, STAY, UNREACHABLE
+
+
+class SeekerPolicy(ABC):
+    # True if the seeker never moves, the environment can then skip it entirely
+    is_static = False
+
+    @abstractmethod
+    def __init__(self) -> None:
+        pass
+
+    def reset(self, tables:GridTables, player:np.ndarray, agent:np.ndarray,
+              indices=None) -> None:
+        """
+        Reset the memory of the policy at the start of an episode.
+
+        Parameters
+        ----------
+        tables : GridTables
+            tables of the map
+        player : np.ndarray
+            cell index of the seeker of every game
+        agent : np.ndarray
+            cell index of the agent of every game
+        indices : np.ndarray, optional
+            games to reset, by default None (all games, this also sets the
+            number of games handled by the policy)
+        """
+        pass
+
+    @abstractmethod
+    def act(self, tables:GridTables, player:np.ndarray, agent:np.ndarray) -> np.ndarray:
+        """
+        Returns the action of the seeker of every game (see GridTables for the
+        actions, STAY included).
+
+        Parameters
+        ----------
+        tables : GridTables
+            tables of the map
+        player : np.ndarray
+            cell index of the seeker of every game
+        agent : np.ndarray
+            cell index of the agent of every game
+
+        Returns
+        -------
+        np.ndarray
+            the action of each seeker
+        """
+        pass
+
+    def __str__(self) -> str:
+        return self.__class__.__name__
+
+
+class StaticSeeker(SeekerPolicy):
+    """
+    The seeker does not move (original behaviour of the environment).
+    """
+    is_static = True
+
+    def __init__(self) -> None:
+        super().__init__()
+
+    def act(self, tables:GridTables, player:np.ndarray, agent:np.ndarray) -> np.ndarray:
+        return np.full(len(player), STAY, dtype=np.uint8)
+
+
+class PatrolSeeker(SeekerPolicy):
+    """
+    The seeker walks along a fixed route of waypoints that together see every
+    cell of the map (see patrol_route()), going to the next waypoint each time one
+    is reached.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.waypoint = np.zeros(0, dtype=np.int32)
+
+    def reset(self, tables:GridTables, player:np.ndarray, agent:np.ndarray,
+              indices=None) -> None:
+        route = patrol_route(tables)
+        if indices is None:
+            indices = np.arange(len(player))
+            self.waypoint = np.zeros(len(player), dtype=np.int32)
+
+        # start with the closest waypoint
+        self.waypoint[indices] = tables.distances[player[indices][:, None],
+                                                   route[None, :]].argmin(axis=1)
+
+    def act(self, tables:GridTables, player:np.ndarray, agent:np.ndarray) -> np.ndarray:
+        route = patrol_route(tables)
+        # unreachable waypoints (disconnected parts of the map) are skipped
+        arrived = ((player == route[self.waypoint])
+                   | (tables.distances[player, route[self.waypoint]] == UNREACHABLE))
+        self.waypoint[arrived] = (self.waypoint[arrived] + 1) % len(route)
+        return tables.next_action[player, route[self.waypoint]]
+
+
+class ChaseLastSeenSeeker(PatrolSeeker):
+    """
+    The seeker goes to the last cell where it saw the agent. If it reaches it
+    without seeing the agent, it goes back to patrolling (see PatrolSeeker).
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.last_seen = np.zeros(0, dtype=np.int32)
+
+    def reset(self, tables:GridTables, player:np.ndarray, agent:np.ndarray,
+              indices=None) -> None:
+        if indices is None:
+            self.last_seen = np.full(len(player), -1, dtype=np.int32)
+        super().reset(tables, player, agent, indices)
+        indices = np.arange(len(player)) if indices is None else indices
+        self.last_seen[indices] = -1
+
+    def act(self, tables:GridTables, player:np.ndarray, agent:np.ndarray) -> np.ndarray:
+        seen = tables.visibility[player, agent]
+        self.last_seen[seen] = agent[seen]
+        # last seen position reached (or unreachable) and agent not in sight: forget it
+        lost = ((player == self.last_seen)
+                | (tables.distances[player, self.last_seen] == UNREACHABLE))
+        self.last_seen[lost] = -1
+
+        actions = super().act(tables, player, agent)
+        chasing = self.last_seen >= 0
+        actions[chasing] = tables.next_action[player[chasing], self.last_seen[chasing]]
+        return actions
+
+
+SEEKER_POLICIES = {
+    "static": StaticSeeker,
+    "chase_last_seen": ChaseLastSeenSeeker,
+    "patrol": PatrolSeeker,
+}
+
+
+def make_seeker_policy(seeker_policy) -> SeekerPolicy:
+    """
+    Returns a new seeker policy from its name (see SEEKER_POLICIES).
+    A SeekerPolicy instance is returned as is.
+    """
+    if isinstance(seeker_policy, SeekerPolicy):
+        return seeker_policy
+    if seeker_policy not in SEEKER_POLICIES:
+        raise ValueError(f"Seeker policy '{seeker_policy}' does not exist. Please choose"
+                         + f" one of {list(SEEKER_POLICIES.keys())}")
+    return SEEKER_POLICIES[seeker_policy]()
+
+
+@lru_cache(maxsize=64)
+def patrol_route(tables:GridTables) -> np.ndarray:
+    """
+    Returns a cyclic route of waypoints (cell indices) that together see all the
+    cells of the map.
+
+    Waypoints are chosen greedily (the cell seeing the most cells not seen yet),
+    then ordered by always going to the closest remaining waypoint.
+
+    Parameters
+    ----------
+    tables : GridTables
+        tables of the map
+
+    Returns
+    -------
+    np.ndarray
+        the waypoints, in visiting order
+    """
+    not_covered = np.ones(tables.nb_cells, dtype=bool)
+    waypoints = []
+    while not_covered.any():
+        gain = (tables.visibility & not_covered).sum(axis=1)
+        best = int(gain.argmax())
+        waypoints.append(best)
+        not_covered &= ~tables.visibility[best]
+
+    route = [waypoints.pop(0)]
+    while waypoints:
+        closest = int(np.argmin(tables.distances[route[-1], waypoints]))
+        route.append(waypoints.pop(closest))
+    return np.array(route, dtype=np.int32)
@@ -0,0 +1,301 @@
+"""
+Multiprocess vectorized HideAndSeekEnv, exchanging data through shared memory.
+
+SubprocVecEnv sends every action, observation, reward and info dict through a
+pipe, pickled, which costs more than a step of HideAndSeekEnv. Here each worker
+process steps a contiguous block of games and writes their observations,
+rewards, flags and infos directly into NumPy arrays in shared memory; the main
+process only writes the actions and wakes the workers up with a semaphore each,
+then waits on a single semaphore counting the workers that are done. Pipes are
+only used for the rare get_attr / set_attr / env_method calls.
+
+    env = SharedMemoryVecEnv(64, n_workers=8, observation_type=LongViewObservation(5))
+    model = DQN("MlpPolicy", env)
+"""
+
+import multiprocessing
+import os
+import time
+import traceback
+from typing import List
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+import Maps
+from Game import Game
+from HideAndSeekEnv import HideAndSeekEnv
+from ObservationType import ObservationType, LongViewObservation
+
+# commands of the workers
+STEP, RESET, CALL, CLOSE = range(4)
+
+
+def _shared_arrays(n_envs:int, observation_space:spaces.Box) -> dict:
+    """
+    (shape, dtype) of each array shared with the workers.
+    """
+    observation = ((n_envs,) + observation_space.shape, observation_space.dtype)
+    return {
+        "actions": ((n_envs,), np.dtype(np.int64)),
+        "observations": observation,
+        "terminal_observations": observation,
+        "rewards": ((n_envs,), np.dtype(np.float32)),
+        "terminated": ((n_envs,), np.dtype(bool)),
+        "truncated": ((n_envs,), np.dtype(bool)),
+        "distances": ((n_envs,), np.dtype(np.int64)),
+        "action_masks": ((n_envs, 4), np.dtype(bool)),
+        "seeds": ((n_envs,), np.dtype(np.int64)),
+        "has_seed": ((n_envs,), np.dtype(bool)),
+    }
+
+
+def _views(buffers:dict, layout:dict) -> dict:
+    return {name: np.frombuffer(buffers[name], dtype=dtype).reshape(shape)
+            for name, (shape, dtype) in layout.items()}
+
+
+def _worker(start:int, end:int, env_kwargs:dict, buffers:dict, layout:dict, command,
+            go, done, failed, pipe) -> None:
+    """
+    Step the games start to end-1 on the commands of the main process.
+    """
+    try:
+        arrays = _views(buffers, layout)
+        envs = [HideAndSeekEnv(**env_kwargs) for _ in range(end - start)]
+        while True:
+            go.acquire()
+            if command.value == STEP:
+                actions = arrays["actions"]
+                for i, env in enumerate(envs, start):
+                    observation, reward, terminated, truncated, info = env.step(actions[i])
+                    arrays["rewards"][i] = reward
+                    arrays["terminated"][i] = terminated
+                    arrays["truncated"][i] = truncated
+                    arrays["distances"][i] = info["distance"]
+                    if terminated or truncated:
+                        arrays["terminal_observations"][i] = observation
+                        observation, info = env.reset()
+                    arrays["observations"][i] = observation
+                    arrays["action_masks"][i] = info["action_mask"]
+
+            elif command.value == RESET:
+                for i, env in enumerate(envs, start):
+                    seed = int(arrays["seeds"][i]) if arrays["has_seed"][i] else None
+                    arrays["has_seed"][i] = False
+                    observation, info = env.reset(seed=seed)
+                    arrays["observations"][i] = observation
+                    arrays["action_masks"][i] = info["action_mask"]
+
+            elif command.value == CALL:
+                kind, name, indices, args, kwargs = pipe.recv()
+                selected = [envs[i - start] for i in indices if start <= i < end]
+                if kind == "get_attr":
+                    pipe.send([getattr(env, name) for env in selected])
+                elif kind == "set_attr":
+                    for env in selected:
+                        setattr(env, name, args[0])
+                    pipe.send(None)
+                else: # env_method
+                    pipe.send([getattr(env, name)(*args, **kwargs) for env in selected])
+
+            else: # CLOSE
+                for env in envs:
+                    env.close()
+                done.release()
+                return
+            done.release()
+    except Exception:
+        pipe.send(traceback.format_exc())
+        failed.value = 1
+        done.release()
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    n_envs HideAndSeekEnv games stepped by n_workers processes, with automatic
+    reset of the finished episodes (as every VecEnv).
+    """
+    def __init__(self, n_envs:int, n_workers:int=None, map_name=Maps.DEFAULT_MAP,
+                 observation_type:ObservationType=None, seeker_policy="static",
+                 backend="python", start_method:str=None) -> None:
+        """
+        Start the workers.
+
+        Parameters
+        ----------
+        n_envs : int
+            number of games played in parallel
+        n_workers : int, optional
+            number of worker processes, each one stepping a contiguous block of
+            games, by default the number of CPUs (at most n_envs)
+        map_name : str or list, optional
+            The map to use, by default Maps.DEFAULT_MAP. "random" generates a
+            single random map for all the games.
+        observation_type : ObservationType, optional
+            The observation type to use. If None, LongViewObservation(5) is used.
+        seeker_policy : str, optional
+            how the player moves, by default "static" (see SeekerPolicy.py)
+        backend : str, optional
+            backend of the games, "python" or "numba" (see HideAndSeekEnv), by
+            default "python"
+        start_method : str, optional
+            multiprocessing start method, by default the default of the platform
+        """
+        if observation_type is None:
+            observation_type = LongViewObservation(5)
+        # the workers play on the grid of this game, the same random map for all
+        self.game = Game(map_name=map_name)
+        self.render_mode = None
+        observation_space = observation_type.get_observation_space(self.game.GRID_W,
+                                                                   self.game.GRID_H)
+        super().__init__(n_envs, observation_space, spaces.Discrete(4))
+
+        n_workers = min(n_envs, n_workers or os.cpu_count())
+        bounds = np.linspace(0, n_envs, n_workers + 1).astype(int)
+        self.blocks = list(zip(bounds[:-1], bounds[1:]))
+
+        context = multiprocessing.get_context(start_method)
+        layout = _shared_arrays(n_envs, observation_space)
+        buffers = {name: context.RawArray("b", max(1, int(np.prod(shape)) * dtype.itemsize))
+                   for name, (shape, dtype) in layout.items()}
+        self.arrays = _views(buffers, layout)
+        self.command = context.RawValue("i", RESET)
+        self.failed = context.RawValue("i", 0)
+        self.done = context.Semaphore(0)
+        self.go = [context.Semaphore(0) for _ in self.blocks]
+        self.pipes = []
+        self.processes = []
+        env_kwargs = dict(map_name=["".join(row) for row in self.game.grid],
+                          observation_type=observation_type,
+                          seeker_policy=seeker_policy, backend=backend)
+        for (start, end), go in zip(self.blocks, self.go):
+            pipe, worker_pipe = context.Pipe()
+            process = context.Process(target=_worker, daemon=True, args=(
+                int(start), int(end), env_kwargs, buffers, layout, self.command, go,
+                self.done, self.failed, worker_pipe))
+            process.start()
+            worker_pipe.close()
+            self.pipes.append(pipe)
+            self.processes.append(process)
+        self.closed = False
+
+        self.episode_returns = np.zeros(n_envs)
+        self.episode_lengths = np.zeros(n_envs, dtype=np.int64)
+        self.t_start = time.time()
+
+    def _run(self, command:int, workers:list=None) -> None:
+        """
+        Run a command in the workers and wait until they are done.
+        """
+        workers = range(len(self.processes)) if workers is None else workers
+        self.command.value = command
+        for i in workers:
+            self.go[i].release()
+        for _ in workers:
+            while not self.done.acquire(timeout=1.0):
+                if not all(process.is_alive() for process in self.processes):
+                    self.close()
+                    raise RuntimeError("A worker of SharedMemoryVecEnv died.")
+        if self.failed.value:
+            errors = [pipe.recv() for pipe in self.pipes if pipe.poll()]
+            self.close()
+            raise RuntimeError("A worker of SharedMemoryVecEnv failed:\n"
+                               + "\n".join(errors))
+
+    def reset(self) -> np.ndarray:
+        self._run(RESET)
+        self.episode_returns[:] = 0
+        self.episode_lengths[:] = 0
+        return self.arrays["observations"].copy()
+
+    def step_async(self, actions:np.ndarray) -> None:
+        self.arrays["actions"][:] = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        self._run(STEP)
+        rewards = self.arrays["rewards"].copy()
+        terminated, truncated = self.arrays["terminated"], self.arrays["truncated"]
+        dones = terminated | truncated
+        self.episode_returns += rewards
+        self.episode_lengths += 1
+
+        infos = [{"distance": int(distance), "action_mask": mask.copy()}
+                 for distance, mask in zip(self.arrays["distances"],
+                                           self.arrays["action_masks"])]
+        for i in np.nonzero(dones)[0]:
+            infos[i]["terminal_observation"] = self.arrays["terminal_observations"][i].copy()
+            infos[i]["TimeLimit.truncated"] = bool(truncated[i])
+            # same as the info added by the Monitor wrapper
+            infos[i]["episode"] = {
+                "r": float(self.episode_returns[i]),
+                "l": int(self.episode_lengths[i]),
+                "t": round(time.time() - self.t_start, 6),
+            }
+        self.episode_returns[dones] = 0
+        self.episode_lengths[dones] = 0
+
+        return self.arrays["observations"].copy(), rewards, dones, infos
+
+    def action_masks(self) -> np.ndarray:
+        """
+        Returns the valid actions of every game, one row of 4 booleans per game.
+        """
+        return self.arrays["action_masks"].copy()
+
+    def seed(self, seed=None) -> List[int]:
+        """
+        Seed the games: game i is reset with seed + i at the next reset().
+        """
+        if seed is None:
+            return [None] * self.num_envs
+        self.arrays["seeds"][:] = seed + np.arange(self.num_envs)
+        self.arrays["has_seed"][:] = True
+        return [seed + i for i in range(self.num_envs)]
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if all(process.is_alive() for process in self.processes) and not self.failed.value:
+            self.command.value = CLOSE
+            for go in self.go:
+                go.release()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def _call(self, kind:str, name:str, indices, args=(), kwargs=None) -> list:
+        indices = self._get_indices(indices)
+        workers = [w for w, (start, end) in enumerate(self.blocks)
+                   if any(start <= i < end for i in indices)]
+        for w in workers:
+            self.pipes[w].send((kind, name, indices, args, kwargs or {}))
+        self._run(CALL, workers)
+        results = []
+        for w in workers:
+            result = self.pipes[w].recv()
+            if result is not None:
+                results.extend(result)
+        return results
+
+    def get_attr(self, attr_name:str, indices=None) -> list:
+        return self._call("get_attr", attr_name, indices)
+
+    def set_attr(self, attr_name:str, value, indices=None) -> None:
+        self._call("set_attr", attr_name, indices, (value,))
+
+    def env_method(self, method_name:str, *method_args, indices=None, **method_kwargs) -> list:
+        return self._call("env_method", method_name, indices, method_args, method_kwargs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return [False] * len(self._get_indices(indices))
+
+    def _get_indices(self, indices) -> list:
+        if indices is None:
+            return list(range(self.num_envs))
+        if isinstance(indices, int):
+            return [indices]
+        return list(indices)
@@ -0,0 +1,124 @@
+"""
+Replay buffer storing game states instead of observations.
+
+On a given map, a state of Hide and Seek is fully determined by the cell of the
+player and the cell of the agent, and every observation type can be rebuilt from
+it (see ObservationType.get_observation_batch). So instead of two observation
+vectors per transition (90 bytes of uint8 with LongViewObservation(5), 720 with
+int64), this buffer keeps two int16 cell indices per observation (15 bytes per
+transition with action, reward and flags), and rebuilds the observations of a
+sampled batch with a few table lookups.
+
+Usage with DQN:
+
+    model = DQN("MlpPolicy", env,
+                replay_buffer_class=StateReplayBuffer,
+                replay_buffer_kwargs=dict(grid=env.game.grid,
+                                          observation_type=observation_type))
+"""
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.buffers import BaseBuffer, ReplayBuffer
+from stable_baselines3.common.type_aliases import ReplayBufferSamples
+
+from GridTables import GridTables
+from ObservationType import ObservationType
+
+
+class StateReplayBuffer(ReplayBuffer):
+    """
+    ReplayBuffer storing (player cell, agent cell) pairs instead of observations.
+    """
+    def __init__(self, buffer_size:int, observation_space:spaces.Space,
+                 action_space:spaces.Space, device="auto", n_envs:int=1,
+                 optimize_memory_usage:bool=False,
+                 handle_timeout_termination:bool=True,
+                 grid=None, observation_type:ObservationType=None) -> None:
+        """
+        Allocate the buffer.
+
+        Parameters
+        ----------
+        buffer_size, observation_space, action_space, device, n_envs,
+        handle_timeout_termination :
+            see stable_baselines3 ReplayBuffer
+        optimize_memory_usage : bool, optional
+            ignored, states are small enough to store next states separately
+        grid : list
+            the map of the environment (env.game.grid). With map "random", it must
+            be the map generated by the environment.
+        observation_type : ObservationType
+            the observation type of the environment, used to rebuild observations
+        """
+        assert grid is not None and observation_type is not None, (
+            "StateReplayBuffer needs the grid and the observation type of the env.")
+
+        # BaseBuffer and not ReplayBuffer: we do not want the observation arrays
+        BaseBuffer.__init__(self, buffer_size, observation_space, action_space,
+                            device, n_envs=n_envs)
+        self.buffer_size = max(buffer_size // n_envs, 1)
+        self.optimize_memory_usage = False
+        self.handle_timeout_termination = handle_timeout_termination
+
+        self.tables = GridTables.from_grid(grid)
+        self.observation_type = observation_type
+        assert self.tables.nb_cells <= np.iinfo(np.int16).max, "Map too big for int16 cells."
+
+        # [..., 0] is the player cell, [..., 1] the agent cell
+        self.states = np.zeros((self.buffer_size, self.n_envs, 2), dtype=np.int16)
+        self.next_states = np.zeros((self.buffer_size, self.n_envs, 2), dtype=np.int16)
+        self.actions = np.zeros((self.buffer_size, self.n_envs, self.action_dim),
+                                dtype=np.uint8)
+        self.rewards = np.zeros((self.buffer_size, self.n_envs), dtype=np.float32)
+        self.dones = np.zeros((self.buffer_size, self.n_envs), dtype=bool)
+        self.timeouts = np.zeros((self.buffer_size, self.n_envs), dtype=bool)
+
+    def _to_states(self, obs:np.ndarray) -> np.ndarray:
+        """
+        (player cell, agent cell) of each observation, from the positions that are
+        the first four components of every observation type.
+        """
+        positions = np.asarray(obs).reshape(self.n_envs, -1)[:, :4].astype(np.int64)
+        return np.stack([self.tables.cell_index[positions[:, 1], positions[:, 0]],
+                         self.tables.cell_index[positions[:, 3], positions[:, 2]]],
+                        axis=1)
+
+    def add(self, obs:np.ndarray, next_obs:np.ndarray, action:np.ndarray,
+            reward:np.ndarray, done:np.ndarray, infos:list) -> None:
+        self.states[self.pos] = self._to_states(obs)
+        self.next_states[self.pos] = self._to_states(next_obs)
+        self.actions[self.pos] = np.asarray(action).reshape((self.n_envs, self.action_dim))
+        self.rewards[self.pos] = reward
+        self.dones[self.pos] = done
+
+        if self.handle_timeout_termination:
+            self.timeouts[self.pos] = [info.get("TimeLimit.truncated", False)
+                                       for info in infos]
+
+        self.pos += 1
+        if self.pos == self.buffer_size:
+            self.full = True
+            self.pos = 0
+
+    def _get_samples(self, batch_inds:np.ndarray, env=None) -> ReplayBufferSamples:
+        env_indices = np.random.randint(0, high=self.n_envs, size=(len(batch_inds),))
+
+        states = self.states[batch_inds, env_indices]
+        next_states = self.next_states[batch_inds, env_indices]
+        observations = self.observation_type.get_observation_batch(
+            self.tables, states[:, 0], states[:, 1])
+        next_observations = self.observation_type.get_observation_batch(
+            self.tables, next_states[:, 0], next_states[:, 1])
+
+        # Only use dones that are not due to timeouts
+        dones = self.dones[batch_inds, env_indices] & ~self.timeouts[batch_inds, env_indices]
+
+        data = (
+            self._normalize_obs(observations, env),
+            self.actions[batch_inds, env_indices].astype(np.int64),
+            self._normalize_obs(next_observations, env),
+            dones.astype(np.float32).reshape(-1, 1),
+            self._normalize_reward(self.rewards[batch_inds, env_indices].reshape(-1, 1), env),
+        )
+        return ReplayBufferSamples(*tuple(map(self.to_torch, data)))
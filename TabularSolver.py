@@ -0,0 +1,97 @@
+"""
+Exact solver of Hide and Seek on a fixed map with a static player.
+
+The state of a game is only (player cell, agent cell) (see GridTables), so on
+the shipped 12x12 maps there are about 10 000 states and 4 actions. The whole
+transition and reward model is built as arrays from the rules of
+Game.handle_action, and solved with vectorized Q-iteration, which gives the
+optimal policy in well under a second.
+
+Only the static player is supported: the moving seekers of SeekerPolicy.py have
+a memory (waypoint, last seen cell) that is not part of the state.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+from GridTables import GridTables
+
+# same rewards as HideAndSeekEnv.step
+HIDDEN_REWARD = 50
+STEP_REWARD = -1
+
+
+def build_model(tables:GridTables) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build the deterministic model of the game.
+
+    Parameters
+    ----------
+    tables : GridTables
+        tables of the map
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        next_agent[p, a, action]: cell of the agent after action, when the player
+        is on cell p and the agent on cell a (the agent cannot move onto the player)
+        hidden[p, a, action]: True if the agent is hidden after the action
+        (the episode is then terminated, with reward HIDDEN_REWARD)
+    """
+    n = tables.nb_cells
+    player = np.arange(n)[:, None, None]
+    agent = np.arange(n)[None, :, None]
+
+    next_agent = np.broadcast_to(tables.neighbours[None, :, :4], (n, n, 4))
+    next_agent = np.where(next_agent == player, agent, next_agent)
+    hidden = ~tables.visibility[player, next_agent]
+    return next_agent, hidden
+
+
+def q_iteration(tables:GridTables, gamma=0.99, tolerance=1e-6,
+                max_iterations=100_000) -> np.ndarray:
+    """
+    Compute the optimal Q-values of every state by Q-iteration, until the largest
+    update is smaller than tolerance.
+
+    Parameters
+    ----------
+    tables : GridTables
+        tables of the map
+    gamma : float, optional
+        discount factor, by default 0.99 (the default of DQN)
+    tolerance : float, optional
+        convergence threshold, by default 1e-6
+    max_iterations : int, optional
+        maximum number of iterations, by default 100 000
+
+    Returns
+    -------
+    np.ndarray
+        q_values[p, a, action] for the player on cell p and the agent on cell a
+        (states with p == a are not valid and can be ignored)
+    """
+    next_agent, hidden = build_model(tables)
+    player = np.arange(tables.nb_cells)[:, None, None]
+    rewards = np.where(hidden, HIDDEN_REWARD, STEP_REWARD).astype(np.float64)
+
+    values = np.zeros((tables.nb_cells, tables.nb_cells))
+    for _ in range(max_iterations):
+        q_values = rewards + gamma * np.where(hidden, 0.0, values[player, next_agent])
+        new_values = q_values.max(axis=2)
+        delta = np.abs(new_values - values).max()
+        values = new_values
+        if delta < tolerance:
+            break
+
+    return q_values
+
+
+def start_values(tables:GridTables, q_values:np.ndarray) -> np.ndarray:
+    """
+    Optimal value of each possible start (see GridTables.start_players and
+    GridTables.start_agents). Their mean is the expected discounted return of the
+    optimal policy, an upper bound for any trained agent.
+    """
+    return q_values[tables.start_players, tables.start_agents].max(axis=1)
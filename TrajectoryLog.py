@@ -0,0 +1,262 @@
+"""
+Compact log of played episodes, from which any episode can be played again
+exactly.
+
+An episode is deterministic given the map, the seeker policy, the start positions
+and the actions of the agent, so only those are stored:
+
+    header     b"HSTRAJ1\\n", uint32 length, JSON {"map": [...], "seeker": ...}
+    episode    uint64 seed, 4 x uint16 start positions (player x, y, agent x, y),
+               uint32 number of actions, then the actions, 2 bits each
+               (4 actions per byte)
+
+A 300 step episode takes 95 bytes. The file is append-only; the offset of each
+episode is appended to an index file next to it (<path>.idx, uint64 each), which
+gives random access by episode index. The index is rebuilt from the log if it is
+missing or incomplete.
+
+Usage:
+
+    env = LogTrajectories(HideAndSeekEnv(), TrajectoryWriter("episodes.traj", env))
+    ... play episodes ...
+    env.close()
+
+    reader = TrajectoryReader("episodes.traj")
+    episode = reader[1234]
+    for observation, reward, terminated, truncated, info in replay(reader, 1234): ...
+"""
+
+import json
+import os
+import struct
+
+import gymnasium as gym
+import numpy as np
+
+from SeekerPolicy import SEEKER_POLICIES
+
+MAGIC = b"HSTRAJ1\n"
+EPISODE_HEADER = struct.Struct("<QHHHHI")
+OFFSET = struct.Struct("<Q")
+
+
+def pack_actions(actions:list) -> bytes:
+    """
+    Pack actions (0 to 3) 2 bits each, the first action in the low bits.
+    """
+    actions = np.asarray(actions, dtype=np.uint8)
+    padded = np.zeros(-(-len(actions) // 4) * 4, dtype=np.uint8)
+    padded[:len(actions)] = actions
+    quads = padded.reshape(-1, 4)
+    return (quads[:, 0] | quads[:, 1] << 2 | quads[:, 2] << 4 | quads[:, 3] << 6).tobytes()
+
+
+def unpack_actions(data:bytes, nb_actions:int) -> np.ndarray:
+    packed = np.frombuffer(data, dtype=np.uint8)
+    actions = np.stack([packed & 3, packed >> 2 & 3, packed >> 4 & 3, packed >> 6], axis=1)
+    return actions.reshape(-1)[:nb_actions]
+
+
+class TrajectoryWriter:
+    """
+    Append episodes to a trajectory log (created if it does not exist).
+    """
+    def __init__(self, path:str, env) -> None:
+        """
+        Parameters
+        ----------
+        path : str
+            path of the log
+        env : HideAndSeekEnv
+            environment the episodes are played in, for its map and seeker policy
+            (one of SEEKER_POLICIES). An existing log must be for the same map and
+            seeker policy.
+        """
+        seekers = [name for name, policy in SEEKER_POLICIES.items()
+                   if type(env.seeker_policy) is policy]
+        if not seekers:
+            raise ValueError(f"Seeker policy {env.seeker_policy} cannot be logged, it is"
+                             + " not in SEEKER_POLICIES.")
+        self.path = path
+        self.header = {
+            "map": ["".join(row) for row in env.game.grid],
+            "map_name": env.game.map_name if isinstance(env.game.map_name, str) else None,
+            "seeker": seekers[0],
+        }
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            existing = TrajectoryReader(path).header
+            if (existing["map"], existing["seeker"]) != (self.header["map"],
+                                                         self.header["seeker"]):
+                raise ValueError(f"{path} is a log for another map or seeker policy.")
+            self.file = open(path, "ab")
+        else:
+            self.file = open(path, "wb")
+            header = json.dumps(self.header).encode()
+            self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        self.index = open(path + ".idx", "ab")
+
+    def write_episode(self, seed:int, start:tuple, actions:list) -> None:
+        """
+        Append an episode.
+
+        Parameters
+        ----------
+        seed : int
+            seed of the episode (HideAndSeekEnv.episode_seed)
+        start : tuple
+            (player x, player y, agent x, agent y) at the start of the episode
+        actions : list
+            actions of the agent (0 to 3)
+        """
+        offset = self.file.tell()
+        self.file.write(EPISODE_HEADER.pack(seed, *start, len(actions))
+                        + pack_actions(actions))
+        # the index is written after the episode: an index entry always points to
+        # a complete episode
+        self.file.flush()
+        self.index.write(OFFSET.pack(offset))
+        self.index.flush()
+
+    def close(self) -> None:
+        self.file.close()
+        self.index.close()
+
+
+class TrajectoryReader:
+    """
+    Random access to the episodes of a trajectory log.
+    """
+    def __init__(self, path:str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            data = f.read(len(MAGIC) + 4)
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a trajectory log.")
+            length, = struct.unpack("<I", data[len(MAGIC):])
+            self.header = json.loads(f.read(length))
+            self.data_start = len(MAGIC) + 4 + length
+        self.offsets = self._read_index()
+
+    def _read_index(self) -> np.ndarray:
+        """
+        Offsets of the episodes, from the index file if it covers the whole log,
+        else rebuilt by reading the episode headers.
+        """
+        size = os.path.getsize(self.path)
+        index_path = self.path + ".idx"
+        if os.path.exists(index_path):
+            offsets = np.fromfile(index_path, dtype="<u8")
+            if len(offsets) == 0 and size == self.data_start:
+                return offsets
+            if len(offsets) > 0 and self._episode_end(offsets[-1]) == size:
+                return offsets
+
+        offsets = []
+        with open(self.path, "rb") as f:
+            offset = self.data_start
+            while offset + EPISODE_HEADER.size <= size:
+                f.seek(offset)
+                *_, nb_actions = EPISODE_HEADER.unpack(f.read(EPISODE_HEADER.size))
+                end = offset + EPISODE_HEADER.size + -(-nb_actions // 4)
+                if end > size: # episode cut by an interrupted write
+                    break
+                offsets.append(offset)
+                offset = end
+        offsets = np.array(offsets, dtype="<u8")
+        offsets.tofile(index_path)
+        return offsets
+
+    def _episode_end(self, offset:int) -> int:
+        with open(self.path, "rb") as f:
+            f.seek(int(offset))
+            header = f.read(EPISODE_HEADER.size)
+        if len(header) < EPISODE_HEADER.size:
+            return -1
+        *_, nb_actions = EPISODE_HEADER.unpack(header)
+        return int(offset) + EPISODE_HEADER.size + -(-nb_actions // 4)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, i:int) -> dict:
+        """
+        Returns episode i: {"seed", "start", "actions"}.
+        """
+        with open(self.path, "rb") as f:
+            f.seek(int(self.offsets[i]))
+            seed, *start, nb_actions = EPISODE_HEADER.unpack(f.read(EPISODE_HEADER.size))
+            actions = unpack_actions(f.read(-(-nb_actions // 4)), nb_actions)
+        return {"seed": seed, "start": tuple(start), "actions": actions}
+
+    def make_env(self, **kwargs):
+        """
+        Returns a HideAndSeekEnv with the map and seeker policy of the log.
+        kwargs are given to HideAndSeekEnv (render_mode, fps, observation_type...).
+        """
+        from HideAndSeekEnv import HideAndSeekEnv
+        return HideAndSeekEnv(map_name=self.header["map"],
+                              seeker_policy=self.header["seeker"], **kwargs)
+
+
+def replay(reader:TrajectoryReader, i:int, env=None):
+    """
+    Play episode i of a log again, through HideAndSeekEnv.step (so through
+    Game.handle_action). Yields the reset then the step results, like the
+    original episode.
+
+    Parameters
+    ----------
+    reader : TrajectoryReader
+        the log
+    i : int
+        index of the episode
+    env : HideAndSeekEnv, optional
+        environment to play in, by default reader.make_env()
+    """
+    if env is None:
+        env = reader.make_env()
+    episode = reader[i]
+    yield env.reset(options={"start": episode["start"]})
+    for action in episode["actions"]:
+        yield env.step(int(action))
+
+
+class LogTrajectories(gym.Wrapper):
+    """
+    Write every episode of a HideAndSeekEnv to a trajectory log.
+    """
+    def __init__(self, env:gym.Env, writer:TrajectoryWriter) -> None:
+        super().__init__(env)
+        self.writer = writer
+        self.episode = None
+
+    def reset(self, **kwargs):
+        self._write_episode()
+        observation, info = self.env.reset(**kwargs)
+        game = self.env.unwrapped.game
+        self.episode = {
+            "seed": self.env.unwrapped.episode_seed,
+            "start": (game.player.x, game.player.y, game.agent.x, game.agent.y),
+            "actions": [],
+        }
+        return observation, info
+
+    def step(self, action):
+        result = self.env.step(action)
+        self.episode["actions"].append(int(action))
+        if result[2] or result[3]: # terminated or truncated
+            self._write_episode()
+        return result
+
+    def _write_episode(self) -> None:
+        # an episode without any action (reset twice in a row, as load.py does
+        # before its loop) is not written
+        if self.episode is not None and self.episode["actions"]:
+            self.writer.write_episode(**self.episode)
+        self.episode = None
+
+    def close(self) -> None:
+        self._write_episode()
+        self.writer.close()
+        super().close()
@@ -0,0 +1,145 @@
+"""
+Vectorized Hide and Seek environment for stable-baselines3.
+
+Steps n_envs games at once with a BatchedGame instead of one HideAndSeekEnv per
+game, and follows the VecEnv interface so it can be given directly to DQN:
+
+    env = VecHideAndSeekEnv(8, observation_type=LongViewObservation(5))
+    model = DQN("MlpPolicy", env)
+"""
+
+import time
+from typing import List
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+import Maps
+from BatchedGame import BatchedGame
+from ObservationType import ObservationType
+
+
+class VecHideAndSeekEnv(VecEnv):
+    """
+    n_envs games of Hide and Seek on the same map, with automatic reset of the
+    finished episodes (as every VecEnv).
+    """
+    def __init__(self, n_envs:int, map_name=Maps.DEFAULT_MAP,
+                 observation_type:ObservationType=None, seeker_policy="static",
+                 seed=None) -> None:
+        """
+        Initializes the environments.
+
+        Parameters
+        ----------
+        n_envs : int
+            number of games played in parallel
+        map_name : str, optional
+            The map to use, by default Maps.DEFAULT_MAP. "random" generates a
+            single random map for all the games.
+        observation_type : ObservationType, optional
+            The observation type to use. If None, LongViewObservation(5) is used.
+        seeker_policy : str or SeekerPolicy, optional
+            how the player moves, by default "static" (see SeekerPolicy.py)
+        seed : int, optional
+            seed of the random number generator, by default None
+        """
+        self.batch = BatchedGame(n_envs, map_name=map_name,
+                                 observation_type=observation_type,
+                                 seeker_policy=seeker_policy, seed=seed)
+        self.curriculum = None # see set_curriculum()
+        self.game = self.batch.game
+        self.render_mode = None
+
+        observation_space = self.batch.observation_type.get_observation_space(
+            self.batch.tables.GRID_W, self.batch.tables.GRID_H)
+        super().__init__(n_envs, observation_space, spaces.Discrete(4))
+
+        self.actions = np.zeros(n_envs, dtype=np.int64)
+        self.episode_returns = np.zeros(n_envs)
+        self.t_start = time.time()
+
+    def reset(self) -> np.ndarray:
+        self.batch.reset()
+        self.episode_returns[:] = 0
+        return self.batch.get_observations()
+
+    def step_async(self, actions:np.ndarray) -> None:
+        self.actions = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        rewards, terminated, truncated = self.batch.step(self.actions)
+        self.episode_returns += rewards
+        dones = terminated | truncated
+        observations = self.batch.get_observations()
+        infos = [{"distance": int(distance)} for distance in self.batch.get_distances()]
+
+        finished = np.nonzero(dones)[0]
+        for i in finished:
+            infos[i]["terminal_observation"] = observations[i].copy()
+            infos[i]["TimeLimit.truncated"] = bool(truncated[i])
+            # same as the info added by the Monitor wrapper
+            infos[i]["episode"] = {
+                "r": float(self.episode_returns[i]),
+                "l": int(self.batch.steps[i]),
+                "t": round(time.time() - self.t_start, 6),
+            }
+
+        if len(finished) > 0:
+            if self.curriculum is not None:
+                self.curriculum.update(self.batch.starts[finished], terminated[finished],
+                                       self.batch.steps[finished])
+            self.batch.reset(finished)
+            self.episode_returns[finished] = 0
+            observations[finished] = self.batch.get_observations()[finished]
+
+        # masks of the returned observations (the new episode for finished games)
+        for info, mask in zip(infos, self.batch.get_action_masks()):
+            info["action_mask"] = mask
+
+        return observations, rewards.astype(np.float32), dones, infos
+
+    def set_curriculum(self, curriculum) -> None:
+        """
+        Draw the starts of the next episodes with a StartCurriculum of the map
+        (built from self.batch.tables, see Curriculum.py), and tell it the
+        outcome of each episode.
+        """
+        self.curriculum = curriculum
+        self.batch.start_sampler = curriculum
+
+    def action_masks(self) -> np.ndarray:
+        """
+        Returns the valid actions of every game, one row of 4 booleans per game
+        (see GridTables.action_masks).
+        """
+        return self.batch.get_action_masks()
+
+    def seed(self, seed=None) -> List[int]:
+        self.batch.seed(seed)
+        return [seed] * self.num_envs
+
+    def close(self) -> None:
+        pass
+
+    def get_attr(self, attr_name:str, indices=None) -> list:
+        return [getattr(self, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(self, attr_name:str, value, indices=None) -> None:
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name:str, *method_args, indices=None, **method_kwargs) -> list:
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs)
+                for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return [False] * len(self._get_indices(indices))
+
+    def _get_indices(self, indices) -> list:
+        if indices is None:
+            return list(range(self.num_envs))
+        if isinstance(indices, int):
+            return [indices]
+        return list(indices)
@@ -0,0 +1,141 @@
+"""
+Hideability report of maps, to judge and filter maps before training on them
+(see MapAnalysis.py).
+
+For each map, report.json gives the cover of the cells, the expected optimal
+number of moves to hide over the start distribution and the number of starts
+from which the agent cannot hide at all, and heatmaps of the cover and of the
+moves to hide are written as images. A bank of random maps is analyzed in
+parallel worker processes; the maps passing the filters are written to
+selected_maps.json, with their rows, to be used as map_name or in Maps.py.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import cv2
+
+import Maps
+from Game import Game
+from GridTables import GridTables
+from MapAnalysis import analyze, heatmap_image
+
+
+def analyze_map(task:dict) -> dict:
+    """
+    Analyze the map of a task (a map of Maps.py, or a random map from its seed)
+    and write its heatmaps if asked.
+    """
+    if task["seed"] is None:
+        game = Game(map_name=task["name"])
+    else:
+        game = Game(map_name="random", map_size=task["map_size"], seed=task["seed"])
+    rows = ["".join(row) for row in game.grid]
+    # not GridTables.from_grid: its cache would keep the tables of every map
+    report, heatmaps = analyze(GridTables(rows))
+
+    if task["heatmaps"]:
+        for kind, values in heatmaps.items():
+            cv2.imwrite(os.path.join(task["output_dir"], f"{task['name']}_{kind}.png"),
+                        heatmap_image(values))
+    return {"name": task["name"], "seed": task["seed"], "rows": rows, **report}
+
+
+def is_selected(result:dict, args) -> bool:
+    """
+    True if the map passes the filters of the command line.
+    """
+    mean_steps = result["mean_steps_to_hide"]
+    return (result["nb_starts"] > 0
+            and result["unreachable_cover_fraction"] <= args.max_unreachable_fraction
+            and mean_steps is not None
+            and args.min_mean_steps <= mean_steps <= args.max_mean_steps)
+
+
+def analyze_maps() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--maps", type=str, nargs="*", default=list(Maps.MAPS.keys()),
+                        choices=list(Maps.MAPS.keys()), help=(
+        "Maps of Maps.py to analyze. Default: all of them.")
+        )
+    parser.add_argument("--nb_random_maps", type=int, default=0, help=(
+        "Number of random maps to analyze. Default: 0.")
+        )
+    parser.add_argument("--map_size", type=int, nargs=2, default=[12, 12], help=(
+        "Width and height of the random maps. Default: 12 12.")
+        )
+    parser.add_argument("--seed", type=int, default=0, help=(
+        "Seed of the first random map, the next ones use the next seeds. Default: 0.")
+        )
+    parser.add_argument("--random_heatmaps", action="store_true", help=(
+        "Also write the heatmaps of the random maps (always written for the maps"
+        + " of Maps.py).")
+        )
+    parser.add_argument("--max_unreachable_fraction", type=float, default=0.0, help=(
+        "Select the maps with at most this fraction of starts from which the agent"
+        + " cannot hide. Default: 0.")
+        )
+    parser.add_argument("--min_mean_steps", type=float, default=0.0, help=(
+        "Select the maps where hiding takes at least this mean number of moves."
+        + " Default: 0.")
+        )
+    parser.add_argument("--max_mean_steps", type=float, default=float("inf"), help=(
+        "Select the maps where hiding takes at most this mean number of moves."
+        + " Default: no limit.")
+        )
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help=(
+        "Number of worker processes. Default: the number of CPUs.")
+        )
+    parser.add_argument("--output_dir", type=str, default="analysis", help=(
+        "Folder of the report, the selected maps and the heatmaps. Default: analysis.")
+        )
+    args = parser.parse_args()
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    tasks = [{"name": name, "seed": None, "map_size": None, "heatmaps": True,
+              "output_dir": args.output_dir} for name in args.maps]
+    tasks += [{"name": f"random_{seed}", "seed": seed, "map_size": tuple(args.map_size),
+               "heatmaps": args.random_heatmaps, "output_dir": args.output_dir}
+              for seed in range(args.seed, args.seed + args.nb_random_maps)]
+
+    t_start = time.time()
+    results = []
+    with multiprocessing.Pool(max(1, min(args.workers, len(tasks)))) as pool:
+        for i, result in enumerate(pool.imap(analyze_map, tasks, chunksize=16)):
+            results.append(result)
+            print(f"\r{i + 1}/{len(tasks)} maps analyzed", end="")
+    print(f"\nAnalyzed in {time.time() - t_start:.1f}s")
+
+    selected = []
+    for result in results:
+        result["selected"] = is_selected(result, args)
+        if result["selected"]:
+            selected.append({"name": result["name"], "seed": result["seed"],
+                             "rows": result["rows"]})
+        # the rows of the maps of Maps.py and of the selected maps are enough
+        if result["seed"] is not None:
+            del result["rows"]
+
+    with open(os.path.join(args.output_dir, "report.json"), "w") as f:
+        json.dump({"map_size": args.map_size, "maps": results}, f, indent=1)
+    with open(os.path.join(args.output_dir, "selected_maps.json"), "w") as f:
+        json.dump(selected, f, indent=1)
+
+    for result in results:
+        if result["seed"] is None:
+            mean_steps = result["mean_steps_to_hide"]
+            mean_steps = "-" if mean_steps is None else f"{mean_steps:.2f}"
+            print(f"{result['name']}: mean steps to hide {mean_steps},"
+                  + f" cover {result['mean_cover']:.1%}, {result['unreachable_cover_starts']}"
+                  + " starts without reachable cover")
+    print(f"{len(selected)}/{len(results)} maps selected, report in"
+          + f" {os.path.join(args.output_dir, 'report.json')}")
+
+
+if __name__ == "__main__":
+    analyze_maps()
@@ -7,6 +7,7 @@ import os
 import subprocess
 
 import Maps
+from ModelRegistry import REGISTRY_FILE, ModelRegistry
 
 def batch_evaluate() -> None:
     """
@@ -26,20 +27,35 @@ def batch_evaluate() -> None:
 
     EVALUATION_MAP = args.map
 
-    # list all folders
-    all_models = glob.glob(os.path.join(args.model_folder, "*/"))
-
-    for model in all_models:
+    # The last checkpoint of each registered run comes from the registry. Folders
+    # written before the registry existed are listed and their checkpoints
+    # sorted by creation time.
+    last_models = []
+    registered = set()
+    if os.path.exists(os.path.join(args.model_folder, REGISTRY_FILE)):
+        registry = ModelRegistry(os.path.join(args.model_folder, REGISTRY_FILE))
+        for run in registry.runs():
+            registered.add(run["name"])
+            last_model = registry.latest_checkpoint(run["name"])
+            if last_model is None:
+                print(f"No checkpoint registered for {run['name']}, skipped.")
+                continue
+            last_models.append(last_model)
+
+    for model in glob.glob(os.path.join(args.model_folder, "*/")):
+        if os.path.basename(os.path.normpath(model)) in registered:
+            continue
         # Load the last trained model (last timestep saved, so the last .zip file)
         zip_files_list = glob.glob(os.path.join(model, "*.zip"))
         zip_files_list.sort(key=os.path.getctime, reverse=True)
 
         assert len(zip_files_list) > 0, f"No model  found in the {model} folder."
 
-        last_model = zip_files_list[0]
+        last_models.append(zip_files_list[0])
+
+    for last_model in last_models:
         subprocess.run(["python", "evaluate.py", last_model, "--map", EVALUATION_MAP])
         print("-------------------")
 
-
 if __name__ == "__main__":
     batch_evaluate()
\ No newline at end of file
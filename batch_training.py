@@ -16,6 +16,10 @@ def batch_training() -> None:
         f"statement, few_walls or random. Default: {Maps.DEFAULT_MAP}."
         + " Map to use for training.")
         )
+    parser.add_argument("--metrics_dir", type=str, default="metrics", help=(
+        "Folder of the metrics snapshots of the runs, to follow them with"
+        + " metrics_dashboard.py. Default: metrics.")
+        )
     args = parser.parse_args()
 
     TIMESTEPS = 500_000
@@ -57,7 +61,8 @@ def batch_training() -> None:
             ]
 
     for nb_models, arguments in enumerate(arguments_list):
-        subprocess.run(["python", "learn.py"] + arguments)
+        subprocess.run(["python", "learn.py"] + arguments
+                       + ["--metrics_dir", args.metrics_dir])
         print(f"------------------- ({nb_models + 1}/{len(arguments_list)} done)")
 
 
@@ -0,0 +1,106 @@
+"""
+Cost of stacking the last k observations, with the ring buffer of
+FrameHistory.py against stacking them again at every step:
+
+- stacking only: the same sequence of observations of VecHideAndSeekEnv is
+  stacked with a deque and np.concatenate, with np.roll into an array (as SB3
+  VecFrameStack), and with the ring buffer,
+- end to end: VecHideAndSeekEnv wrapped in SB3 VecFrameStack or in
+  VecFrameHistory, stepped with random actions.
+"""
+
+import argparse
+import time
+from collections import deque
+
+import numpy as np
+from stable_baselines3.common.vec_env import VecFrameStack
+
+from FrameHistory import VecFrameHistory, _RingBuffer
+from ObservationType import LongViewObservation
+from VecHideAndSeekEnv import VecHideAndSeekEnv
+
+
+def record_observations(n_envs:int, nb_steps:int) -> np.ndarray:
+    """
+    nb_steps observations of n_envs games with random actions.
+    """
+    env = VecHideAndSeekEnv(n_envs, observation_type=LongViewObservation(5), seed=0)
+    observations = [env.reset()]
+    actions = np.random.default_rng(0).integers(4, size=(nb_steps - 1, n_envs))
+    for step_actions in actions:
+        observations.append(env.step(step_actions)[0])
+    return np.stack(observations)
+
+
+def time_concatenate(observations:np.ndarray, k:int) -> float:
+    history = deque([observations[0]] * k, maxlen=k)
+    t_start = time.perf_counter()
+    for observation in observations:
+        history.appendleft(observation)
+        np.concatenate(history, axis=1)
+    return time.perf_counter() - t_start
+
+
+def time_roll(observations:np.ndarray, k:int) -> float:
+    size = observations.shape[2]
+    stacked = np.tile(observations[0], k)
+    t_start = time.perf_counter()
+    for observation in observations:
+        stacked = np.roll(stacked, shift=-size, axis=1)
+        stacked[:, -size:] = observation
+    return time.perf_counter() - t_start
+
+
+def time_ring_buffer(observations:np.ndarray, k:int) -> float:
+    history = _RingBuffer(observations.shape[1], k, observations.shape[2],
+                          observations.dtype)
+    history.push(observations[0], restarted=True)
+    t_start = time.perf_counter()
+    for observation in observations:
+        history.push(observation)
+        history.stacked()
+    return time.perf_counter() - t_start
+
+
+def steps_per_second(env, nb_steps:int) -> float:
+    env.reset()
+    actions = np.random.default_rng(0).integers(4, size=(nb_steps, env.num_envs))
+    t_start = time.perf_counter()
+    for step_actions in actions:
+        env.step(step_actions)
+    return env.num_envs * nb_steps / (time.perf_counter() - t_start)
+
+
+def benchmark() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_envs", type=int, default=64, help=(
+        "Number of games. Default: 64.")
+        )
+    parser.add_argument("--k", type=int, default=4, help=(
+        "Number of observations stacked. Default: 4.")
+        )
+    parser.add_argument("--nb_steps", type=int, default=10_000, help=(
+        "Vector steps timed. Default: 10 000.")
+        )
+    args = parser.parse_args()
+
+    observations = record_observations(args.n_envs, args.nb_steps)
+    print(f"Stacking {args.k} observations of {observations.shape[2]}"
+          + f" {observations.dtype} for {args.n_envs} games:")
+    for name, function in [("deque + np.concatenate", time_concatenate),
+                           ("np.roll", time_roll),
+                           ("ring buffer", time_ring_buffer)]:
+        elapsed = function(observations, args.k)
+        print(f"- {name:<24} {1e6 * elapsed / args.nb_steps:>8.2f} us per step")
+
+    print("End to end:")
+    for name, wrapper in [("VecFrameStack", VecFrameStack),
+                          ("VecFrameHistory", VecFrameHistory)]:
+        env = wrapper(VecHideAndSeekEnv(args.n_envs, observation_type=LongViewObservation(5),
+                                        seed=0), args.k)
+        print(f"- {name:<24} {steps_per_second(env, args.nb_steps):>10,.0f} steps/s")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,72 @@
+"""
+Latency of HideAndSeekEnv.step and HideAndSeekEnv.reset on random maps from
+12x12 to 1024x1024 cells. With a sight range, maps larger than
+Game.LARGE_MAP_CELLS cells are stored in chunks (see ChunkedGrid.py) and the
+cost of a step or a reset only depends on the sight range and the view size of
+the observation, so the latencies should stay flat as the map grows. Building
+the map itself (once per environment) is reported separately.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from HideAndSeekEnv import HideAndSeekEnv
+from ObservationType import LongViewObservation
+
+
+def latencies(size:int, sight_range:int, backend:str, nb_steps:int) -> tuple:
+    """
+    Returns (build time in s, mean reset time in us, mean step time in us).
+    """
+    t_start = time.perf_counter()
+    env = HideAndSeekEnv(map_name="random", map_size=(size, size),
+                         observation_type=LongViewObservation(5),
+                         sight_range=sight_range, backend=backend)
+    env.reset(seed=0)
+    build = time.perf_counter() - t_start
+
+    actions = np.random.default_rng(0).integers(4, size=nb_steps).tolist()
+    resets, steps = [], []
+    for action in actions:
+        t_start = time.perf_counter()
+        _, _, terminated, truncated, _ = env.step(action)
+        steps.append(time.perf_counter() - t_start)
+        if terminated or truncated:
+            t_start = time.perf_counter()
+            env.reset()
+            resets.append(time.perf_counter() - t_start)
+    env.close()
+    mean_reset = 1e6 * np.mean(resets) if resets else float("nan")
+    return build, mean_reset, 1e6 * np.mean(steps)
+
+
+def benchmark() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[12, 32, 128, 256, 512, 1024], help=(
+        "Width (and height) of the maps. Default: 12 32 128 256 512 1024.")
+        )
+    parser.add_argument("--sight_range", type=int, default=8, help=(
+        "Sight range of the player. Default: 8.")
+        )
+    parser.add_argument("--backend", type=str, default="python",
+                        choices=["python", "numba"], help=(
+        "Backend of the environment (see HideAndSeekEnv). Default: python.")
+        )
+    parser.add_argument("--nb_steps", type=int, default=20_000, help=(
+        "Steps timed per map. Default: 20 000.")
+        )
+    args = parser.parse_args()
+
+    print(f"sight range {args.sight_range}, backend {args.backend}")
+    print(f"{'map':>11} {'build (s)':>10} {'reset (us)':>11} {'step (us)':>10}")
+    for size in args.sizes:
+        build, reset, step = latencies(size, args.sight_range, args.backend,
+                                       args.nb_steps)
+        print(f"{f'{size}x{size}':>11} {build:>10.2f} {reset:>11.1f} {step:>10.1f}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,91 @@
+"""
+Steps per second of the vectorized environments: SharedMemoryVecEnv with 1 to
+all the CPUs as workers, against DummyVecEnv (all the games in the main
+process) and SubprocVecEnv (one process per game, data pickled through pipes).
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+import Maps
+from HideAndSeekEnv import HideAndSeekEnv
+from ObservationType import LongViewObservation
+from SharedMemoryVecEnv import SharedMemoryVecEnv
+
+
+def steps_per_second(env, nb_steps:int) -> float:
+    """
+    Games stepped per second (number of games * vector steps / time) with random
+    actions.
+    """
+    env.reset()
+    actions = np.random.default_rng(0).integers(4, size=(nb_steps, env.num_envs))
+    env.step(actions[0]) # warm up (workers started, kernels compiled)
+    t_start = time.perf_counter()
+    for step_actions in actions[1:]:
+        env.step(step_actions)
+    elapsed = time.perf_counter() - t_start
+    env.close()
+    return env.num_envs * (nb_steps - 1) / elapsed
+
+
+def worker_counts(max_workers:int) -> list:
+    """
+    1, 2, 4, ... up to max_workers (included).
+    """
+    counts = [1]
+    while counts[-1] * 2 < max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] < max_workers:
+        counts.append(max_workers)
+    return counts
+
+
+def benchmark() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_envs", type=int, default=64, help=(
+        "Number of games stepped at once. Default: 64.")
+        )
+    parser.add_argument("--nb_steps", type=int, default=2000, help=(
+        "Vector steps timed per environment. Default: 2000.")
+        )
+    parser.add_argument("--backend", type=str, default="python",
+                        choices=["python", "numba"], help=(
+        "Backend of the games (see HideAndSeekEnv). Default: python.")
+        )
+    parser.add_argument("--max_workers", type=int, default=os.cpu_count(), help=(
+        "Largest number of workers. Default: the number of CPUs.")
+        )
+    parser.add_argument("--subproc", action="store_true", help=(
+        "Also time SubprocVecEnv (starts n_envs processes).")
+        )
+    args = parser.parse_args()
+
+    observation_type = LongViewObservation(5)
+
+    def make_env():
+        return HideAndSeekEnv(map_name=Maps.DEFAULT_MAP, observation_type=observation_type,
+                              backend=args.backend)
+
+    print(f"{args.n_envs} games, backend {args.backend}, {os.cpu_count()} CPUs")
+    reference = steps_per_second(DummyVecEnv([make_env] * args.n_envs), args.nb_steps)
+    print(f"DummyVecEnv:                      {reference:>10,.0f} steps/s")
+    if args.subproc:
+        subproc = steps_per_second(SubprocVecEnv([make_env] * args.n_envs), args.nb_steps)
+        print(f"SubprocVecEnv ({args.n_envs} processes):"
+              + f"{subproc:>14,.0f} steps/s ({subproc / reference:.1f}x)")
+
+    for n_workers in worker_counts(args.max_workers):
+        env = SharedMemoryVecEnv(args.n_envs, n_workers=n_workers,
+                                 observation_type=observation_type, backend=args.backend)
+        speed = steps_per_second(env, args.nb_steps)
+        print(f"SharedMemoryVecEnv ({n_workers:>2} workers):  {speed:>10,.0f} steps/s"
+              + f" ({speed / reference:.1f}x)")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,132 @@
+"""
+Check that the "numba" backend of HideAndSeekEnv (GameKernel.py) plays exactly
+like the reference Game, and compare the speed of both backends.
+
+- visibility: GameKernel.can_see against Entity.can_see for every pair of cells
+  of each map,
+- episodes: the same random actions are played in an environment of each
+  backend, for every observation type and seeker policy, and the observations,
+  rewards, termination flags and infos are compared at every step.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import GameKernel
+from Entity import Entity
+from Game import Game
+from HideAndSeekEnv import HideAndSeekEnv
+from ObservationType import (BasicObservation,
+                             ImmediateSuroundingsObservation,
+                             LongViewObservation
+                            )
+from SeekerPolicy import SEEKER_POLICIES
+from Vector2 import Vector2
+
+OBSERVATION_TYPES = [
+    BasicObservation(),
+    ImmediateSuroundingsObservation(),
+    LongViewObservation(5),
+    LongViewObservation(3, packed=True),
+]
+
+
+def check_visibility(grid) -> int:
+    """
+    Returns the number of pairs of cells where GameKernel.can_see and
+    Entity.can_see differ.
+    """
+    walls = GameKernel.walls_of(grid)
+    cells = list(zip(*np.nonzero(~walls)))
+    errors = 0
+    for y0, x0 in cells:
+        source = Entity(Vector2(int(x0), int(y0)))
+        for y1, x1 in cells:
+            expected = source.can_see(Entity(Vector2(int(x1), int(y1))), grid)
+            errors += expected != GameKernel.can_see(walls, int(x0), int(y0),
+                                                     int(x1), int(y1))
+    return errors
+
+
+def check_episodes(grid, observation_type, seeker:str, nb_steps:int, seed:int) -> int:
+    """
+    Play nb_steps random actions in both backends and return the number of steps
+    where they differ.
+    """
+    envs = [HideAndSeekEnv(map_name=grid, observation_type=observation_type,
+                           seeker_policy=seeker, backend=backend)
+            for backend in ["python", "numba"]]
+    results = [env.reset(seed=seed) for env in envs]
+    rng = np.random.default_rng(seed)
+    errors = 0
+    for _ in range(nb_steps):
+        action = int(rng.integers(4))
+        results = [env.step(action) for env in envs]
+        (obs, *flags, info), (kernel_obs, *kernel_flags, kernel_info) = results
+        errors += not (obs.dtype == kernel_obs.dtype and np.array_equal(obs, kernel_obs)
+                       and flags == kernel_flags
+                       and info["distance"] == kernel_info["distance"]
+                       and np.array_equal(info["action_mask"], kernel_info["action_mask"]))
+        if flags[1] or flags[2]: # terminated or truncated
+            results = [env.reset() for env in envs]
+    return errors
+
+
+def steps_per_second(backend:str, observation_type, nb_steps:int) -> float:
+    env = HideAndSeekEnv(observation_type=observation_type, backend=backend)
+    env.reset(seed=0)
+    actions = np.random.default_rng(0).integers(4, size=nb_steps).tolist()
+    t_start = time.perf_counter()
+    for action in actions:
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            env.reset()
+    return nb_steps / (time.perf_counter() - t_start)
+
+
+def check_backends() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nb_steps", type=int, default=2000, help=(
+        "Steps compared per map, observation type and seeker. Default: 2000.")
+        )
+    parser.add_argument("--nb_random_maps", type=int, default=5, help=(
+        "Number of random maps checked besides the shipped maps. Default: 5.")
+        )
+    parser.add_argument("--benchmark_steps", type=int, default=50_000, help=(
+        "Steps timed per backend. Default: 50 000.")
+        )
+    args = parser.parse_args()
+
+    if not GameKernel.NUMBA_AVAILABLE:
+        print("Numba is not installed: checking the kernel as plain Python.")
+
+    maps = {"statement": Game(map_name="statement").grid,
+            "few_walls": Game(map_name="few_walls").grid}
+    for seed in range(args.nb_random_maps):
+        maps[f"random_{seed}"] = Game(map_name="random", seed=seed).grid
+
+    total_errors = 0
+    for name, grid in maps.items():
+        errors = check_visibility(grid)
+        for observation_type in OBSERVATION_TYPES:
+            for seeker in SEEKER_POLICIES:
+                errors += check_episodes(grid, observation_type, seeker, args.nb_steps,
+                                         seed=len(name))
+        print(f"{name}: {'OK' if errors == 0 else f'{errors} differences'}")
+        total_errors += errors
+
+    print()
+    for observation_type in [BasicObservation(), LongViewObservation(5)]:
+        python = steps_per_second("python", observation_type, args.benchmark_steps)
+        kernel = steps_per_second("numba", observation_type, args.benchmark_steps)
+        print(f"{observation_type}: python {python:,.0f} steps/s, numba {kernel:,.0f}"
+              + f" steps/s ({kernel / python:.1f}x)")
+
+    if total_errors > 0:
+        raise SystemExit(f"{total_errors} differences between the backends.")
+
+
+if __name__ == "__main__":
+    check_backends()
@@ -0,0 +1,81 @@
+"""
+Distill a trained DQN into a table of actions (see Policies.TabularPolicy).
+
+All the (player, agent) states of a map are enumerated, their observations are
+built at once (ObservationType.get_observation_batch) and the Q-network is run
+on them in a few big batches. For a MaskedDQN, each state gets the best of its
+valid actions (GridTables.action_masks), as the MaskedDQN never learns the
+Q-values of the other ones. The resulting uint8 table plays exactly like the
+DQN (or MaskedDQN) on this map, but without torch and with a lookup per move.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import torch as th
+
+import Maps
+from Game import Game
+from GridTables import GridTables
+from ModelRegistry import load_observation_type
+from Policies import TabularPolicy, load_policy
+
+
+def distill() -> None:
+    """
+    Distill a DQN model into a table of actions for one map.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model", type=str, help=(
+        "Model to distill. A saved .zip file from learn.py (DQN or MaskedDQN).")
+        )
+    parser.add_argument("--map", type=str, default=Maps.DEFAULT_MAP,
+                        choices=list(Maps.MAPS.keys()), help=(
+        f"statement or few_walls. Default: {Maps.DEFAULT_MAP}. Map of the table"
+        + " (it only plays on this map).")
+        )
+    parser.add_argument("--batch_size", type=int, default=65536, help=(
+        "Number of states given to the Q-network at once. Default: 65536.")
+        )
+    parser.add_argument("--output", type=str, default=None, help=(
+        "Output .npz file. Default: <model>_<map>_table.npz next to the model.")
+        )
+    args = parser.parse_args()
+
+    observation_type = load_observation_type(args.model)
+
+    game = Game(map_name=args.map)
+    tables = GridTables.from_grid(game.grid)
+    model = load_policy(args.model)
+    masked = getattr(model, "grid", None) is not None # MaskedDQN
+
+    t_start = time.time()
+    # every (player cell, agent cell) pair, including invalid ones (same cell),
+    # so that the table can be indexed directly
+    player, agent = np.divmod(np.arange(tables.nb_cells**2), tables.nb_cells)
+    actions = np.zeros(len(player), dtype=np.uint8)
+    for start in range(0, len(player), args.batch_size):
+        batch = slice(start, start + args.batch_size)
+        observations = observation_type.get_observation_batch(tables, player[batch],
+                                                              agent[batch])
+        observation_tensor, _ = model.policy.obs_to_tensor(observations)
+        with th.no_grad():
+            q_values = model.q_net(observation_tensor).cpu().numpy()
+        if masked:
+            q_values[~tables.action_masks(player[batch], agent[batch])] = -np.inf
+        actions[batch] = q_values.argmax(axis=1)
+
+    policy = TabularPolicy(game.grid, actions.reshape(tables.nb_cells, tables.nb_cells))
+    output = args.output
+    if output is None:
+        output = os.path.splitext(args.model)[0] + f"_{args.map}_table.npz"
+    policy.save(output)
+
+    print(f"Distilled {len(player)} states in {time.time() - t_start:.2f}s"
+          + f" ({policy.actions.nbytes} bytes) to {output}")
+
+
+if __name__ == "__main__":
+    distill()
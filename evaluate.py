@@ -1,10 +1,12 @@
-from stable_baselines3 import DQN
 from stable_baselines3.common.evaluation import evaluate_policy
 from stable_baselines3.common.monitor import Monitor
 
 from HideAndSeekEnv import HideAndSeekEnv
+from EpisodeRecorder import EpisodeRecorder, RecordEpisodes
+from SeekerPolicy import SEEKER_POLICIES
+from Policies import load_policy
+from ModelRegistry import ModelRegistry, load_observation_type, registry_of
 import argparse
-import pickle
 import os
 import Maps
 
@@ -15,7 +17,8 @@ def evaluate_agent() -> None:
 
     parser = argparse.ArgumentParser()
     parser.add_argument("model", type=str, help=(
-        "Model to load. A saved .zip file from learn.py.")
+        "Model to load. A saved .zip file from learn.py or a .npz policy"
+        + " (for instance from solve.py).")
         )
     parser.add_argument("--map", type=str, default=Maps.DEFAULT_MAP, help=(
         f"statement, few_walls or random. Default: {Maps.DEFAULT_MAP}."
@@ -24,35 +27,59 @@ def evaluate_agent() -> None:
     parser.add_argument("--nb_episodes", type=int, default=1000, help=(
         "Number of episodes to play. Default: 1000.")
         )
+    parser.add_argument("--seeker", type=str, default="static",
+                        choices=list(SEEKER_POLICIES.keys()), help=(
+        "How the player (seeker) moves during an episode. Default: static.")
+        )
+    parser.add_argument("--record_every", type=int, default=0, help=(
+        "Record one episode every X episodes to a video. Default: 0 (no recording).")
+        )
+    parser.add_argument("--record_dir", type=str, default=None, help=(
+        "Folder of the videos. Default: videos/<model name>.")
+        )
+    parser.add_argument("--record_format", type=str, default="mp4",
+                        choices=["mp4", "gif"], help=(
+        "Video format, gif needs Pillow. Default: mp4.")
+        )
+    parser.add_argument("--record_tile", type=int, default=0, help=(
+        "Show N*N recorded episodes side by side in each video. Default: 0 (one"
+        + " video per episode).")
+        )
     args = parser.parse_args()
 
 
     # Get infos from model
     # The observation type is needed to load the environment
-    model_directory = os.path.dirname(args.model)
-    print(model_directory)
-    observation_type = None
-    with open(os.path.join(model_directory, "observation_type.pkl"), "rb") as obs:
-        observation_type = pickle.load(obs)
+    print(os.path.dirname(args.model))
+    observation_type = load_observation_type(args.model)
 
 
-    eval_env =  Monitor(HideAndSeekEnv(render_mode="rgb_array",
-                                    observation_type=observation_type,
-                                    map_name=args.map,
-                                    )
-                )
-    eval_env.reset()
+    eval_env = HideAndSeekEnv(render_mode="rgb_array",
+                              observation_type=observation_type,
+                              map_name=args.map,
+                              seeker_policy=args.seeker,
+    )
+    if args.record_every > 0:
+        record_dir = args.record_dir
+        if record_dir is None:
+            record_dir = os.path.join("videos", os.path.basename(os.path.dirname(args.model)))
+        tile = (args.record_tile, args.record_tile) if args.record_tile > 0 else None
+        recorder = EpisodeRecorder(record_dir, video_format=args.record_format, tile=tile)
+        eval_env = RecordEpisodes(eval_env, recorder, every=args.record_every,
+                                  max_episodes=args.nb_episodes)
+    eval_env = Monitor(eval_env)
 
-    model = DQN.load(args.model, env=eval_env)
+    model = load_policy(args.model, env=eval_env)
 
 
 
 
     print(f"Evaluating model {args.model} on map {args.map} with {args.nb_episodes}"
           + " episodes.")
-    print(f"- Learning rate: {model.learning_rate}")
-    print(f"- Learning starts: {model.learning_starts}")
-    print(f"- Exploration: {model.exploration_final_eps}")
+    if hasattr(model, "learning_rate"):
+        print(f"- Learning rate: {model.learning_rate}")
+        print(f"- Learning starts: {model.learning_starts}")
+        print(f"- Exploration: {model.exploration_final_eps}")
 
     mean_reward, std_reward = evaluate_policy(
         model,
@@ -61,6 +88,14 @@ def evaluate_agent() -> None:
     )
 
     print(f"mean_reward:{mean_reward:.2f} +/- {std_reward:.2f}")
+    eval_env.close()
+
+    # Record the evaluation if the model is in the registry
+    if os.path.exists(registry_of(args.model)):
+        registry = ModelRegistry(registry_of(args.model))
+        if registry.run_of(args.model) is not None:
+            registry.add_evaluation(args.model, args.map, args.seeker, args.nb_episodes,
+                                    {"mean_reward": mean_reward, "std_reward": std_reward})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+"""
+Export the Q-network of a DQN checkpoint (from learn.py) to a .npz file played
+with NumPy only (see Policies.MlpQPolicy), and check that both give the same
+Q-values. The network of a MaskedDQN is exported with its map, so that it only
+plays valid actions, like the MaskedDQN.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from stable_baselines3 import DQN
+from stable_baselines3.common.torch_layers import FlattenExtractor
+from torch import nn
+
+from Game import Game
+from ModelRegistry import load_observation_type
+from Policies import MlpQPolicy, load_policy
+
+
+def export_q_network(model:DQN) -> MlpQPolicy:
+    """
+    Returns the NumPy version of the Q-network of a DQN with an MlpPolicy (with
+    the map of a MaskedDQN).
+    """
+    q_net = model.policy.q_net
+    if not isinstance(q_net.features_extractor, FlattenExtractor):
+        raise ValueError("Only the MlpPolicy (FlattenExtractor) can be exported.")
+
+    weights, biases, activations = [], [], []
+    for layer in q_net.q_net:
+        if isinstance(layer, nn.Linear):
+            weights.append(layer.weight.detach().cpu().numpy())
+            biases.append(layer.bias.detach().cpu().numpy())
+        else:
+            activations.append(layer.__class__.__name__)
+    return MlpQPolicy(weights, biases, activations, getattr(model, "grid", None))
+
+
+def export() -> None:
+    """
+    Export a DQN checkpoint and compare the exported network with it.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model", type=str, help=(
+        "Model to export. A saved .zip file from learn.py (DQN or MaskedDQN).")
+        )
+    parser.add_argument("--output", type=str, default=None, help=(
+        "Output .npz file. Default: <model>_mlp.npz next to the model.")
+        )
+    parser.add_argument("--nb_checks", type=int, default=10000, help=(
+        "Number of random observations used to compare both networks. Default: 10000.")
+        )
+    args = parser.parse_args()
+
+    model = load_policy(args.model)
+    policy = export_q_network(model)
+
+    output = args.output
+    if output is None:
+        output = os.path.splitext(args.model)[0] + "_mlp.npz"
+    policy.save(output)
+    print(f"Exported to {output}")
+
+    # Compare on observations of random games (on the map of a MaskedDQN)
+    observation_type = load_observation_type(args.model)
+    game = Game(map_name="random" if policy.grid is None else policy.grid)
+    observations = []
+    for _ in range(args.nb_checks):
+        game.init_game_start()
+        observations.append(observation_type.get_observation(game))
+    observations = np.array(observations)
+
+    obs_tensor, _ = model.policy.obs_to_tensor(observations)
+    torch_q_values = model.policy.q_net(obs_tensor).detach().cpu().numpy()
+    numpy_q_values = policy.q_values(observations)
+    torch_actions, _ = model.predict(observations, deterministic=True)
+    numpy_actions, _ = policy.predict(observations)
+    same_actions = (torch_actions == numpy_actions).mean()
+    print(f"Max Q-value difference: {np.abs(torch_q_values - numpy_q_values).max():.2e}")
+    print(f"Same action: {100*same_actions:.2f}%")
+
+    # Latency of a single prediction
+    for name, predictor in [("DQN", model), ("NumPy", policy)]:
+        t_start = time.perf_counter()
+        for observation in observations[:1000]:
+            predictor.predict(observation, deterministic=True)
+        latency = (time.perf_counter() - t_start) / min(1000, len(observations))
+        print(f"{name} predict: {1e6*latency:.1f} us per call")
+
+
+if __name__ == "__main__":
+    export()
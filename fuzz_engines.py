@@ -0,0 +1,345 @@
+"""
+Differential fuzzing of the fast engines against the reference game.
+
+Every optimized engine (the compiled kernel of the "numba" backend, the tables
+of BatchedGame, the chunked storage and cached visibility of large maps) must
+play exactly like Game.handle_action, Entity.can_see and the ObservationType
+classes, as played by HideAndSeekEnv with the "python" backend. This script
+generates random cases (map, observation type, seeker, sight range, start and
+actions), plays each one in the reference and in every engine supporting it in
+lockstep, and compares the observations, rewards, flags, distances and action
+masks at every step.
+
+On the first difference, the case is minimized (the actions, then the walls
+that are not needed to reproduce it are removed) and saved as a JSON
+reproducer, that --replay plays again step by step. Cases are played in
+parallel worker processes, millions of steps in a few minutes.
+
+An engine is added by registering a class in ENGINES with supports(case),
+reset(start) and step(action) (see the classes below).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+from BatchedGame import BatchedGame
+from ChunkedGrid import ChunkedGrid
+from GridTables import GridTables
+from HideAndSeekEnv import HideAndSeekEnv
+from ObservationType import observation_type_from_spec
+from SeekerPolicy import SEEKER_POLICIES
+import Maps
+
+OBSERVATION_SPECS = [
+    {"type": "BasicObservation"},
+    {"type": "ImmediateSuroundingsObservation"},
+    {"type": "LongViewObservation", "view_size": 3, "packed": False},
+    {"type": "LongViewObservation", "view_size": 5, "packed": False},
+    {"type": "LongViewObservation", "view_size": 4, "packed": True},
+]
+FIELDS = ["observation", "reward", "terminated", "truncated", "distance", "action_mask"]
+
+
+def _env_result(observation, reward, terminated, truncated, info) -> dict:
+    return {"observation": observation, "reward": float(reward),
+            "terminated": bool(terminated), "truncated": bool(truncated),
+            "distance": int(info["distance"]), "action_mask": info["action_mask"]}
+
+
+class EnvEngine:
+    """
+    HideAndSeekEnv, the reference with the "python" backend.
+    """
+    backend = "python"
+
+    @staticmethod
+    def supports(case:dict) -> bool:
+        return True
+
+    def __init__(self, case:dict) -> None:
+        self.env = HideAndSeekEnv(map_name=self._map(case),
+                                  observation_type=observation_type_from_spec(
+                                      case["observation"]),
+                                  seeker_policy=case["seeker"], backend=self.backend,
+                                  sight_range=case["sight_range"])
+
+    def _map(self, case:dict):
+        return case["map"]
+
+    def reset(self, start:list) -> dict:
+        observation, info = self.env.reset(options={"start": start})
+        return _env_result(observation, 0, False, False, info)
+
+    def step(self, action:int) -> dict:
+        return _env_result(*self.env.step(action))
+
+
+class NumbaEngine(EnvEngine):
+    """
+    HideAndSeekEnv with the compiled kernel of GameKernel.py.
+    """
+    backend = "numba"
+
+
+class ChunkedEngine(EnvEngine):
+    """
+    HideAndSeekEnv on a ChunkedGrid with small chunks, the storage and the
+    cached visibility of large maps. Large maps only have a static seeker.
+    """
+    @staticmethod
+    def supports(case:dict) -> bool:
+        return case["seeker"] == "static"
+
+    def _map(self, case:dict):
+        return ChunkedGrid.from_rows(case["map"], chunk_size=case["chunk_size"])
+
+
+class BatchedEngine:
+    """
+    A BatchedGame of one game, stepped with the tables of GridTables.py.
+    """
+    @staticmethod
+    def supports(case:dict) -> bool:
+        # GridTables.visibility has no sight range
+        return case["sight_range"] is None
+
+    def __init__(self, case:dict) -> None:
+        self.batch = BatchedGame(1, map_name=case["map"],
+                                 observation_type=observation_type_from_spec(
+                                     case["observation"]),
+                                 seeker_policy=case["seeker"])
+
+    def _result(self, reward, terminated, truncated) -> dict:
+        return {"observation": self.batch.get_observations()[0], "reward": float(reward),
+                "terminated": bool(terminated), "truncated": bool(truncated),
+                "distance": int(self.batch.get_distances()[0]),
+                "action_mask": self.batch.get_action_masks()[0]}
+
+    def reset(self, start:list) -> dict:
+        tables = self.batch.tables
+        player_x, player_y, agent_x, agent_y = start
+        self.batch.player[:] = tables.cell_index[player_y, player_x]
+        self.batch.agent[:] = tables.cell_index[agent_y, agent_x]
+        self.batch.steps[:] = 0
+        self.batch.seeker_policy.reset(tables, self.batch.player, self.batch.agent)
+        return self._result(0, False, False)
+
+    def step(self, action:int) -> dict:
+        rewards, terminated, truncated = self.batch.step(np.array([action]))
+        return self._result(rewards[0], terminated[0], truncated[0])
+
+
+ENGINES = {
+    "numba": NumbaEngine,
+    "chunked": ChunkedEngine,
+    "batched": BatchedEngine,
+}
+
+
+def generate_case(seed:int, nb_steps:int) -> dict:
+    """
+    Random case of a seed: a map of 3x3 to 16x16 cells with walls anywhere, an
+    observation type, a seeker, a sight range (none most of the time), a valid
+    start and random actions.
+    """
+    rng = random.Random(seed)
+    while True:
+        width, height = rng.randint(3, 16), rng.randint(3, 16)
+        density = rng.uniform(0.0, 0.5)
+        rows = ["".join(Maps.WALL if rng.random() < density else Maps.EMPTY
+                        for _ in range(width)) for _ in range(height)]
+        sight_range = rng.randint(1, 6) if rng.random() < 0.3 else None
+
+        tables = GridTables(rows)
+        starts = list(zip(tables.start_players, tables.start_agents))
+        if sight_range is not None:
+            starts = [(p, a) for p, a in starts
+                      if np.abs(tables.cells[p] - tables.cells[a]).max() <= sight_range]
+        if starts:
+            break
+    player, agent = starts[rng.randrange(len(starts))]
+    return {
+        "seed": seed,
+        "map": rows,
+        "observation": rng.choice(OBSERVATION_SPECS),
+        "seeker": rng.choice(list(SEEKER_POLICIES.keys())),
+        "sight_range": sight_range,
+        "chunk_size": rng.randint(2, 8),
+        "start": [int(v) for v in (*tables.cells[player], *tables.cells[agent])],
+        "actions": [rng.randrange(4) for _ in range(nb_steps)],
+    }
+
+
+def _difference(expected:dict, result:dict) -> str:
+    """
+    Name of the first field that differs between two step results, None if
+    they are the same.
+    """
+    for field in FIELDS:
+        a, b = expected[field], result[field]
+        if isinstance(a, np.ndarray):
+            if a.dtype != b.dtype or a.shape != b.shape or not np.array_equal(a, b):
+                return field
+        elif a != b:
+            return field
+    return None
+
+
+def find_divergence(case:dict, engine:str):
+    """
+    Play the case in the reference and in the engine, in lockstep.
+
+    Returns
+    -------
+    tuple or None
+        None if they agree at every step, else (step, field, expected, result),
+        step -1 for the reset.
+    """
+    reference, fast = EnvEngine(case), ENGINES[engine](case)
+    results = (reference.reset(case["start"]), fast.reset(case["start"]))
+    for step in range(-1, len(case["actions"])):
+        if step >= 0:
+            action = case["actions"][step]
+            results = (reference.step(action), fast.step(action))
+        field = _difference(*results)
+        if field is not None:
+            return step, field, results[0][field], results[1][field]
+    return None
+
+
+def minimize(case:dict, engine:str) -> dict:
+    """
+    Smaller case with a difference: the actions after the first difference are
+    dropped, then every action and every wall whose removal keeps a difference.
+    """
+    step = find_divergence(case, engine)[0]
+    case = {**case, "actions": case["actions"][:step + 1]}
+
+    i = 0
+    while i < len(case["actions"]):
+        candidate = {**case, "actions": case["actions"][:i] + case["actions"][i+1:]}
+        if find_divergence(candidate, engine) is not None:
+            case = candidate
+        else:
+            i += 1
+
+    for y, row in enumerate(case["map"]):
+        for x, cell in enumerate(row):
+            if cell != Maps.WALL:
+                continue
+            rows = list(case["map"])
+            rows[y] = rows[y][:x] + Maps.EMPTY + rows[y][x+1:]
+            candidate = {**case, "map": rows}
+            if find_divergence(candidate, engine) is not None:
+                case = candidate
+    return case
+
+
+def fuzz_case(task:dict) -> dict:
+    """
+    Play the case of a seed in every engine. Returns the number of steps played
+    and the minimized reproducers of the engines that differ.
+    """
+    case = generate_case(task["seed"], task["nb_steps"])
+    failures, nb_steps = [], 0
+    for engine in task["engines"]:
+        if not ENGINES[engine].supports(case):
+            continue
+        nb_steps += len(case["actions"])
+        if find_divergence(case, engine) is not None:
+            failures.append({"engine": engine, "case": minimize(case, engine)})
+    return {"nb_steps": nb_steps, "failures": failures}
+
+
+def replay(path:str) -> None:
+    """
+    Play a reproducer again, printing every step.
+    """
+    with open(path) as f:
+        failure = json.load(f)
+    case, engine = failure["case"], failure["engine"]
+    print(f"Engine {engine}, map:")
+    print("\n".join(case["map"]))
+    print(f"observation {case['observation']}, seeker {case['seeker']},"
+          + f" sight range {case['sight_range']}, start {case['start']}")
+    reference, fast = EnvEngine(case), ENGINES[engine](case)
+    results = (reference.reset(case["start"]), fast.reset(case["start"]))
+    for step in range(-1, len(case["actions"])):
+        if step >= 0:
+            action = case["actions"][step]
+            results = (reference.step(action), fast.step(action))
+        field = _difference(*results)
+        name = "reset" if step < 0 else f"step {step} (action {case['actions'][step]})"
+        if field is None:
+            print(f"{name}: same")
+        else:
+            print(f"{name}: {field} differs, reference {results[0][field]},"
+                  + f" {engine} {results[1][field]}")
+            break
+
+
+def fuzz_engines() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=10_000, help=(
+        "Number of random cases. Default: 10 000.")
+        )
+    parser.add_argument("--nb_steps", type=int, default=300, help=(
+        "Actions per case. Default: 300 (the length of an episode).")
+        )
+    parser.add_argument("--seed", type=int, default=0, help=(
+        "Seed of the first case, the next ones use the next seeds. Default: 0.")
+        )
+    parser.add_argument("--engines", type=str, nargs="+", default=list(ENGINES.keys()),
+                        choices=list(ENGINES.keys()), help=(
+        "Engines compared with the reference. Default: all of them.")
+        )
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help=(
+        "Number of worker processes. Default: the number of CPUs.")
+        )
+    parser.add_argument("--output_dir", type=str, default="fuzz_failures", help=(
+        "Folder of the reproducers. Default: fuzz_failures.")
+        )
+    parser.add_argument("--replay", type=str, default=None, help=(
+        "Play a reproducer again instead of fuzzing.")
+        )
+    args = parser.parse_args()
+
+    if args.replay is not None:
+        replay(args.replay)
+        return
+
+    tasks = [{"seed": seed, "nb_steps": args.nb_steps, "engines": args.engines}
+             for seed in range(args.seed, args.seed + args.cases)]
+    t_start = time.time()
+    nb_steps, nb_failures = 0, 0
+    with multiprocessing.Pool(max(1, args.workers)) as pool:
+        for i, result in enumerate(pool.imap_unordered(fuzz_case, tasks, chunksize=8)):
+            nb_steps += result["nb_steps"]
+            for failure in result["failures"]:
+                if not os.path.exists(args.output_dir):
+                    os.makedirs(args.output_dir)
+                path = os.path.join(args.output_dir,
+                                    f"{failure['engine']}_{failure['case']['seed']}.json")
+                with open(path, "w") as f:
+                    json.dump(failure, f, indent=1)
+                nb_failures += 1
+                print(f"\n{failure['engine']} differs on case {failure['case']['seed']},"
+                      + f" reproducer in {path}")
+            elapsed = time.time() - t_start
+            print(f"\r{i + 1}/{args.cases} cases, {nb_steps:,} steps"
+                  + f" ({nb_steps / elapsed:,.0f} steps/s)", end="")
+    print()
+
+    if nb_failures > 0:
+        raise SystemExit(f"{nb_failures} differences with the reference.")
+    print("No difference with the reference.")
+
+
+if __name__ == "__main__":
+    fuzz_engines()
@@ -6,8 +6,18 @@ try different models.
 """
 
 from stable_baselines3 import DQN
+from stable_baselines3.common.callbacks import CallbackList
+from MaskedDQN import MaskedDQN
 import os
 from HideAndSeekEnv import HideAndSeekEnv
+from VecHideAndSeekEnv import VecHideAndSeekEnv
+from SharedMemoryVecEnv import SharedMemoryVecEnv
+from SeekerPolicy import SEEKER_POLICIES
+from StateReplayBuffer import StateReplayBuffer
+from Curriculum import SCHEDULES, StartCurriculum
+from GridTables import GridTables
+from Callbacks import CheckpointCallback, MetricsCallback
+from ModelRegistry import ModelRegistry, save_observation_spec
 import time
 from ObservationType import (BasicObservation,
                              ImmediateSuroundingsObservation,
@@ -16,7 +26,6 @@ from ObservationType import (BasicObservation,
 
 import argparse
 import Maps
-import pickle
 
 def learn() -> None:
     """
@@ -36,6 +45,20 @@ def learn() -> None:
     parser.add_argument("--save_interval", type=int, default=1000, help=(
         "Save the model every X timesteps. Default: 1000.")
         )
+    parser.add_argument("--keep_last", type=int, default=0, help=(
+        "Number of most recent checkpoints kept on disk. Default: 0 (all of"
+        + " them, as needed by learning_curve.py).")
+        )
+    parser.add_argument("--keep_every", type=int, default=0, help=(
+        "Also keep one checkpoint every X timesteps. Default: 0 (none).")
+        )
+    parser.add_argument("--eval_interval", type=int, default=0, help=(
+        "Evaluate the model every X timesteps and keep the best checkpoint."
+        + " Default: 0 (no evaluation).")
+        )
+    parser.add_argument("--eval_episodes", type=int, default=100, help=(
+        "Number of episodes of each evaluation. Default: 100.")
+        )
     parser.add_argument("--map", type=str, default=Maps.DEFAULT_MAP, help=(
         f"statement, few_walls or random. Default: {Maps.DEFAULT_MAP}."
         + " Map to use for training.")
@@ -44,6 +67,10 @@ def learn() -> None:
         "View size for LongViewObservation. Used if observation is LongViewObservation."
         + " Ignored otherwise. Default is 5.")
         )
+    parser.add_argument("--packed", action="store_true", help=(
+        "Pack the wall bits of LongViewObservation into bytes. Used if observation"
+        + " is LongViewObservation. Ignored otherwise.")
+        )
     parser.add_argument("--learning_rate", type=float, default=0.001, help=(
         "Learning rate. Default: 0.001.")
         )
@@ -59,16 +86,67 @@ def learn() -> None:
     parser.add_argument("--progress_bar", action="store_true", help=(
                         "Display a progress bar during training.")
     )
+    parser.add_argument("--seeker", type=str, default="static",
+                        choices=list(SEEKER_POLICIES.keys()), help=(
+        "How the player (seeker) moves during an episode. Default: static"
+        + " (the player does not move).")
+        )
+    parser.add_argument("--n_envs", type=int, default=1, help=(
+        "Number of games played in parallel. If greater than 1, a vectorized"
+        + " environment is used. Default: 1.")
+        )
+    parser.add_argument("--workers", type=int, default=0, help=(
+        "Number of worker processes stepping the n_envs games, through shared"
+        + " memory (see SharedMemoryVecEnv.py). Default: 0 (games stepped in the"
+        + " main process).")
+        )
+    parser.add_argument("--buffer_size", type=int, default=1_000_000, help=(
+        "Size of the replay buffer. Default: 1 000 000.")
+        )
+    parser.add_argument("--compact_buffer", action="store_true", help=(
+        "Store the (player, agent) cells of each state in the replay buffer instead"
+        + " of the observations, rebuilding observations when sampling. Uses a"
+        + " fraction of the memory.")
+        )
+    parser.add_argument("--masked", action="store_true", help=(
+        "Train a MaskedDQN: only explore and bootstrap on the actions that move"
+        + " the agent (see MaskedDQN.py).")
+        )
+    parser.add_argument("--curriculum", type=str, default=None, choices=SCHEDULES,
+                        help=(
+        "Draw the starts of the episodes by difficulty (see Curriculum.py):"
+        + " uniform, linear (easy starts first) or adaptive (starts the agent"
+        + " fails on). Default: None (uniform starts, as the game).")
+        )
+    parser.add_argument("--curriculum_timesteps", type=int, default=200_000, help=(
+        "Timesteps after which the linear curriculum draws every start."
+        + " Default: 200 000.")
+        )
+    parser.add_argument("--metrics_dir", type=str, default="metrics", help=(
+        "Folder of the JSON snapshot of the training metrics of the run, read by"
+        + " metrics_dashboard.py (see Metrics.py). Default: metrics.")
+        )
+    parser.add_argument("--metrics_interval", type=float, default=10.0, help=(
+        "Seconds between two snapshots of the metrics. Default: 10.")
+        )
+    parser.add_argument("--metrics_port", type=int, default=None, help=(
+        "Also serve the metrics over HTTP on this port of localhost, 0 for any"
+        + " free port. Default: None (no server).")
+        )
     args = parser.parse_args()
 
     assert args.save_interval > 0, "save_interval must be positive."
+    assert args.keep_last >= 0, "keep_last must be positive or 0."
+    assert args.curriculum is None or args.workers == 0, (
+        "The curriculum is not supported with worker processes.")
 
 
-    selected_model = "DQN" # fixed, the only one useful in our case
+    # DQN is the only algorithm useful in our case, with or without action masks
+    selected_model = "MaskedDQN" if args.masked else "DQN"
     observation_type = {
         "BasicObservation": BasicObservation(),
         "ImmediateSuroundingsObservation": ImmediateSuroundingsObservation(),
-        "LongViewObservation": LongViewObservation(args.view_size),
+        "LongViewObservation": LongViewObservation(args.view_size, args.packed),
     }[args.observation]
 
     timer_id = int(time.time())
@@ -91,34 +169,102 @@ def learn() -> None:
         f.write(f"Map trained on: {args.map}\n")
         f.write(f"Number of timesteps: {args.timesteps}\n")
         f.write(f"Save interval: {args.save_interval}\n")
+        f.write(f"Keep last: {args.keep_last}\n")
+        f.write(f"Keep every: {args.keep_every}\n")
+        f.write(f"Evaluation interval: {args.eval_interval}\n")
         f.write(f"Learning rate: {args.learning_rate}\n")
         f.write(f"Learning starts: {args.learning_starts}\n")
         f.write(f"Exploration: {args.exploration}\n")
         f.write(f"Log interval: {args.log_interval}\n")
         f.write(f"Progress bar: {args.progress_bar}\n")
+        f.write(f"Seeker: {args.seeker}\n")
+        f.write(f"Number of envs: {args.n_envs}\n")
+        f.write(f"Workers: {args.workers}\n")
+        f.write(f"Buffer size: {args.buffer_size}\n")
+        f.write(f"Compact buffer: {args.compact_buffer}\n")
+        f.write(f"Masked: {args.masked}\n")
+        f.write(f"Curriculum: {args.curriculum}\n")
+        f.write(f"Metrics: {args.metrics_dir}/{model_name}.json\n")
         
   
-    # Save the observation type class in a file
-    with open(f"{models_dir}/observation_type.pkl", "wb") as f:
-        pickle.dump(observation_type, f, pickle.HIGHEST_PROTOCOL)
+    # Register the run, with the observation type needed to load the environment
+    registry = ModelRegistry()
+    registry.register_run(model_name, models_dir, observation_type, args.map,
+                          seeker=args.seeker, algorithm=selected_model,
+                          hyperparameters=vars(args))
+    save_observation_spec(models_dir, observation_type)
 
     # create environment in "rgb_array" mode to not have a display
-    env = HideAndSeekEnv(render_mode="rgb_array",
-                         observation_type=observation_type,
-                         map_name=args.map
-    )
+    if args.workers > 0:
+        env = SharedMemoryVecEnv(args.n_envs, n_workers=args.workers,
+                                 observation_type=observation_type,
+                                 map_name=args.map,
+                                 seeker_policy=args.seeker,
+        )
+    elif args.n_envs > 1:
+        env = VecHideAndSeekEnv(args.n_envs,
+                                observation_type=observation_type,
+                                map_name=args.map,
+                                seeker_policy=args.seeker,
+        )
+    else:
+        env = HideAndSeekEnv(render_mode="rgb_array",
+                             observation_type=observation_type,
+                             map_name=args.map,
+                             seeker_policy=args.seeker,
+        )
+    if args.curriculum is not None:
+        tables = env.batch.tables if args.n_envs > 1 else GridTables.from_grid(env.game.grid)
+        env.set_curriculum(StartCurriculum(tables, schedule=args.curriculum,
+                                           schedule_timesteps=args.curriculum_timesteps))
     env.reset()
 
+    replay_buffer_class, replay_buffer_kwargs = None, None
+    if args.compact_buffer:
+        replay_buffer_class = StateReplayBuffer
+        replay_buffer_kwargs = dict(grid=env.game.grid,
+                                    observation_type=observation_type)
 
-    model = DQN("MlpPolicy", env, verbose=0, tensorboard_log=log_dir,
-                learning_rate=args.learning_rate,
-                learning_starts=args.learning_starts,
-                exploration_final_eps=args.exploration,
+    algorithm = MaskedDQN if args.masked else DQN
+    model = algorithm("MlpPolicy", env, verbose=0, tensorboard_log=log_dir,
+                      learning_rate=args.learning_rate,
+                      learning_starts=args.learning_starts,
+                      exploration_final_eps=args.exploration,
+                      buffer_size=args.buffer_size,
+                      replay_buffer_class=replay_buffer_class,
+                      replay_buffer_kwargs=replay_buffer_kwargs,
     )
 
-    # We train the agent gradually and save the model every args.save_interval
-    # timestep. We train the agent for args.timesteps timesteps in total.
-    nb_timesteps = args.timesteps // args.save_interval
+    # Checkpoints are written in the background during a single learn() call,
+    # only some of them are kept (see Callbacks.py)
+    eval_env = None
+    if args.eval_interval > 0:
+        # on the map of training (with --map random, a new map would be drawn)
+        eval_env = VecHideAndSeekEnv(min(args.eval_episodes, 10),
+                                     observation_type=observation_type,
+                                     map_name=["".join(row) for row in env.game.grid],
+                                     seeker_policy=args.seeker,
+        )
+    checkpoint_callback = CheckpointCallback(models_dir, args.save_interval,
+                                             keep_last=args.keep_last,
+                                             keep_every=args.keep_every,
+                                             eval_env=eval_env,
+                                             eval_interval=args.eval_interval,
+                                             nb_eval_episodes=args.eval_episodes,
+                                             registry=registry,
+                                             run_name=model_name,
+                                             verbose=0 if args.progress_bar else 1,
+    )
+    # Streaming metrics of the episodes, to follow many runs at once
+    metrics_callback = MetricsCallback(model_name,
+                                       os.path.join(args.metrics_dir, f"{model_name}.json"),
+                                       interval=args.metrics_interval,
+                                       port=args.metrics_port,
+                                       info={"map": args.map,
+                                             "observation": str(observation_type),
+                                             "seeker": args.seeker},
+                                       verbose=1,
+    )
 
     print(f"Training {model_name} with parameters:")
     print(f"- Observation type: {str(observation_type)}")
@@ -126,19 +272,16 @@ def learn() -> None:
     print(f"- Learning rate: {args.learning_rate}")
     print(f"- Learning starts: {args.learning_starts}")
     print(f"- Exploration: {args.exploration}")
+    print(f"- Seeker: {args.seeker}")
+    print(f"- Curriculum: {args.curriculum}")
 
-    for i in range(nb_timesteps):
-        model.learn(
-            total_timesteps=args.save_interval,
-            reset_num_timesteps=False,
-            tb_log_name=model_name,
-            progress_bar=args.progress_bar,
-            log_interval=args.log_interval,
-        )
-        if not args.progress_bar:
-            print(f"\rTimestep {args.save_interval*(i+1)}/{args.timesteps}", end="")
-        model.save(f"{models_dir}/{args.save_interval*(i+1)}")
-
+    model.learn(
+        total_timesteps=args.timesteps,
+        tb_log_name=model_name,
+        callback=CallbackList([checkpoint_callback, metrics_callback]),
+        progress_bar=args.progress_bar,
+        log_interval=args.log_interval,
+    )
     print()
 
     env.close()
@@ -0,0 +1,189 @@
+"""
+Evaluate every checkpoint of a training run and write its learning curve.
+
+Checkpoints are evaluated in parallel worker processes, each one importing
+stable-baselines3 and building its games once. Every result is appended to
+learning_curve.jsonl in the run folder as soon as it is known, so an interrupted
+evaluation can be resumed and a rerun only evaluates the new checkpoints.
+The curve (mean reward, hide rate, steps to hide) is written to
+learning_curve.csv and to TensorBoard (logs/<run name>_curve), and the
+evaluations are recorded in the model registry if the run is in it.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+import Maps
+from Game import Game
+from ModelRegistry import ModelRegistry, load_observation_type, registry_of
+from SeekerPolicy import SEEKER_POLICIES
+
+INDEX = "learning_curve.jsonl"
+CSV = "learning_curve.csv"
+FIELDS = ["timesteps", "mean_reward", "std_reward", "hide_rate", "steps_to_hide",
+          "mean_length"]
+
+# state of a worker process, built once by init_worker
+_worker = {}
+
+
+def init_worker(observation_type, map_name, seeker:str, n_games:int) -> None:
+    import torch
+    from BatchedGame import BatchedGame
+
+    # one thread per worker, the workers already use all the cores
+    torch.set_num_threads(1)
+    _worker["batch"] = BatchedGame(n_games, map_name=map_name,
+                                   observation_type=observation_type,
+                                   seeker_policy=seeker)
+
+
+def evaluate_checkpoint(task:dict) -> dict:
+    from Evaluation import evaluate_batched
+    from Policies import load_policy
+
+    policy = load_policy(task["checkpoint"], env=None)
+    results = evaluate_batched(policy, _worker["batch"], task["nb_episodes"],
+                               seed=task["seed"])
+    return {**task, **results}
+
+
+def list_checkpoints(run_dir:str) -> list:
+    """
+    Checkpoints of a run (<timesteps>.zip files), sorted by timesteps.
+    """
+    checkpoints = []
+    for path in glob.glob(os.path.join(run_dir, "*.zip")):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name.isdigit():
+            checkpoints.append((int(name), path))
+    return sorted(checkpoints)
+
+
+def read_index(path:str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_curve(run_dir:str, results:list, log_dir:str) -> None:
+    """
+    Write the curve to CSV and TensorBoard, one point per checkpoint.
+    """
+    results = sorted(results, key=lambda result: result["timesteps"])
+    with open(os.path.join(run_dir, CSV), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+    from torch.utils.tensorboard import SummaryWriter
+
+    # written again from scratch, TensorBoard would show the old points twice
+    if os.path.exists(log_dir):
+        shutil.rmtree(log_dir)
+    with SummaryWriter(log_dir) as writer:
+        for result in results:
+            for field in FIELDS[1:]:
+                writer.add_scalar(f"curve/{field}", result[field], result["timesteps"])
+
+
+def learning_curve() -> None:
+    """
+    Evaluate the new checkpoints of a run and write its learning curve.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("run", type=str, help=(
+        "Folder of the run (models/<model_name>).")
+        )
+    parser.add_argument("--map", type=str, default=Maps.DEFAULT_MAP, help=(
+        f"statement, few_walls or random. Default: {Maps.DEFAULT_MAP}."
+        + " Map to use for evaluation. A random map is drawn from --seed, the"
+        + " same for every checkpoint.")
+        )
+    parser.add_argument("--seeker", type=str, default="static",
+                        choices=list(SEEKER_POLICIES.keys()), help=(
+        "How the player (seeker) moves during an episode. Default: static.")
+        )
+    parser.add_argument("--nb_episodes", type=int, default=1000, help=(
+        "Number of episodes per checkpoint. Default: 1000.")
+        )
+    parser.add_argument("--seed", type=int, default=0, help=(
+        "Seed of the games, the same for every checkpoint. Default: 0.")
+        )
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help=(
+        "Number of worker processes. Default: number of CPUs.")
+        )
+    parser.add_argument("--n_games", type=int, default=100, help=(
+        "Number of games played at once by a worker. Default: 100.")
+        )
+    args = parser.parse_args()
+
+    run_dir = os.path.normpath(args.run)
+    observation_type = load_observation_type(run_dir)
+    registry = None
+    if os.path.exists(registry_of(run_dir)):
+        registry = ModelRegistry(registry_of(run_dir))
+        if registry.get_run(os.path.basename(run_dir)) is None:
+            registry = None
+
+    # a result is reused if it is for the same file and the same evaluation
+    index_path = os.path.join(run_dir, INDEX)
+    settings = {"map": args.map, "seeker": args.seeker,
+                "nb_episodes": args.nb_episodes, "seed": args.seed}
+    done = {}
+    for result in read_index(index_path):
+        if all(result[key] == value for key, value in settings.items()):
+            done[result["checkpoint"]] = result
+
+    tasks = []
+    for timesteps, path in list_checkpoints(run_dir):
+        previous = done.get(os.path.basename(path))
+        if previous is not None and previous["mtime"] == os.path.getmtime(path):
+            continue
+        tasks.append({"checkpoint": path, "timesteps": timesteps,
+                      "mtime": os.path.getmtime(path), **settings})
+
+    # drawn once here, otherwise each worker would evaluate on its own map
+    map_name = args.map
+    if map_name == "random":
+        map_name = Game(map_name="random", seed=args.seed).grid
+
+    print(f"{len(done)} checkpoints already evaluated, {len(tasks)} to evaluate")
+    t_start = time.time()
+    if tasks:
+        with multiprocessing.Pool(min(args.workers, len(tasks)), initializer=init_worker,
+                                  initargs=(observation_type, map_name, args.seeker,
+                                            args.n_games)) as pool, \
+             open(index_path, "a") as index:
+            for i, result in enumerate(pool.imap_unordered(evaluate_checkpoint, tasks)):
+                result["checkpoint"] = os.path.basename(result["checkpoint"])
+                index.write(json.dumps(result) + "\n")
+                index.flush()
+                done[result["checkpoint"]] = result
+                if registry is not None:
+                    registry.add_evaluation(os.path.join(run_dir, result["checkpoint"]),
+                                            args.map, args.seeker, args.nb_episodes,
+                                            result)
+                print(f"\r{i + 1}/{len(tasks)} checkpoints evaluated", end="")
+        print(f"\nEvaluated in {time.time() - t_start:.1f}s")
+
+    results = list(done.values())
+    log_dir = os.path.join("logs", os.path.basename(run_dir) + "_curve")
+    write_curve(run_dir, results, log_dir)
+    print(f"Learning curve written to {os.path.join(run_dir, CSV)} and {log_dir}")
+
+    if results:
+        best = max(results, key=lambda result: result["mean_reward"])
+        print(f"Best checkpoint: {best['checkpoint']} (mean reward"
+              + f" {best['mean_reward']:.2f}, hide rate {best['hide_rate']:.1%})")
+
+
+if __name__ == "__main__":
+    learning_curve()
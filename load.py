@@ -1,19 +1,21 @@
-from stable_baselines3 import DQN
-
 from HideAndSeekEnv import HideAndSeekEnv
+from SeekerPolicy import SEEKER_POLICIES
+from Policies import load_policy
+from ModelRegistry import load_observation_type
+from TrajectoryLog import LogTrajectories, TrajectoryReader, TrajectoryWriter, replay
 
 import argparse
 import Maps
 import os
-import pickle
 
 def load_agent() -> None:
     """
     Load a trained RL agent and play the game of Hide and Seek multiple times. 
     """
     parser = argparse.ArgumentParser()
-    parser.add_argument("model", type=str, help=(
-        "Model to load. A saved .zip file from learn.py.")
+    parser.add_argument("model", type=str, nargs="?", default=None, help=(
+        "Model to load. A saved .zip file from learn.py or a .npz policy"
+        + " (for instance from solve.py). Not needed with --replay.")
         )
     parser.add_argument("--map", type=str, default=Maps.DEFAULT_MAP, help=(
         f"statement, few_walls or random. Default: {Maps.DEFAULT_MAP}."
@@ -22,27 +24,49 @@ def load_agent() -> None:
     parser.add_argument("--fps", type=int, default=5, help=(
         "Replay speed (frames per second). Default: 5.")
         )
+    parser.add_argument("--display_fps", type=int, default=None, help=(
+        "Maximum refresh rate of the window. Default: same as fps. Use a lower"
+        + " value than fps (or --fps 0, no limit) to play faster than the display.")
+        )
     parser.add_argument("--nb_episodes", type=int, default=20, help=(
         "Number of episodes to play. Default: 20.")
         )
+    parser.add_argument("--seeker", type=str, default="static",
+                        choices=list(SEEKER_POLICIES.keys()), help=(
+        "How the player (seeker) moves during an episode. Default: static.")
+        )
+    parser.add_argument("--log", type=str, default=None, help=(
+        "Append the played episodes to this trajectory log (see TrajectoryLog.py).")
+        )
+    parser.add_argument("--replay", type=str, default=None, help=(
+        "Play again the episodes of this trajectory log instead of a model.")
+        )
+    parser.add_argument("--first_episode", type=int, default=0, help=(
+        "Index of the first episode played with --replay. Default: 0.")
+        )
     args = parser.parse_args()
 
+    if args.replay is not None:
+        replay_episodes(args)
+        return
+    assert args.model is not None, "A model is needed, or a log to --replay."
+
     # Get infos from model
     # The observation type is needed to load the environment
-    model_directory = os.path.dirname(args.model)
-    print(model_directory)
-    observation_type = None
-    with open(os.path.join(model_directory, "observation_type.pkl"), "rb") as obs:
-        observation_type = pickle.load(obs)
+    print(os.path.dirname(args.model))
+    observation_type = load_observation_type(args.model)
 
 
-    env = HideAndSeekEnv(render_mode="human", fps=args.fps,
+    env = HideAndSeekEnv(render_mode="human", fps=args.fps, display_fps=args.display_fps,
                         observation_type=observation_type,
-                        map_name=args.map
+                        map_name=args.map,
+                        seeker_policy=args.seeker,
     )
+    if args.log is not None:
+        env = LogTrajectories(env, TrajectoryWriter(args.log, env))
     env.reset()
 
-    model = DQN.load(args.model, env=env)
+    model = load_policy(args.model, env=env)
 
     # Run several episodes of the environment with the trained agent
     for ep in range(args.nb_episodes):
@@ -60,5 +84,20 @@ def load_agent() -> None:
 
     env.close()
 
+
+def replay_episodes(args) -> None:
+    """
+    Show episodes of a trajectory log, played again from their start positions
+    and actions.
+    """
+    reader = TrajectoryReader(args.replay)
+    env = reader.make_env(render_mode="human", fps=args.fps, display_fps=args.display_fps)
+    last_episode = min(args.first_episode + args.nb_episodes, len(reader))
+    for i in range(args.first_episode, last_episode):
+        print("Episode: ", i)
+        steps = list(replay(reader, i, env))[1:]
+        print("reward: ", sum(reward for _, reward, *_ in steps))
+    env.close()
+
 if __name__ == "__main__":
     load_agent()
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Simulate many game clients playing through policy_server.py.
+
+Each client plays its own HideAndSeekEnv and asks the server for the action of
+every step. Prints the throughput and the latency seen by the clients, then the
+statistics of the server.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+import Maps
+from HideAndSeekEnv import HideAndSeekEnv
+from ModelRegistry import load_observation_type
+
+
+async def open_connection(args):
+    if args.unix_socket is not None:
+        return await asyncio.open_unix_connection(args.unix_socket)
+    return await asyncio.open_connection("127.0.0.1", args.port)
+
+
+async def client(client_id:int, args, observation_type, latencies:list) -> int:
+    """
+    Play games for args.duration seconds, returns the number of steps played.
+    """
+    reader, writer = await open_connection(args)
+    env = HideAndSeekEnv(observation_type=observation_type, map_name=args.map)
+    obs, _ = env.reset()
+    steps = 0
+    t_end = time.perf_counter() + args.duration
+    while time.perf_counter() < t_end:
+        request = {"id": steps, "model": args.model_name, "observation": obs.tolist()}
+        t_start = time.perf_counter()
+        writer.write((json.dumps(request) + "\n").encode())
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - t_start)
+        if "error" in response:
+            raise RuntimeError(f"Client {client_id}: {response['error']}")
+
+        obs, _, terminated, truncated, _ = env.step(response["action"])
+        steps += 1
+        if terminated or truncated:
+            obs, _ = env.reset()
+
+    writer.close()
+    return steps
+
+
+async def generate_load(args, observation_type) -> None:
+    latencies = []
+    t_start = time.perf_counter()
+    steps = await asyncio.gather(*[client(i, args, observation_type, latencies)
+                                   for i in range(args.nb_clients)])
+    elapsed = time.perf_counter() - t_start
+
+    latencies = 1000 * np.array(latencies)
+    print(f"{args.nb_clients} clients, {sum(steps)} steps in {elapsed:.1f}s"
+          + f" ({sum(steps)/elapsed:.0f} steps/s)")
+    print("Client latency: " + ", ".join(
+        f"p{p} {np.percentile(latencies, p):.2f} ms" for p in [50, 90, 99]))
+
+    reader, writer = await open_connection(args)
+    writer.write(b'{"stats": true}\n')
+    print(f"Server: {json.loads(await reader.readline())}")
+    writer.close()
+
+
+def load_generator() -> None:
+    """
+    Run the simulated clients.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model", type=str, help=(
+        "Model the server was started with (name=path or path), to know its"
+        + " observation type.")
+        )
+    parser.add_argument("--nb_clients", type=int, default=64, help=(
+        "Number of simulated clients. Default: 64.")
+        )
+    parser.add_argument("--duration", type=float, default=10.0, help=(
+        "Duration of the simulation in seconds. Default: 10.")
+        )
+    parser.add_argument("--map", type=str, default=Maps.DEFAULT_MAP, help=(
+        f"statement, few_walls or random. Default: {Maps.DEFAULT_MAP}.")
+        )
+    parser.add_argument("--port", type=int, default=5555, help=(
+        "TCP port of the server. Default: 5555.")
+        )
+    parser.add_argument("--unix_socket", type=str, default=None, help=(
+        "Unix socket of the server, instead of TCP.")
+        )
+    args = parser.parse_args()
+
+    args.model_name, path = (args.model.split("=", 1) if "=" in args.model
+                             else (args.model, args.model))
+    observation_type = load_observation_type(path)
+
+    asyncio.run(generate_load(args, observation_type))
+
+
+if __name__ == "__main__":
+    load_generator()
@@ -0,0 +1,184 @@
+"""
+Generate a dataset of transitions (see EpisodeDataset.py) by playing a policy in
+many games at once with a BatchedGame: one predict() call and a few array
+operations per step for all the games.
+
+The policy is a trained model (a DQN .zip checkpoint or a .npz policy, for
+instance from solve.py), or the optimal policy of the map computed on the fly
+with --optimal.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import Maps
+from BatchedGame import BatchedGame
+from EpisodeDataset import EpisodeDatasetWriter
+from ModelRegistry import load_observation_type
+from ObservationType import OBSERVATION_TYPES
+from Policies import TabularPolicy, load_policy
+from SeekerPolicy import SEEKER_POLICIES
+from TabularSolver import q_iteration
+
+
+def generate(policy, batch:BatchedGame, writer:EpisodeDatasetWriter, nb_transitions:int,
+             epsilon=0.0, deterministic=True) -> int:
+    """
+    Play episodes with the games of batch and write them to writer until it has
+    at least nb_transitions transitions. Episodes are written whole, when they end.
+
+    Parameters
+    ----------
+    policy : DQN, TabularPolicy or MlpQPolicy
+        any policy with a predict() method like DQN.predict()
+    batch : BatchedGame
+        the games to play, with the observation type of the policy
+    writer : EpisodeDatasetWriter
+        the dataset
+    nb_transitions : int
+        number of transitions to write
+    epsilon : float, optional
+        probability of a random action instead of the action of the policy, by
+        default 0
+    deterministic : bool, optional
+        given to predict(), by default True
+
+    Returns
+    -------
+    int
+        number of transitions written
+    """
+    n = batch.n_games
+    length = batch.maximum_steps
+    games = np.arange(n)
+
+    # transitions of the current episode of each game, indexed by (step, game)
+    episodes = {name: np.zeros((length, n) + shape, dtype=dtype)
+                for name, (dtype, shape) in writer.columns.items()}
+
+    batch.reset()
+    written = 0
+    while written < nb_transitions:
+        observations = batch.get_observations()
+        actions, _ = policy.predict(observations, deterministic=deterministic)
+        actions = np.asarray(actions)
+        if epsilon > 0:
+            explore = batch.rng.random(n) < epsilon
+            actions = np.where(explore, batch.rng.integers(4, size=n), actions)
+
+        steps = batch.steps.copy()
+        rewards, terminated, truncated = batch.step(actions)
+        for name, values in [("obs", observations), ("action", actions),
+                             ("reward", rewards), ("terminated", terminated),
+                             ("truncated", truncated), ("distance", batch.get_distances())]:
+            episodes[name][steps, games] = values
+
+        finished = np.nonzero(terminated | truncated)[0]
+        if len(finished) == 0:
+            continue
+        # rows of the finished episodes, each episode contiguous
+        lengths = steps[finished] + 1
+        game_of_row = np.repeat(finished, lengths)
+        step_of_row = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        writer.append({name: values[step_of_row, game_of_row]
+                       for name, values in episodes.items()})
+        written += int(lengths.sum())
+        batch.reset(finished)
+
+    return written
+
+
+def make_dataset() -> None:
+    """
+    Generate a dataset of transitions.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model", type=str, nargs="?", default=None, help=(
+        "Policy to play: a saved .zip file from learn.py or a .npz policy (for"
+        + " instance from solve.py). Not needed with --optimal.")
+        )
+    parser.add_argument("--optimal", action="store_true", help=(
+        "Play the optimal policy of the map, computed with the tabular solver"
+        + " (static seeker only).")
+        )
+    parser.add_argument("--observation", type=str, default="LongViewObservation",
+                        choices=list(OBSERVATION_TYPES.keys()), help=(
+        "Observation type stored with --optimal (a model uses its own)."
+        + " Default: LongViewObservation.")
+        )
+    parser.add_argument("--map", type=str, default=Maps.DEFAULT_MAP, help=(
+        f"statement, few_walls or random. Default: {Maps.DEFAULT_MAP}.")
+        )
+    parser.add_argument("--seeker", type=str, default="static",
+                        choices=list(SEEKER_POLICIES.keys()), help=(
+        "How the player (seeker) moves during an episode. Default: static.")
+        )
+    parser.add_argument("--transitions", type=int, default=1_000_000, help=(
+        "Number of transitions to generate. Default: 1 000 000.")
+        )
+    parser.add_argument("--n_games", type=int, default=1000, help=(
+        "Number of games played at once. Default: 1000.")
+        )
+    parser.add_argument("--epsilon", type=float, default=0.0, help=(
+        "Probability of a random action, for more diverse data. Default: 0.")
+        )
+    parser.add_argument("--chunk_size", type=int, default=1_000_000, help=(
+        "Transitions per chunk file. Default: 1 000 000.")
+        )
+    parser.add_argument("--seed", type=int, default=None, help=(
+        "Seed of the games. Default: None.")
+        )
+    parser.add_argument("--output", type=str, default=None, help=(
+        "Folder of the dataset. Default: datasets/<policy name>_<map>_<time>.")
+        )
+    args = parser.parse_args()
+    if (args.model is None) == (not args.optimal):
+        parser.error("Give either a model or --optimal.")
+    if args.optimal and args.seeker != "static":
+        parser.error("--optimal only supports the static seeker.")
+
+    if args.optimal:
+        observation_type = OBSERVATION_TYPES[args.observation]()
+        batch = BatchedGame(args.n_games, map_name=args.map,
+                            observation_type=observation_type, seed=args.seed)
+        q_values = q_iteration(batch.tables)
+        policy = TabularPolicy(batch.game.grid, q_values.argmax(axis=2), q_values)
+        policy_name = "Optimal"
+    else:
+        observation_type = load_observation_type(args.model)
+        batch = BatchedGame(args.n_games, map_name=args.map,
+                            observation_type=observation_type,
+                            seeker_policy=args.seeker, seed=args.seed)
+        policy = load_policy(args.model)
+        policy_name = os.path.basename(os.path.dirname(os.path.normpath(args.model)))
+
+    output = args.output
+    if output is None:
+        output = os.path.join("datasets", f"{policy_name}_{args.map}_{int(time.time())}")
+    observation_space = observation_type.get_observation_space(batch.tables.GRID_W,
+                                                               batch.tables.GRID_H)
+    writer = EpisodeDatasetWriter(output, observation_space, chunk_size=args.chunk_size,
+                                  metadata={
+        "policy": "optimal" if args.optimal else args.model,
+        "map": ["".join(row) for row in batch.game.grid],
+        "map_name": args.map,
+        "seeker": args.seeker,
+        "observation_spec": observation_type.get_spec(),
+        "epsilon": args.epsilon,
+        "seed": args.seed,
+    })
+
+    t_start = time.time()
+    written = generate(policy, batch, writer, args.transitions, epsilon=args.epsilon)
+    writer.close()
+    elapsed = time.time() - t_start
+    print(f"{written} transitions ({writer.nb_episodes} episodes) in {elapsed:.1f}s,"
+          + f" {60 * written / elapsed / 1e6:.2f}M transitions per minute")
+    print(f"Saved in {output}")
+
+
+if __name__ == "__main__":
+    make_dataset()
@@ -0,0 +1,85 @@
+"""
+Follow many training runs at once.
+
+Every run of learn.py writes a JSON snapshot of its metrics in a folder (see
+Metrics.py and the --metrics_dir option). This script reads the snapshots of
+all the runs of the folder, prints a table of them every few seconds and
+serves them together on one port of localhost:
+- http://127.0.0.1:<port>/metrics: Prometheus text format, one line per metric
+  and per run,
+- http://127.0.0.1:<port>/metrics.json: the list of snapshots.
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+from Metrics import MetricsServer
+
+
+def read_snapshots(metrics_dir:str) -> list:
+    """
+    Snapshots of the runs of a folder, sorted by run name. Files that cannot be
+    read (removed meanwhile) are skipped.
+    """
+    snapshots = []
+    for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(snapshots, key=lambda snapshot: snapshot["run"])
+
+
+def print_table(snapshots:list, stale:float) -> None:
+    now = time.time()
+    print(f"{'Run':<60} {'Timesteps':>11} {'Steps/s':>9} {'Episodes':>9}"
+          + f" {'Hide rate':>9} {'Return':>8} {'Length':>7}")
+    for snapshot in snapshots:
+        hide_rate = snapshot["hide_rate"]
+        returns, lengths = snapshot["episode_return"], snapshot["episode_length"]
+        status = " (stale)" if now - snapshot["time"] > stale else ""
+        print(f"{snapshot['run'][:60]:<60} {snapshot['timesteps']:>11,}"
+              + f" {snapshot['steps_per_second']:>9,.0f} {snapshot['episodes']:>9,}"
+              + f" {'-' if hide_rate is None else f'{hide_rate:.2f}':>9}"
+              + f" {returns['mean'] if returns['count'] > 0 else float('nan'):>8.2f}"
+              + f" {lengths['mean'] if lengths['count'] > 0 else float('nan'):>7.1f}"
+              + status)
+    print()
+
+
+def metrics_dashboard() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--metrics_dir", type=str, default="metrics", help=(
+        "Folder of the snapshots of the runs. Default: metrics.")
+        )
+    parser.add_argument("--port", type=int, default=8000, help=(
+        "Port of localhost serving the metrics of all the runs. Default: 8000.")
+        )
+    parser.add_argument("--interval", type=float, default=10.0, help=(
+        "Seconds between two tables. Default: 10.")
+        )
+    parser.add_argument("--stale", type=float, default=60.0, help=(
+        "Runs whose snapshot is older than this many seconds are marked stale"
+        + " (finished or stopped). Default: 60.")
+        )
+    args = parser.parse_args()
+
+    server = MetricsServer(lambda: read_snapshots(args.metrics_dir), args.port)
+    print(f"Metrics of the runs of {args.metrics_dir} served on"
+          + f" http://127.0.0.1:{server.port}/metrics")
+    try:
+        while True:
+            print_table(read_snapshots(args.metrics_dir), args.stale)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    metrics_dashboard()
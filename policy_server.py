@@ -0,0 +1,312 @@
+"""
+Local server playing the agent of many concurrent games.
+
+Models are loaded once (any model accepted by Policies.load_policy). Clients
+connect with TCP on localhost or a Unix socket and send one JSON request per line:
+
+    {"id": 3, "model": "statement", "observation": [4, 2, 7, 9, 1, ...]}
+
+and receive one JSON response per line:
+
+    {"id": 3, "action": 2}
+
+or, if the request fails (unknown model, invalid observation...):
+
+    {"id": 3, "error": "ValueError(...)"}
+
+Responses may come back in another order than the requests: the id tells which
+request they answer. It is null if the request is not a JSON object.
+
+Requests for the same model are micro-batched: the first request of a batch
+waits at most --max_wait_ms for others (or until --max_batch_size requests), then
+the whole batch goes through a single predict() call (if it fails, the requests
+are played one by one so that only the faulty ones get an error). The request
+{"stats": true} returns the latency percentiles and the batch size histogram of
+each model.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+import Maps
+from Policies import MlpQPolicy, TabularPolicy, load_policy
+
+
+class ModelBatcher:
+    """
+    Collects the requests of one model and plays them in batches.
+    """
+    def __init__(self, name:str, policy, max_batch_size:int, max_wait:float) -> None:
+        """
+        Parameters
+        ----------
+        name : str
+            name of the model in the requests
+        policy : DQN, TabularPolicy or MlpQPolicy
+            the loaded model
+        max_batch_size : int
+            maximum number of requests played at once
+        max_wait : float
+            maximum time (seconds) the first request of a batch waits for others
+        """
+        self.name = name
+        self.policy = policy
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.observation_size = _observation_size(policy)
+        self.walls = _policy_walls(policy)
+
+        # statistics over the last requests
+        self.latencies = deque(maxlen=100_000)
+        self.batch_sizes = Counter()
+        self.nb_requests = 0
+
+    async def predict(self, observation:list) -> int:
+        """
+        Returns the action for one observation, once its batch is played.
+        Raises ValueError if the observation is not a flat list of numbers of the
+        size the model expects, or if the model plays on a known map and the
+        positions are outside it or on a wall, so that it never reaches a batch.
+        """
+        observation = np.asarray(observation)
+        if observation.ndim != 1 or not (np.issubdtype(observation.dtype, np.integer)
+                                         or np.issubdtype(observation.dtype, np.floating)):
+            raise ValueError("The observation must be a flat list of numbers.")
+        if self.observation_size is not None and len(observation) != self.observation_size:
+            raise ValueError(f"Model '{self.name}' expects observations of"
+                             + f" {self.observation_size} values, got {len(observation)}.")
+        if self.observation_size is None and len(observation) < 4:
+            raise ValueError("The observation must start with the 4 positions.")
+        if self.walls is not None:
+            x, y = observation[[0, 2]], observation[[1, 3]]
+            height, width = self.walls.shape
+            if ((x != np.round(x)).any() or (x < 0).any() or (x >= width).any()
+                    or (y != np.round(y)).any() or (y < 0).any() or (y >= height).any()):
+                raise ValueError(f"Model '{self.name}' plays on a {width}x{height} map:"
+                                 + " the positions must be cells of this map.")
+            if self.walls[y.astype(np.intp), x.astype(np.intp)].any():
+                raise ValueError(f"Position on a wall of the map of model '{self.name}'.")
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((observation, future, time.perf_counter()))
+        return await future
+
+    async def run(self) -> None:
+        """
+        Play the batches, forever.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # requests whose client went away are cancelled: nothing to answer
+            batch = [request for request in batch if not request[1].done()]
+            if not batch:
+                continue
+            try:
+                actions = self._predict_batch([observation for observation, _, _ in batch])
+            except Exception:
+                # play the requests one by one, so that only the faulty ones fail
+                actions = []
+                for observation, future, _ in batch:
+                    try:
+                        actions.append(self._predict_batch([observation])[0])
+                    except Exception as error:
+                        actions.append(None)
+                        if not future.done():
+                            future.set_exception(error)
+
+            now = time.perf_counter()
+            for (_, future, t_received), action in zip(batch, actions):
+                if action is not None and not future.done():
+                    future.set_result(int(action))
+                self.latencies.append(now - t_received)
+            self.batch_sizes[len(batch)] += 1
+            self.nb_requests += len(batch)
+
+    def _predict_batch(self, observations:list) -> np.ndarray:
+        """
+        Actions of a list of observations, in a single predict() call.
+        """
+        # with a tabular policy, observation types may be mixed: only the
+        # 4 positions are read
+        if self.observation_size is None:
+            observations = np.stack([observation[:4] for observation in observations])
+        else:
+            observations = np.stack(observations)
+        actions, _ = self.policy.predict(observations, deterministic=True)
+        return actions
+
+    def stats(self) -> dict:
+        """
+        Latency percentiles (milliseconds) and batch size histogram.
+        """
+        stats = {"requests": self.nb_requests,
+                 "batch_sizes": dict(sorted(self.batch_sizes.items()))}
+        if self.latencies:
+            latencies = 1000 * np.array(self.latencies)
+            for percentile in [50, 90, 99]:
+                stats[f"p{percentile}_ms"] = round(float(np.percentile(latencies, percentile)), 3)
+        return stats
+
+
+def _observation_size(policy) -> int:
+    """
+    Number of values in an observation of the policy, None for a tabular policy
+    (it only reads the 4 positions at the start of any observation).
+    """
+    if isinstance(policy, TabularPolicy):
+        return None
+    if isinstance(policy, MlpQPolicy):
+        return policy.weights[0].shape[0]
+    return int(np.prod(policy.observation_space.shape))
+
+
+def _policy_walls(policy) -> np.ndarray:
+    """
+    Walls of the map the policy plays on, None if it plays on any map.
+    """
+    if isinstance(policy, TabularPolicy):
+        return policy.walls
+    grid = getattr(policy, "grid", None) # MaskedDQN
+    if grid is not None:
+        return np.array([[cell == Maps.WALL for cell in row] for row in grid])
+    return None
+
+
+class PolicyServer:
+    """
+    Serves the models to the clients (see the module docstring for the protocol).
+    """
+    def __init__(self, batchers:dict) -> None:
+        self.batchers = batchers
+
+    async def handle_client(self, reader:asyncio.StreamReader,
+                            writer:asyncio.StreamWriter) -> None:
+        """
+        Answer the requests of one client, each in its own task so that a client
+        may send several requests without waiting for the answers.
+        """
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self.answer(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    async def answer(self, line:bytes, writer:asyncio.StreamWriter,
+                     lock:asyncio.Lock) -> None:
+        request = None
+        try:
+            request = json.loads(line)
+            if request.get("stats"):
+                response = {name: batcher.stats() for name, batcher in self.batchers.items()}
+            else:
+                batcher = self.batchers[request["model"]]
+                response = {"id": request.get("id"),
+                            "action": await batcher.predict(request["observation"])}
+        except Exception as error:
+            response = {"id": request.get("id") if isinstance(request, dict) else None,
+                        "error": repr(error)}
+
+        async with lock:
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+    def report(self) -> None:
+        for name, batcher in self.batchers.items():
+            print(f"[{name}] {batcher.stats()}")
+
+
+async def serve(args) -> None:
+    batchers = {}
+    for model in args.model:
+        name, path = model.split("=", 1) if "=" in model else (model, model)
+        print(f"Loading {path} as '{name}'")
+        batchers[name] = ModelBatcher(name, load_policy(path), args.max_batch_size,
+                                      args.max_wait_ms / 1000)
+    server = PolicyServer(batchers)
+
+    # keep a reference to the tasks, the event loop only keeps weak ones
+    batcher_tasks = [asyncio.create_task(batcher.run()) for batcher in batchers.values()]
+
+    if args.unix_socket is not None:
+        if os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+        listener = await asyncio.start_unix_server(server.handle_client, path=args.unix_socket)
+        print(f"Listening on {args.unix_socket}")
+    else:
+        listener = await asyncio.start_server(server.handle_client, host="127.0.0.1",
+                                              port=args.port)
+        print(f"Listening on 127.0.0.1:{args.port}")
+
+    async with listener:
+        while True:
+            await asyncio.sleep(args.report_interval)
+            server.report()
+            for task in batcher_tasks:
+                if task.done():
+                    task.result() # raises the error that stopped the batcher
+
+
+def policy_server() -> None:
+    """
+    Start the server.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model", type=str, nargs="+", help=(
+        "Models to serve, as name=path or path (then the name is the path). A .zip"
+        + " file from learn.py or a .npz policy.")
+        )
+    parser.add_argument("--port", type=int, default=5555, help=(
+        "TCP port on localhost. Default: 5555.")
+        )
+    parser.add_argument("--unix_socket", type=str, default=None, help=(
+        "Listen on this Unix socket instead of TCP.")
+        )
+    parser.add_argument("--max_batch_size", type=int, default=256, help=(
+        "Maximum number of requests played in one batch. Default: 256.")
+        )
+    parser.add_argument("--max_wait_ms", type=float, default=2.0, help=(
+        "Maximum time the first request of a batch waits for others. Default: 2 ms.")
+        )
+    parser.add_argument("--report_interval", type=float, default=10.0, help=(
+        "Print statistics every X seconds. Default: 10.")
+        )
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    policy_server()
@@ -0,0 +1,96 @@
+"""
+Query the model registry (see ModelRegistry.py) from the command line.
+
+    python registry.py runs --map statement
+    python registry.py checkpoints <run name>
+    python registry.py best --map statement --by observation
+    python registry.py import models
+"""
+
+import argparse
+import glob
+import os
+
+import Maps
+from ModelRegistry import REGISTRY_FILE, REGISTRY_PATH, ModelRegistry
+
+
+def print_rows(rows:list, columns:list) -> None:
+    """
+    Print rows (dicts) as an aligned table.
+    """
+    cells = [[str(column) for column in columns]]
+    for row in rows:
+        cells.append([f"{row[column]:.2f}" if isinstance(row[column], float)
+                      else str(row[column]) for column in columns])
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    for line in cells:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+
+def registry() -> None:
+    """
+    Run a registry command.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--registry", type=str, default=REGISTRY_PATH, help=(
+        f"Path of the registry. Default: {REGISTRY_PATH}.")
+        )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    runs_parser = commands.add_parser("runs", help="List the runs.")
+    runs_parser.add_argument("--map", type=str, default=None, help=(
+        "Only the runs trained on this map.")
+        )
+    runs_parser.add_argument("--observation", type=str, default=None, help=(
+        "Only the runs with this observation type, for instance"
+        + " 'LongViewObservation(view_size=5)'.")
+        )
+
+    checkpoints_parser = commands.add_parser("checkpoints",
+                                             help="List the checkpoints of a run.")
+    checkpoints_parser.add_argument("run", type=str, help="Name of the run.")
+
+    best_parser = commands.add_parser("best", help=(
+        "Best evaluated checkpoint of each group of runs on a map."))
+    best_parser.add_argument("--map", type=str, default=Maps.DEFAULT_MAP, help=(
+        f"Map of the evaluations. Default: {Maps.DEFAULT_MAP}.")
+        )
+    best_parser.add_argument("--seeker", type=str, default="static", help=(
+        "Seeker of the evaluations. Default: static.")
+        )
+    best_parser.add_argument("--by", type=str, default="observation",
+                             choices=["observation", "run", "map"], help=(
+        "Group of runs. Default: observation (best checkpoint per observation type).")
+        )
+    best_parser.add_argument("--min_episodes", type=int, default=1, help=(
+        "Ignore evaluations with fewer episodes. Default: 1.")
+        )
+
+    import_parser = commands.add_parser("import", help=(
+        "Register the run folders written before the registry existed."))
+    import_parser.add_argument("models_folder", type=str, nargs="?", default="models",
+                               help="Folder containing the runs. Default: models.")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        index = ModelRegistry(os.path.join(args.models_folder, REGISTRY_FILE))
+        folders = sorted(glob.glob(os.path.join(args.models_folder, "*/")))
+        nb_imported = sum(index.import_folder(folder) for folder in folders)
+        print(f"{nb_imported} runs imported in {index.path}")
+        return
+
+    index = ModelRegistry(args.registry)
+    if args.command == "runs":
+        print_rows(index.runs(args.map, args.observation),
+                   ["name", "observation", "map", "seeker", "checkpoints"])
+    elif args.command == "checkpoints":
+        print_rows(index.checkpoints(args.run), ["timesteps", "path"])
+    elif args.command == "best":
+        print_rows(index.best_checkpoints(args.map, args.seeker, args.by,
+                                          args.min_episodes),
+                   ["group", "path", "mean_reward", "hide_rate", "nb_episodes"])
+
+
+if __name__ == "__main__":
+    registry()
@@ -0,0 +1,263 @@
+"""
+Successive-halving hyperparameter search, instead of training every configuration
+of a fixed grid for the full number of timesteps (batch_training.py).
+
+A search samples nb_configurations configurations from the search space of a
+JSON config file (see search_config.json), trains all of them for min_timesteps,
+evaluates them, keeps the best 1/eta of them, trains the survivors up to
+eta * min_timesteps, and so on until max_timesteps. Training continues from the
+previous rung (model and replay buffer are saved between rungs), and the trials
+of a rung are trained in parallel worker processes.
+
+Search space values are either a list of choices (one value fixes the
+parameter), {"log_uniform": [low, high]} or {"uniform": [low, high]}. Supported
+parameters: observation, view_size, packed, learning_rate, learning_starts,
+exploration, buffer_size, net_arch, n_envs, compact_buffer.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+
+import Maps
+from Game import Game
+from ModelRegistry import ModelRegistry, save_observation_spec
+from ObservationType import observation_type_from_spec
+
+DEFAULTS = {
+    "observation": "BasicObservation",
+    "view_size": 5,
+    "packed": False,
+    "learning_rate": 0.001,
+    "learning_starts": 50000,
+    "exploration": 0.05,
+    "buffer_size": 1_000_000,
+    "net_arch": [64, 64],
+    "n_envs": 1,
+    "compact_buffer": False,
+}
+
+
+def sample_configuration(space:dict, rng:random.Random) -> dict:
+    """
+    Draw one configuration from the search space, with DEFAULTS for the
+    parameters that are not in it.
+    """
+    configuration = dict(DEFAULTS)
+    for name, values in space.items():
+        if isinstance(values, list):
+            configuration[name] = rng.choice(values)
+        elif "log_uniform" in values:
+            low, high = values["log_uniform"]
+            configuration[name] = math.exp(rng.uniform(math.log(low), math.log(high)))
+        elif "uniform" in values:
+            configuration[name] = rng.uniform(*values["uniform"])
+        else:
+            raise ValueError(f"Unknown search space for '{name}': {values}")
+    return configuration
+
+
+def rung_budgets(min_timesteps:int, max_timesteps:int, eta:int) -> list:
+    """
+    Timesteps of each rung: min_timesteps * eta^k, the last one max_timesteps.
+    """
+    budgets = [min_timesteps]
+    while budgets[-1] * eta < max_timesteps:
+        budgets.append(budgets[-1] * eta)
+    if budgets[-1] < max_timesteps:
+        budgets.append(max_timesteps)
+    return budgets
+
+
+def init_worker() -> None:
+    import torch
+
+    # one thread per worker, the workers already use all the cores
+    torch.set_num_threads(1)
+
+
+def train_trial(task:dict) -> dict:
+    """
+    Train a trial up to the budget of the rung, from its previous checkpoint if
+    any, then evaluate it. Runs in a worker process.
+    """
+    from stable_baselines3 import DQN
+    from stable_baselines3.common.utils import get_linear_fn
+
+    from BatchedGame import BatchedGame
+    from Evaluation import evaluate_batched
+    from HideAndSeekEnv import HideAndSeekEnv
+    from StateReplayBuffer import StateReplayBuffer
+    from VecHideAndSeekEnv import VecHideAndSeekEnv
+
+    configuration = task["configuration"]
+    observation_type = observation_type_from_spec(task["observation_spec"])
+    if configuration["n_envs"] > 1:
+        env = VecHideAndSeekEnv(configuration["n_envs"], observation_type=observation_type,
+                                map_name=task["map"], seeker_policy=task["seeker"])
+    else:
+        env = HideAndSeekEnv(render_mode="rgb_array", observation_type=observation_type,
+                             map_name=task["map"], seeker_policy=task["seeker"])
+    env.reset()
+
+    buffer_path = os.path.join(task["folder"], "replay_buffer.pkl")
+    if task["previous"] is not None:
+        model = DQN.load(task["previous"], env=env)
+        model.load_replay_buffer(buffer_path)
+    else:
+        replay_buffer_class, replay_buffer_kwargs = None, None
+        if configuration["compact_buffer"]:
+            replay_buffer_class = StateReplayBuffer
+            replay_buffer_kwargs = dict(grid=env.game.grid,
+                                        observation_type=observation_type)
+        model = DQN("MlpPolicy", env, verbose=0, tensorboard_log="logs",
+                    learning_rate=configuration["learning_rate"],
+                    learning_starts=configuration["learning_starts"],
+                    exploration_final_eps=configuration["exploration"],
+                    buffer_size=configuration["buffer_size"],
+                    replay_buffer_class=replay_buffer_class,
+                    replay_buffer_kwargs=replay_buffer_kwargs,
+                    policy_kwargs=dict(net_arch=list(configuration["net_arch"])),
+        )
+
+    # learn() sees the budget of the rung as the total number of timesteps: the
+    # exploration rate would decay over a fraction of each rung instead of the
+    # same fraction of max_timesteps as a full run
+    model.exploration_schedule = get_linear_fn(
+        model.exploration_initial_eps, model.exploration_final_eps,
+        model.exploration_fraction * task["max_timesteps"] / task["budget"])
+
+    t_start = time.time()
+    model.learn(total_timesteps=task["budget"] - model.num_timesteps,
+                reset_num_timesteps=False, tb_log_name=task["name"])
+    training_time = time.time() - t_start
+
+    path = os.path.join(task["folder"], f"{task['budget']}.zip")
+    model.save(path)
+    if task["last_rung"]:
+        if os.path.exists(buffer_path):
+            os.remove(buffer_path)
+    else:
+        model.save_replay_buffer(buffer_path)
+
+    batch = BatchedGame(100, map_name=task["map"], observation_type=observation_type,
+                        seeker_policy=task["seeker"])
+    results = evaluate_batched(model, batch, task["eval_episodes"], seed=0)
+    env.close()
+    return {"name": task["name"], "checkpoint": path, "training_time": training_time,
+            **results}
+
+
+def search() -> None:
+    """
+    Run a successive-halving search.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", type=str, help=(
+        "JSON config file of the search (see search_config.json).")
+        )
+    parser.add_argument("--workers", type=int, default=None, help=(
+        "Number of trials trained in parallel. Default: workers of the config file,"
+        + " or the number of CPUs.")
+        )
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    map_name = config.get("map", Maps.DEFAULT_MAP)
+    seeker = config.get("seeker", "static")
+    eta = config.get("eta", 3)
+    eval_episodes = config.get("eval_episodes", 500)
+    workers = args.workers or config.get("workers", os.cpu_count())
+    budgets = rung_budgets(config["min_timesteps"], config["max_timesteps"], eta)
+
+    rng = random.Random(config.get("seed"))
+    # a random map is drawn once: every trial trains and is evaluated on it at
+    # every rung (a trial resumes with the replay buffer of this map)
+    map_rows = map_name
+    if map_name == "random":
+        map_rows = ["".join(row) for row in Game(map_name="random", seed=config.get("seed")).grid]
+    search_name = f"Search_{int(time.time())}_{map_name}"
+    registry = ModelRegistry()
+    trials = []
+    for i in range(config["nb_configurations"]):
+        configuration = sample_configuration(config["space"], rng)
+        spec = {"type": configuration["observation"]}
+        if configuration["observation"] == "LongViewObservation":
+            spec.update(view_size=configuration["view_size"],
+                        packed=configuration["packed"])
+        name = f"{search_name}_{i}"
+        folder = f"models/{name}"
+        os.makedirs(folder)
+        registry.register_run(name, folder, observation_type_from_spec(spec), map_name,
+                              seeker=seeker, hyperparameters={**configuration,
+                                                              "search": search_name})
+        save_observation_spec(folder, observation_type_from_spec(spec))
+        trials.append({"name": name, "folder": folder, "configuration": configuration,
+                       "observation_spec": spec, "previous": None, "history": []})
+
+    print(f"{search_name}: {len(trials)} configurations, rungs {budgets}")
+    total_timesteps = 0
+    alive = trials
+    with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+        for rung, budget in enumerate(budgets):
+            last_rung = rung == len(budgets) - 1
+            tasks = [{"name": trial["name"], "folder": trial["folder"],
+                      "configuration": trial["configuration"],
+                      "observation_spec": trial["observation_spec"],
+                      "previous": trial["previous"], "budget": budget,
+                      "max_timesteps": budgets[-1], "last_rung": last_rung,
+                      "map": map_rows, "seeker": seeker,
+                      "eval_episodes": eval_episodes} for trial in alive]
+            t_start = time.time()
+            results = {result["name"]: result for result in pool.imap_unordered(train_trial, tasks)}
+            total_timesteps += len(alive) * (budget - (budgets[rung-1] if rung > 0 else 0))
+
+            for trial in alive:
+                result = results[trial["name"]]
+                trial["previous"] = result["checkpoint"]
+                trial["history"].append({"timesteps": budget, **result})
+                registry.add_checkpoint(trial["name"], budget, result["checkpoint"])
+                registry.add_evaluation(result["checkpoint"], map_name, seeker,
+                                        eval_episodes, result)
+
+            alive = sorted(alive, key=lambda trial: results[trial["name"]]["mean_reward"],
+                           reverse=True)
+            print(f"Rung {rung} ({budget} timesteps, {len(alive)} trials,"
+                  + f" {time.time() - t_start:.0f}s):")
+            for trial in alive:
+                result = results[trial["name"]]
+                print(f"  {trial['name']}: mean reward {result['mean_reward']:.2f},"
+                      + f" hide rate {result['hide_rate']:.1%}")
+
+            if not last_rung:
+                survivors = alive[:max(1, len(alive) // eta)]
+                for trial in alive[len(survivors):]:
+                    buffer_path = os.path.join(trial["folder"], "replay_buffer.pkl")
+                    if os.path.exists(buffer_path):
+                        os.remove(buffer_path)
+                alive = survivors
+
+    best = alive[0]
+    full_grid = len(trials) * budgets[-1]
+    print(f"Best: {best['name']} {best['configuration']}")
+    print(f"Mean reward {best['history'][-1]['mean_reward']:.2f} with {best['previous']}")
+    print(f"{total_timesteps} timesteps trained, {full_grid / total_timesteps:.1f}x less"
+          + " than training every configuration fully")
+
+    with open(f"models/{search_name}.json", "w") as f:
+        json.dump({"config": config, "map": map_rows, "budgets": budgets,
+                   "best": best["name"],
+                   "total_timesteps": total_timesteps,
+                   "trials": [{key: trial[key] for key in ["name", "configuration",
+                                                           "history"]}
+                              for trial in trials]}, f, indent=2)
+    print(f"Search saved in models/{search_name}.json")
+
+
+if __name__ == "__main__":
+    search()
@@ -0,0 +1,73 @@
+"""
+Compute the optimal policy of a map with the tabular solver (see TabularSolver.py)
+instead of training a DQN. The policy is saved like a model trained with learn.py,
+so it can be used with evaluate.py and load.py.
+"""
+
+import argparse
+import os
+import time
+
+
+import Maps
+from Game import Game
+from GridTables import GridTables
+from ModelRegistry import ModelRegistry, save_observation_spec
+from ObservationType import BasicObservation
+from Policies import TabularPolicy
+from TabularSolver import q_iteration, start_values
+
+
+def solve() -> None:
+    """
+    Solve a map and save the optimal policy.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--map", type=str, default=Maps.DEFAULT_MAP,
+                        choices=list(Maps.MAPS.keys()), help=(
+        f"statement or few_walls. Default: {Maps.DEFAULT_MAP}. Map to solve"
+        + " (the policy only plays on this map).")
+        )
+    parser.add_argument("--gamma", type=float, default=0.99, help=(
+        "Discount factor. Default: 0.99 (same as DQN).")
+        )
+    parser.add_argument("--tolerance", type=float, default=1e-6, help=(
+        "Stop when the largest Q-value update is smaller. Default: 1e-6.")
+        )
+    args = parser.parse_args()
+
+    game = Game(map_name=args.map)
+    tables = GridTables.from_grid(game.grid)
+
+    print(f"Solving map {args.map} ({tables.nb_cells**2} states)")
+    t_start = time.time()
+    q_values = q_iteration(tables, gamma=args.gamma, tolerance=args.tolerance)
+    print(f"Solved in {time.time() - t_start:.2f}s")
+    print(f"Mean optimal return over starts: {start_values(tables, q_values).mean():.2f}")
+
+    model_name = f"Tabular_{int(time.time())}_{args.map}"
+    models_dir = f"models/{model_name}"
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+
+    policy = TabularPolicy(game.grid, q_values.argmax(axis=2), q_values)
+    policy.save(f"{models_dir}/policy.npz")
+
+    # The policy only reads positions, any observation type works to play it
+    registry = ModelRegistry()
+    registry.register_run(model_name, models_dir, BasicObservation(), args.map,
+                          algorithm="Tabular", hyperparameters=vars(args))
+    save_observation_spec(models_dir, BasicObservation())
+    registry.add_checkpoint(model_name, None, f"{models_dir}/policy.npz")
+
+    with open(f"{models_dir}/model_info.txt", "w") as f:
+        f.write(f"Model name: {model_name}\n")
+        f.write(f"Map trained on: {args.map}\n")
+        f.write(f"Gamma: {args.gamma}\n")
+        f.write(f"Tolerance: {args.tolerance}\n")
+
+    print(f"Saved in {models_dir}/policy.npz")
+
+
+if __name__ == "__main__":
+    solve()